@@ -0,0 +1,67 @@
+"""
+Benchmark of the punctuation alignment of transcribe_audio on 3-hour
+transcripts, against the previous per-word split of the transcript text.
+
+Usage:
+    python benchmarks/bench_alignment.py --words 30000 100000
+"""
+
+import argparse
+import random
+
+from common import THREE_HOURS_WORDS, best_time, synthetic_transcript
+
+from src.processing.alignment import align_punctuated_words, normalize_token
+
+
+def previous_punctuated_words(text: str, words: list[str]) -> list[str]:
+    # Loop of transcribe_audio before the alignment module
+    return [text.split(" ")[i] for i, _ in enumerate(words)]
+
+
+def transcription(nb_words: int, seed: int = 0) -> tuple[str, list[str]]:
+    """
+    Punctuated text and transcribed words of a synthetic transcript, with a
+    few substituted words and extra tokens in the text as in real
+    transcriptions.
+    """
+    rng = random.Random(seed)
+    tokens = synthetic_transcript(nb_words, seed)["transcript"].split(" ")
+    words = [normalize_token(token) for token in tokens]
+
+    for i in rng.sample(range(len(tokens)), len(tokens) // 1000):
+        tokens[i] = "um," if rng.random() < 0.5 else tokens[i] + " -"
+
+    return " ".join(tokens), words
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[THREE_HOURS_WORDS])
+    parser.add_argument(
+        "--previous-words",
+        type=int,
+        default=3000,
+        help="Words aligned by the previous implementation, which is quadratic",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text, words = transcription(args.previous_words)
+    elapsed, _ = best_time(lambda: previous_punctuated_words(text, words), 1)
+    print(f"{args.previous_words} words, previous implementation: {elapsed:.3f} s")
+
+    for nb_words in args.words:
+        text, words = transcription(nb_words)
+        elapsed, (punctuated_words, mismatches) = best_time(
+            lambda: align_punctuated_words(text, words), args.repeat
+        )
+        assert len(punctuated_words) == len(words)
+        print(
+            f"{nb_words} words: {elapsed * 1000:.1f} ms, "
+            f"{len(mismatches)} mismatches"
+        )
+
+
+if __name__ == "__main__":
+    main()
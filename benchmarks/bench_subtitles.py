@@ -0,0 +1,151 @@
+"""
+Benchmark of generate_subtitles on long transcripts, against the previous
+implementation that re-split the subtitle text on every word.
+
+Usage:
+    python benchmarks/bench_subtitles.py --words 1000000
+"""
+
+import argparse
+from typing import Iterable
+
+from common import best_time, synthetic_segments
+
+from src.core.models import Segment, Subtitle, Word
+from src.processing.subtitles import generate_subtitles
+
+
+def previous_generate_subtitles(
+    selected_segments: Iterable[Segment],
+    max_subtitle_length: int = 20,
+    max_words_per_subtitle: int = 3,
+    upper_case: bool = False,
+    time_offset: int = 0,
+) -> list[Subtitle]:
+    # Implementation before the single pass over word arrays
+    subtitles = []
+
+    for segment in selected_segments:
+        words = segment.words
+        current_subtitle = ""
+        current_subtitle_start = segment.start - time_offset
+        # Unset in the original, only used by its empty subtitles
+        current_subtitle_end = current_subtitle_start
+        current_subtitle_words = []
+
+        for word in words:
+            if (
+                (len(current_subtitle + " " + word.word) > max_subtitle_length)
+                or (len(current_subtitle.split(" ")) > max_words_per_subtitle)
+                or any(punct in current_subtitle for punct in "?!")
+            ):
+                subtitles.append(
+                    Subtitle(
+                        (
+                            current_subtitle.strip().upper()
+                            if upper_case
+                            else current_subtitle.strip()
+                        ),
+                        current_subtitle_start,
+                        current_subtitle_end,
+                        current_subtitle_words,
+                    )
+                )
+                current_subtitle = word.word + " "
+                current_subtitle_start = word.start - time_offset
+                current_subtitle_end = word.end - time_offset
+                current_subtitle_words = [
+                    Word(
+                        word.word.upper() if upper_case else word.word,
+                        word.start - time_offset,
+                        word.end - time_offset,
+                    )
+                ]
+            else:
+                current_subtitle += word.word + " "
+                current_subtitle_end = word.end - time_offset
+                current_subtitle_words.append(
+                    Word(
+                        word.word.upper() if upper_case else word.word,
+                        word.start - time_offset,
+                        word.end - time_offset,
+                    )
+                )
+
+        subtitles.append(
+            Subtitle(
+                (
+                    current_subtitle.strip().upper()
+                    if upper_case
+                    else current_subtitle.strip()
+                ),
+                current_subtitle_start,
+                current_subtitle_end,
+                current_subtitle_words,
+            )
+        )
+
+    return subtitles
+
+
+def subtitle_values(subtitle: Subtitle) -> tuple:
+    return (
+        subtitle.text,
+        round(subtitle.start, 6),
+        round(subtitle.end, 6),
+        [
+            (word.word, round(word.start, 6), round(word.end, 6))
+            for word in subtitle.words
+        ],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--max-length", type=int, default=20)
+    parser.add_argument("--max-words", type=int, default=3)
+    parser.add_argument("--time-offset", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    parameters = dict(
+        max_subtitle_length=args.max_length,
+        max_words_per_subtitle=args.max_words,
+        time_offset=args.time_offset,
+    )
+
+    for nb_words in args.words:
+        segments = synthetic_segments(nb_words)
+        print(f"{nb_words} words, {len(segments)} segments")
+
+        for upper_case in (False, True):
+            previous_time, previous_subtitles = best_time(
+                lambda: previous_generate_subtitles(
+                    segments, upper_case=upper_case, **parameters
+                ),
+                args.repeat,
+            )
+            elapsed, subtitles = best_time(
+                lambda: generate_subtitles(
+                    segments, upper_case=upper_case, **parameters
+                ),
+                args.repeat,
+            )
+            print(
+                f"  upper_case={upper_case}: previous implementation "
+                f"{previous_time:.2f} s, generate_subtitles {elapsed:.2f} s, "
+                f"{len(subtitles)} subtitles"
+            )
+
+            # The previous implementation also produced an empty subtitle when
+            # the first word of a segment was longer than max_subtitle_length
+            assert [subtitle_values(subtitle) for subtitle in subtitles] == [
+                subtitle_values(subtitle)
+                for subtitle in previous_subtitles
+                if subtitle.text
+            ], "Subtitles differ from the previous implementation"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of transcript load times: the columnar transcript files against
+the YAML transcripts they replaced.
+
+Usage:
+    python benchmarks/bench_transcript_load.py --words 30000 100000
+"""
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import yaml
+from common import THREE_HOURS_WORDS, best_time, synthetic_transcript
+
+from src.core.setup import load_transcript_segments
+from src.core.transcripts import (TranscriptStore, read_transcript,
+                                  transcript_cache, write_transcript)
+
+
+def load_uncached(transcript_path: Path):
+    transcript_cache.invalidate(transcript_path)
+    return load_transcript_segments(transcript_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[THREE_HOURS_WORDS])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--skip-yaml", action="store_true", help="Don't time yaml.safe_load (slow)"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as transcripts_dir:
+        for nb_words in args.words:
+            transcript = synthetic_transcript(nb_words)
+            transcript_path = write_transcript(
+                transcript, Path(transcripts_dir) / f"{nb_words}.transcript"
+            )
+            print(
+                f"{nb_words} words, "
+                f"{transcript_path.stat().st_size / 2**20:.1f} MB transcript file"
+            )
+
+            if not args.skip_yaml:
+                yaml_path = transcript_path.with_suffix(".yaml")
+                with open(str(yaml_path), "w", encoding="utf-8") as file:
+                    yaml.dump(
+                        transcript, file, allow_unicode=True, default_flow_style=False
+                    )
+
+                def load_yaml():
+                    with open(str(yaml_path), "r", encoding="utf-8") as file:
+                        return yaml.safe_load(file)
+
+                elapsed, _ = best_time(load_yaml, 1)
+                print(f"  yaml.safe_load: {elapsed:.2f} s")
+                yaml_path.unlink()
+
+            timings = [
+                ("open (header only)", lambda: TranscriptStore(transcript_path)),
+                (
+                    "read_transcript (whole dict)",
+                    lambda: read_transcript(transcript_path),
+                ),
+                ("load_transcript_segments", lambda: load_uncached(transcript_path)),
+                (
+                    "load_transcript_segments, cached",
+                    lambda: load_transcript_segments(transcript_path),
+                ),
+            ]
+            for name, function in timings:
+                elapsed, _ = best_time(function, args.repeat)
+                print(f"  {name}: {elapsed * 1000:.2f} ms")
+
+            transcript_cache.invalidate()
+
+
+if __name__ == "__main__":
+    main()
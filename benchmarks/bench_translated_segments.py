@@ -0,0 +1,102 @@
+"""
+Benchmark of create_translated_segments on full-transcript translations,
+against the previous per-word implementation.
+
+Usage:
+    python benchmarks/bench_translated_segments.py --words 100000 200000
+"""
+
+import argparse
+import random
+
+from common import best_time, synthetic_segments
+
+from src.ai.translation import create_translated_segments
+from src.core.models import Segment, Word
+
+
+def previous_create_translated_segments(
+    segments: list[Segment], translated_text_segments: list[str]
+) -> list[Segment]:
+    # Implementation before the vectorized allocation, without its print
+    translated_segments = []
+    for segment, translated_text in zip(segments, translated_text_segments):
+        words = translated_text.split(" ")
+        segment_duration = segment.end - segment.start
+
+        translated_words = []
+        for i, word in enumerate(words):
+            translated_word_start = segment.start + segment_duration * len(
+                "".join(words[:i])
+            ) / len("".join(words))
+            translated_word_end = segment.start + segment_duration * len(
+                "".join(words[: i + 1])
+            ) / len("".join(words))
+            translated_words.append(
+                Word(word, translated_word_start, translated_word_end)
+            )
+
+        translated_segments.append(
+            Segment(translated_text, segment.start, segment.end, translated_words)
+        )
+
+    return translated_segments
+
+
+def translate(segments: list[Segment], seed: int = 0) -> list[str]:
+    """
+    Fake translations: the words of every segment reversed, with one word
+    more or less now and then.
+    """
+    rng = random.Random(seed)
+    translations = []
+    for segment in segments:
+        words = segment.text.split(" ")[::-1]
+        if len(words) > 1 and rng.random() < 0.3:
+            words.pop()
+        elif rng.random() < 0.3:
+            words.append("mot")
+        translations.append(" ".join(words))
+
+    return translations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[100_000, 200_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for nb_words in args.words:
+        segments = synthetic_segments(nb_words)
+        translations = translate(segments)
+
+        previous_time, previous_segments = best_time(
+            lambda: previous_create_translated_segments(segments, translations),
+            args.repeat,
+        )
+        print(f"{nb_words} words, {len(segments)} segments")
+        print(f"  previous implementation: {previous_time:.3f} s")
+
+        for weights in ("characters", "syllables", "source"):
+            elapsed, translated_segments = best_time(
+                lambda: create_translated_segments(segments, translations, weights),
+                args.repeat,
+            )
+            print(f"  {weights} weights: {elapsed:.3f} s")
+
+            if weights == "characters":
+                assert all(
+                    abs(word.start - previous_word.start) < 1e-9
+                    and abs(word.end - previous_word.end) < 1e-9
+                    for segment, previous_segment in zip(
+                        translated_segments, previous_segments
+                    )
+                    for word, previous_word in zip(
+                        segment.words, previous_segment.words
+                    )
+                ), "Word timings differ from the previous implementation"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Shared helpers of the benchmarks: deterministic synthetic transcripts and
+timing.
+"""
+
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, TypeVar
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+# The LLM client is created when src.ai and src.llm are imported, no call is made
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.core.models import Segment, WordTable
+
+T = TypeVar("T")
+
+VOCABULARY = [
+    "the",
+    "quick",
+    "brown",
+    "fox",
+    "jumps",
+    "over",
+    "a",
+    "lazy",
+    "dog",
+    "and",
+    "then",
+    "runs",
+    "away",
+    "from",
+    "hunters",
+    "through",
+    "forest",
+    "être",
+    "très",
+    "extraordinarily",
+]
+
+# One word every WORD_INTERVAL seconds, spoken for WORD_DURATION seconds
+WORD_INTERVAL = 0.36
+WORD_DURATION = 0.3
+
+# About 3 hours of speech
+THREE_HOURS_WORDS = 30_000
+
+
+def synthetic_transcript(nb_words: int, seed: int = 0) -> dict:
+    """
+    Transcript with the schema of the YAML transcripts: segments of 5 to 25
+    words ending with a punctuation mark, some words ending with a comma.
+    """
+    rng = random.Random(seed)
+
+    words, segments = [], []
+    while len(words) < nb_words:
+        segment_words = []
+        for _ in range(min(rng.randint(5, 25), nb_words - len(words))):
+            word = rng.choice(VOCABULARY)
+            if rng.random() < 0.05:
+                word += ","
+
+            start = round(len(words) * WORD_INTERVAL, 3)
+            words.append(
+                {"word": word, "start": start, "end": round(start + WORD_DURATION, 3)}
+            )
+            segment_words.append(word)
+
+        segment_words[-1] = segment_words[-1].rstrip(",") + rng.choice(".?!.")
+        words[-1]["word"] = segment_words[-1]
+        segments.append(" ".join(segment_words))
+
+    return {
+        "language": "en",
+        "transcript": " ".join(segments),
+        "segments": segments,
+        "words": words,
+    }
+
+
+def synthetic_segments(nb_words: int, seed: int = 0) -> list[Segment]:
+    """
+    Segments of synthetic_transcript, whose words are views on a single
+    WordTable as the loaded transcripts are.
+    """
+    transcript = synthetic_transcript(nb_words, seed)
+    words = WordTable.from_lists(
+        [word["word"] for word in transcript["words"]],
+        [word["start"] for word in transcript["words"]],
+        [word["end"] for word in transcript["words"]],
+    )
+
+    segments = []
+    first_word = 0
+    for segment in transcript["segments"]:
+        last_word = first_word + len(segment.split(" "))
+        segment_words = words[first_word:last_word]
+        segments.append(
+            Segment(
+                segment, segment_words[0].start, segment_words[-1].end, segment_words
+            )
+        )
+        first_word = last_word
+
+    return segments
+
+
+def best_time(function: Callable[[], T], repeat: int = 3) -> tuple[float, T]:
+    """
+    Best wall time of repeat calls of function, in seconds, and its result.
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start_time)
+
+    return min(times), result
@@ -0,0 +1,162 @@
+import logging
+import re
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.ai.transcription import fetch_transcript_data, save_transcript
+from src.processing.alignment import normalize_token
+from src.processing.audio import (detect_silences, wav_duration,
+                                  write_wav_segment)
+
+SENTENCE_END_PATTERN = re.compile(r"[.!?…][\"')\]]*$")
+
+logger = logging.getLogger(__name__)
+
+
+def find_cut_points(
+    silences: list[tuple[float, float]],
+    duration: float,
+    piece_duration: float,
+    search_window: float,
+) -> list[float]:
+    """
+    Cut the audio about every piece_duration seconds, in the middle of the
+    longest silence within search_window seconds of each target time, or at
+    the target time when there is no silence around it.
+    """
+    cut_points = []
+    target = piece_duration
+    while target < duration - search_window:
+        candidates = [
+            (end - start, (start + end) / 2)
+            for start, end in silences
+            if abs((start + end) / 2 - target) <= search_window
+        ]
+        cut_point = max(candidates)[1] if candidates else target
+        cut_points.append(cut_point)
+        target = cut_point + piece_duration
+
+    return cut_points
+
+
+def stitch_transcripts(
+    pieces: list[dict], offsets: list[float], cut_points: list[float]
+) -> dict:
+    """
+    Stitch the transcript data of consecutive audio pieces (see
+    fetch_transcript_data) into the transcript data of the whole audio.
+
+    Args:
+        pieces: Transcript data of every piece, times in ms from the piece start
+        offsets: Start of every piece in the whole audio, in seconds
+        cut_points: Seams between pieces, in seconds. Pieces overlap around
+            them: a word belongs to the piece on the side of its middle, and
+            the same word transcribed on both sides is kept once
+
+    Returns:
+        The transcript data of the whole audio
+    """
+    seams_ms = [0.0] + [cut_point * 1000 for cut_point in cut_points] + [float("inf")]
+
+    words, sentences = [], []
+    for i, (piece, offset) in enumerate(zip(pieces, offsets)):
+
+        def owned(word: dict) -> bool:
+            middle = (word["start"] + word["end"]) / 2
+            return seams_ms[i] <= middle < seams_ms[i + 1]
+
+        def rebase(word: dict) -> dict:
+            return {
+                "text": word["text"],
+                "start": int(word["start"] + offset * 1000),
+                "end": int(word["end"] + offset * 1000),
+            }
+
+        piece_sentences = []
+        for sentence in piece["sentences"]:
+            sentence_words = [rebase(word) for word in sentence]
+            sentence_words = [word for word in sentence_words if owned(word)]
+            if sentence_words:
+                piece_sentences.append(sentence_words)
+
+        # Same word on both sides of the seam
+        if words and piece_sentences:
+            last_word, first_word = words[-1], piece_sentences[0][0]
+            if (
+                normalize_token(last_word["text"])
+                == normalize_token(first_word["text"])
+                and first_word["start"] < last_word["end"]
+            ):
+                piece_sentences[0].pop(0)
+                if not piece_sentences[0]:
+                    piece_sentences.pop(0)
+
+        # Sentence cut by the seam
+        if (
+            sentences
+            and piece_sentences
+            and not SENTENCE_END_PATTERN.search(sentences[-1][-1]["text"])
+        ):
+            sentences[-1].extend(piece_sentences.pop(0))
+
+        sentences.extend(piece_sentences)
+        words = [word for sentence in sentences for word in sentence]
+
+    languages = Counter(piece["language_code"] for piece in pieces)
+
+    return {
+        "text": " ".join(word["text"] for word in words),
+        "language_code": languages.most_common(1)[0][0] if languages else None,
+        "words": words,
+        "sentences": sentences,
+    }
+
+
+def transcribe_audio_in_pieces(
+    input_audio: Path,
+    output_dir: Path,
+    piece_duration: float = 1200,
+    overlap: float = 1.0,
+    search_window: float = 60,
+    max_workers: int = 4,
+) -> Path:
+    """
+    Transcribe a long WAV file as pieces cut at silences, transcribed
+    concurrently and stitched back together. Writes the same transcript as
+    transcribe_audio.
+
+    Args:
+        input_audio: WAV file, as written by extract_audio
+        output_dir: Directory of the transcript
+        piece_duration: Target duration of the pieces, in seconds
+        overlap: Audio added on both sides of every cut, in seconds
+        search_window: How far from the target cut times to look for silences
+        max_workers: Pieces transcribed at the same time
+
+    Returns:
+        The path of the transcript
+    """
+    duration = wav_duration(input_audio)
+    cut_points = find_cut_points(
+        detect_silences(input_audio), duration, piece_duration, search_window
+    )
+    bounds = [0.0] + cut_points + [duration]
+    logger.info(f"Transcribing {input_audio.name} in {len(bounds) - 1} pieces")
+
+    with tempfile.TemporaryDirectory() as pieces_dir:
+        piece_paths, offsets = [], []
+        for i, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            piece_start = max(0.0, start - overlap)
+            piece_path = Path(pieces_dir) / f"{input_audio.stem}_{i:03d}.wav"
+            write_wav_segment(input_audio, piece_start, end + overlap, piece_path)
+            piece_paths.append(piece_path)
+            offsets.append(piece_start)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pieces = list(executor.map(fetch_transcript_data, piece_paths))
+
+    return save_transcript(
+        stitch_transcripts(pieces, offsets, cut_points), input_audio, output_dir
+    )
@@ -1,8 +1,7 @@
 from src.core.models import VideoMetadata
+from src.llm.batch import generate_chat_responses_batch
 from src.llm.llm_wraper import generate_chat_response
-from src.llm.prompt_manager import PromptManager
-
-prompt_mgr = PromptManager()
+from src.llm.prompt_manager import prompt_mgr
 
 
 def generate_short_metadata(short_transcript: str) -> VideoMetadata:
@@ -14,7 +13,34 @@ def generate_short_metadata(short_transcript: str) -> VideoMetadata:
     return generate_chat_response(
         base_prompt=prompt["base_prompt"],
         task_prompt=prompt["task_prompt"],
+        instructions=prompt["instructions"],
+        prompt_name=prompt["prompt_name"],
         model=prompt["model"],
         temperature=prompt["temperature"],
         structured_output=VideoMetadata,
     )
+
+
+def generate_short_metadata_batch(
+    short_transcripts: list[str], batch_name: str
+) -> list[VideoMetadata]:
+    """
+    Batch API counterpart of generate_short_metadata. The metadata the batch
+    did not generate (failed requests, or a batch that did not complete) are
+    generated with generate_short_metadata.
+    """
+    shorts_metadata = generate_chat_responses_batch(
+        batch_name,
+        [
+            prompt_mgr.render(
+                "generate_short_metadata", {"short_transcript": short_transcript}
+            )
+            for short_transcript in short_transcripts
+        ],
+        structured_output=VideoMetadata,
+    )
+
+    return [
+        metadata if metadata is not None else generate_short_metadata(transcript)
+        for transcript, metadata in zip(short_transcripts, shorts_metadata)
+    ]
@@ -1,11 +1,11 @@
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-from src.core.models import Segment, ShortContentSelection
+from src.core.models import Segment, ShortContentSelection, concatenate_words
+from src.core.segment_index import SegmentIndex
+from src.llm.batch import generate_chat_responses_batch
 from src.llm.llm_wraper import generate_chat_response
-from src.llm.prompt_manager import PromptManager
-
-prompt_mgr = PromptManager()
+from src.llm.prompt_manager import prompt_mgr
 
 
 def merge_segments_to_sentences(segments: List[Segment]) -> List[Segment]:
@@ -21,11 +21,11 @@ def merge_segments_to_sentences(segments: List[Segment]) -> List[Segment]:
     current_start = segments[0].start
     current_words = []
 
-    for segment in segments:
+    for index, segment in enumerate(segments):
         current_sentence_text += (
             " " + segment.text if current_sentence_text else segment.text
         )
-        current_words.extend(segment.words)
+        current_words.append(segment.words)
 
         # Check if the segment ends with sentence-ending punctuation
         if re.search(r"[.!?]\s*$", segment.text.strip()):
@@ -34,15 +34,15 @@ def merge_segments_to_sentences(segments: List[Segment]) -> List[Segment]:
                 text=current_sentence_text.strip(),
                 start=current_start,
                 end=segment.end,
-                words=current_words,
+                words=concatenate_words(current_words),
             )
             sentences.append(sentence_segment)
 
             # Reset for next sentence
             current_sentence_text = ""
             current_words = []
-            if len(segments) > segments.index(segment) + 1:
-                current_start = segments[segments.index(segment) + 1].start
+            if len(segments) > index + 1:
+                current_start = segments[index + 1].start
 
     # Handle case where last segment doesn't end with punctuation
     if current_sentence_text:
@@ -50,7 +50,7 @@ def merge_segments_to_sentences(segments: List[Segment]) -> List[Segment]:
             text=current_sentence_text.strip(),
             start=current_start,
             end=segments[-1].end,
-            words=current_words,
+            words=concatenate_words(current_words),
         )
         sentences.append(sentence_segment)
 
@@ -71,17 +71,16 @@ def chunk_transcript(
     transcript_start = sentences[0].start
     transcript_end = sentences[-1].end
 
+    sentence_index = SegmentIndex.from_segments(sentences)
     step = chunk_duration - overlap_duration
     current_start = transcript_start
 
     while current_start < transcript_end:
         current_end = current_start + chunk_duration
-        chunk = [
-            s for s in sentences if (s.start >= current_start and s.end <= current_end)
-        ]
+        first, last = sentence_index.within(current_start, current_end)
 
-        if chunk:
-            chunks.append(chunk)
+        if first < last:
+            chunks.append(sentences[first:last])
 
         current_start += step
 
@@ -89,12 +88,55 @@ def chunk_transcript(
 
 
 def select_short_content_using_llm(
-    sentences: List[Segment], target_duration: int
+    sentences: List[Segment], target_duration: int, context: Optional[str] = None
 ) -> Tuple[int, int]:
     """
     LLM selects start and end indices for short from numbered sentences
     Returns tuple of (start_index, end_index)
+    An optional context (e.g. the full transcript) is shared by all chunk calls
+    """
+    prompt = render_short_selection_prompt(sentences, target_duration)
+
+    short_content_selection = generate_chat_response(
+        base_prompt=prompt["base_prompt"],
+        task_prompt=prompt["task_prompt"],
+        instructions=prompt["instructions"],
+        prompt_name=prompt["prompt_name"],
+        context=context,
+        model=prompt["model"],
+        temperature=prompt["temperature"],
+        structured_output=ShortContentSelection,
+    )
+
+    return parse_short_content_selection(short_content_selection)
+
+
+def select_short_content_batch(
+    chunks: List[List[Segment]],
+    target_duration: int,
+    batch_name: str,
+    context: Optional[str] = None,
+) -> List[Tuple[int, int]]:
     """
+    Batch API counterpart of select_short_content_using_llm, one request per
+    chunk of sentences
+    """
+    short_content_selections = generate_chat_responses_batch(
+        batch_name,
+        [render_short_selection_prompt(chunk, target_duration) for chunk in chunks],
+        structured_output=ShortContentSelection,
+        context=context,
+    )
+
+    return [
+        parse_short_content_selection(short_content_selection)
+        for short_content_selection in short_content_selections
+    ]
+
+
+def render_short_selection_prompt(
+    sentences: List[Segment], target_duration: int
+) -> dict:
     # Create numbered sentence list for LLM
     numbered_sentences = []
     for i, sentence in enumerate(sentences):
@@ -102,19 +144,15 @@ def select_short_content_using_llm(
 
     numbered_text = "\n".join(numbered_sentences)
 
-    prompt = prompt_mgr.render(
+    return prompt_mgr.render(
         "select_short_content",
         {"sentences": numbered_text, "target_duration": target_duration},
     )
 
-    short_content_selection = generate_chat_response(
-        base_prompt=prompt["base_prompt"],
-        task_prompt=prompt["task_prompt"],
-        model=prompt["model"],
-        temperature=prompt["temperature"],
-        structured_output=ShortContentSelection,
-    )
 
+def parse_short_content_selection(
+    short_content_selection: ShortContentSelection | None,
+) -> Tuple[int, int]:
     # Extract the segments from the Pydantic model
     if isinstance(short_content_selection, ShortContentSelection):
         return short_content_selection.start_index, short_content_selection.end_index
@@ -124,12 +162,7 @@ def select_short_content_using_llm(
 
 
 def calculate_segments_list_duration(segments: list[Segment]) -> int:
-    duration = 0
-
-    for segment in segments:
-        duration += segment.end - segment.start
-
-    return int(duration)
+    return int(SegmentIndex.from_segments(segments).duration())
 
 
 def validate_and_adjust_duration(
@@ -139,29 +172,23 @@ def validate_and_adjust_duration(
     Ensure the selected sentences don't exceed max_duration + threshold
     If too long, cut from the end to fit within constraints
     """
-    total_duration = calculate_segments_list_duration(selected_sentences)
+    sentence_index = SegmentIndex.from_segments(selected_sentences)
     max_allowed = max_duration + threshold
 
-    if total_duration <= max_allowed:
+    if int(sentence_index.duration()) <= max_allowed:
         return selected_sentences
 
     # Need to cut from the end
-    adjusted_sentences = []
-    current_duration = 0
-
-    for sentence in selected_sentences:
-        sentence_duration = sentence.end - sentence.start
-        if current_duration + sentence_duration <= max_allowed:
-            adjusted_sentences.append(sentence)
-            current_duration += sentence_duration
-        else:
-            break
-
-    return adjusted_sentences
+    return selected_sentences[
+        : sentence_index.fitting(0, len(selected_sentences), max_allowed)
+    ]
 
 
 def process_chunk_for_short(
-    sentences: List[Segment], target_duration: int, threshold: int = 5
+    sentences: List[Segment],
+    target_duration: int,
+    threshold: int = 5,
+    context: Optional[str] = None,
 ) -> Tuple[bool, List[Segment]]:
     """
     Process a single chunk to generate a short
@@ -171,13 +198,27 @@ def process_chunk_for_short(
         return None
 
     # Let LLM select the short
-    start_idx, end_idx = select_short_content_using_llm(sentences, target_duration)
+    start_idx, end_idx = select_short_content_using_llm(
+        sentences, target_duration, context
+    )
+
+    return select_and_adjust_sentences(
+        sentences, start_idx, end_idx, target_duration, threshold
+    )
 
+
+def select_and_adjust_sentences(
+    sentences: List[Segment],
+    start_idx: int | None,
+    end_idx: int | None,
+    target_duration: int,
+    threshold: int = 5,
+) -> List[Segment]:
     # Get selected sentences
     if start_idx is not None and end_idx is not None and start_idx < end_idx:
         selected_sentences = sentences[start_idx : end_idx + 1]
     else:
-        return None, None
+        return []
 
     # Validate and adjust duration if needed
     final_sentences = validate_and_adjust_duration(
@@ -193,17 +234,44 @@ def generate_shorts_from_long_transcript(
     chunk_duration: int = 360,
     chunk_overlap: int = 60,
     threshold: int = 5,
+    transcript_context: bool = False,
+    batch_name: Optional[str] = None,
 ) -> List[List[Segment]]:
     """
     Global function that processes the transcript by chunks to generate shorts
+    If transcript_context is True, the full transcript is sent with every chunk
+    as a shared, cacheable prefix
+    If batch_name is given, all chunks go through a single Batch API job
     """
     # Split into chunks
     sentences = merge_segments_to_sentences(segments)
     chunks = chunk_transcript(sentences, chunk_duration, chunk_overlap)
     print(f"Number of chunks: {len(chunks)}")
+    context = (
+        " ".join(sentence.text for sentence in sentences)
+        if transcript_context
+        else None
+    )
     shorts = []
+
+    if batch_name:
+        chunks = [chunk for chunk in chunks if chunk]
+        selections = select_short_content_batch(
+            chunks, target_duration, batch_name, context
+        )
+        for chunk, (start_idx, end_idx) in zip(chunks, selections):
+            selected_sentences = select_and_adjust_sentences(
+                chunk, start_idx, end_idx, target_duration, threshold
+            )
+            if selected_sentences:
+                shorts.append(selected_sentences)
+
+        return shorts
+
     for chunk in chunks:
-        selected_sentences = process_chunk_for_short(chunk, target_duration, threshold)
+        selected_sentences = process_chunk_for_short(
+            chunk, target_duration, threshold, context
+        )
         if selected_sentences:
             shorts.append(selected_sentences)
 
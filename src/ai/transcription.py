@@ -1,66 +1,197 @@
+import contextvars
+import logging
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Iterator
 
 import assemblyai as aai
-import yaml
 
-from src.core.models import SplitTextOutput
+from src.core.cassettes import file_sha256, with_cassette
+from src.core.models import SplitTextOutput, SplitTextsOutput
+from src.core.transcripts import (TRANSCRIPT_SUFFIX, read_transcript,
+                                  write_transcript)
+from src.llm.batch import generate_chat_responses_batch
 from src.llm.llm_wraper import generate_chat_response
-from src.llm.prompt_manager import PromptManager
-
-prompt_mgr = PromptManager()
+from src.llm.prompt_manager import prompt_mgr
+from src.llm.router import model_router
+from src.llm.telemetry import telemetry_context
+from src.processing.alignment import (align_punctuated_words,
+                                      log_alignment_mismatches)
+from src.processing.text_splitting import split_clauses
+from src.processing.videos import encode_audio_stream
 
 aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
+aai.settings.base_url = os.getenv("ASSEMBLYAI_BASE_URL", aai.settings.base_url)
+
+TRANSCRIPTION_CONFIG = {"language_detection": True}
+
+# Encoding of the uploaded audio, see AUDIO_UPLOAD_ENCODINGS
+UPLOAD_AUDIO_ENCODING = "opus"
+
+logger = logging.getLogger(__name__)
 
 
 def transcribe_audio(input_audio: Path, output_dir: Path) -> Path:
-    config = aai.TranscriptionConfig(language_detection=True)
+    return save_transcript(fetch_transcript_data(input_audio), input_audio, output_dir)
 
-    transcriber = aai.Transcriber()
-    transcript = transcriber.transcribe(str(input_audio), config)
 
+def save_transcript(transcript: dict, input_audio: Path, output_dir: Path) -> Path:
+    """
+    Write the transcript data of an audio file (see fetch_transcript_data) as
+    <output_dir>/<audio name>.transcript (see write_transcript), with
+    punctuated words and segments.
+    """
     # Adding punctuation in the words transcript
-    words = []
-    for i, word in enumerate(transcript.words):
-        words.append(
-            {
-                "word": transcript.text.split(" ")[i],
-                "start": word.start / 1000,
-                "end": word.end / 1000,
-            }
-        )
+    punctuated_words, mismatches = align_punctuated_words(
+        transcript["text"], [word["text"] for word in transcript["words"]]
+    )
+    log_alignment_mismatches(mismatches, len(transcript["words"]))
+
+    words = [
+        {
+            "word": punctuated_word,
+            "start": word["start"] / 1000,
+            "end": word["end"] / 1000,
+        }
+        for punctuated_word, word in zip(punctuated_words, transcript["words"])
+    ]
 
     transcript = {
-        "language": transcript.json_response["language_code"],
-        "transcript": transcript.text,
-        "segments": split_sentences_on_long_time_gap(transcript.get_sentences()),
+        "language": transcript["language_code"],
+        "transcript": transcript["text"],
+        "segments": split_sentences_on_long_time_gap(transcript["sentences"]),
         "words": words,
     }
 
-    output_path = str(output_dir / (input_audio.stem + (".yaml")))
-    with open(output_path, "w", encoding="utf-8") as file:
-        yaml.dump(transcript, file, allow_unicode=True, default_flow_style=False)
+    return write_transcript(
+        transcript, output_dir / (input_audio.stem + TRANSCRIPT_SUFFIX)
+    )
+
+
+def fetch_transcript_data(input_audio: Path) -> dict:
+    """
+    Transcribe the audio with AssemblyAI, as plain data:
+    {"text", "language_code", "words": [{"text", "start", "end"}],
+    "sentences": [[{"text", "start", "end"}]]} with times in milliseconds.
+
+    Responses are recorded and replayed by audio content hash according to the
+    cassette mode (see src.core.cassettes).
+    """
+    config = aai.TranscriptionConfig(**TRANSCRIPTION_CONFIG)
+
+    def transcribe() -> dict:
+        upload_url, _ = upload_audio(input_audio)
+        transcriber = aai.Transcriber()
+        transcript = transcriber.transcribe(upload_url, config)
+
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription failed: {transcript.error}")
+
+        return transcript_to_data(transcript)
+
+    return with_cassette(
+        "transcription", transcription_cassette_request(input_audio), transcribe
+    )
+
+
+class CountingStream:
+    """
+    Read-only view of a binary stream that counts the bytes read. Having no
+    file descriptor, it is uploaded with a chunked transfer encoding, while
+    it is still being written.
+    """
+
+    def __init__(self, stream: BinaryIO, chunk_size: int = 1 << 16):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def __iter__(self) -> Iterator[bytes]:
+        while chunk := self.read(self.chunk_size):
+            yield chunk
+
+
+def upload_audio(
+    input_audio: Path, encoding: str = UPLOAD_AUDIO_ENCODING
+) -> tuple[str, int]:
+    """
+    Upload an audio file to AssemblyAI, compressed by ffmpeg on the fly: the
+    upload starts with the first encoded bytes instead of waiting for the
+    whole file.
+
+    Returns:
+        The upload URL and the number of bytes sent
+    """
+    transcriber = aai.Transcriber()
+
+    if encoding == "wav":
+        with open(str(input_audio), "rb") as file:
+            stream = CountingStream(file)
+            upload_url = transcriber.upload_file(stream)
+    else:
+        process = encode_audio_stream(input_audio, encoding)
+        stream = CountingStream(process.stdout)
+        try:
+            upload_url = transcriber.upload_file(stream)
+        finally:
+            process.stdout.close()
+            error_output = process.stderr.read().decode("utf-8", errors="replace")
+            process.wait()
+
+        if process.returncode != 0:
+            raise RuntimeError(f"Encoding of {input_audio} failed: {error_output}")
+
+    logger.info(
+        f"Uploaded {input_audio.name} as {encoding}: {stream.bytes_read} bytes "
+        f"({os.path.getsize(input_audio)} bytes on disk)"
+    )
+
+    return upload_url, stream.bytes_read
+
 
-    return Path(output_path)
+def transcription_cassette_request(input_audio: Path) -> dict:
+    return {"audio_sha256": file_sha256(input_audio), "config": TRANSCRIPTION_CONFIG}
+
+
+def transcript_to_data(transcript: aai.Transcript) -> dict:
+    def words_to_data(words: list[aai.Word]) -> list[dict]:
+        return [
+            {"text": word.text, "start": word.start, "end": word.end} for word in words
+        ]
+
+    return {
+        "text": transcript.text,
+        "language_code": transcript.json_response["language_code"],
+        "words": words_to_data(transcript.words),
+        "sentences": [
+            words_to_data(sentence.words) for sentence in transcript.get_sentences()
+        ],
+    }
 
 
 def split_sentences_on_long_time_gap(
-    sentences: list[aai.Sentence], ms_time_gap_threshold: float = 500
+    sentences: list[list[dict]], ms_time_gap_threshold: float = 500
 ) -> list[dict]:
     new_segments = []
 
-    for sentence in sentences:
-        if not sentence.words:
+    for sentence_words in sentences:
+        if not sentence_words:
             continue
 
-        current_words = [sentence.words[0]]
+        current_words = [sentence_words[0]]
 
-        for i in range(1, len(sentence.words)):
-            prev_word = sentence.words[i - 1]
-            curr_word = sentence.words[i]
-            if (curr_word.start - prev_word.end) > ms_time_gap_threshold:
-                new_segments.append(" ".join(w.text for w in current_words))
+        for i in range(1, len(sentence_words)):
+            prev_word = sentence_words[i - 1]
+            curr_word = sentence_words[i]
+            if (curr_word["start"] - prev_word["end"]) > ms_time_gap_threshold:
+                new_segments.append(" ".join(w["text"] for w in current_words))
 
                 # Start a new sentence
                 current_words = [curr_word]
@@ -69,7 +200,7 @@ def split_sentences_on_long_time_gap(
 
         # Append the last segment
         if current_words:
-            new_segments.append(" ".join(w.text for w in current_words))
+            new_segments.append(" ".join(w["text"] for w in current_words))
 
     return new_segments
 
@@ -90,45 +221,167 @@ def split_text_on_comas(text: str) -> list[str]:
 def split_text_using_llm(text: str) -> list[str]:
     prompt = prompt_mgr.render("split_long_text", {"text": text})
 
-    splitted_text = generate_chat_response(
-        base_prompt=prompt["base_prompt"],
-        task_prompt=prompt["task_prompt"],
-        model=prompt["model"],
-        temperature=prompt["temperature"],
+    # Small models first, escalating when the split does not rejoin into the text
+    splitted_text = model_router.route(
+        prompt,
+        lambda model: generate_chat_response(
+            base_prompt=prompt["base_prompt"],
+            task_prompt=prompt["task_prompt"],
+            instructions=prompt["instructions"],
+            prompt_name=prompt["prompt_name"],
+            model=model,
+            temperature=prompt["temperature"],
+            structured_output=SplitTextOutput,
+        ),
+        validate=lambda splitted_text: is_valid_split(text, splitted_text),
+        input_chars=len(text),
         structured_output=SplitTextOutput,
     )
 
-    # Extract the segments from the Pydantic model
-    if isinstance(splitted_text, SplitTextOutput):
-        result = splitted_text.segments
-    else:
-        # Fallback if structured output fails
-        result = [text]
+    return validate_llm_split(text, splitted_text)
+
+
+def split_texts_using_llm(texts: list[str]) -> list[list[str]]:
+    """
+    Split several texts with a single structured request. Texts whose split
+    does not rejoin into them are split again one by one.
+    """
+    prompt = prompt_mgr.render("split_long_texts", {"texts": texts})
+
+    def is_complete(splitted_texts: SplitTextsOutput | None) -> bool:
+        return isinstance(splitted_texts, SplitTextsOutput) and len(
+            splitted_texts.splits
+        ) == len(texts)
+
+    splitted_texts = model_router.route(
+        prompt,
+        lambda model: generate_chat_response(
+            base_prompt=prompt["base_prompt"],
+            task_prompt=prompt["task_prompt"],
+            instructions=prompt["instructions"],
+            prompt_name=prompt["prompt_name"],
+            model=model,
+            temperature=prompt["temperature"],
+            structured_output=SplitTextsOutput,
+        ),
+        validate=is_complete,
+        input_chars=sum(len(text) for text in texts),
+        structured_output=SplitTextsOutput,
+    )
+    splits = (
+        splitted_texts.splits if is_complete(splitted_texts) else [None] * len(texts)
+    )
+
+    return [
+        split if " ".join(split or []) == text else split_text_using_llm(text)
+        for text, split in zip(texts, splits)
+    ]
+
+
+def split_texts_using_llm_concurrently(
+    texts: list[str], texts_per_request: int = 10, max_workers: int = 4
+) -> list[list[str]]:
+    """
+    Split the texts with concurrent requests of texts_per_request texts each,
+    keeping the order of the texts.
+    """
+    text_groups = [
+        texts[i : i + texts_per_request]
+        for i in range(0, len(texts), texts_per_request)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each request runs in a copy of this context to keep its telemetry tags
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run, split_texts_using_llm, text_group
+            )
+            for text_group in text_groups
+        ]
+
+        return [split for future in futures for split in future.result()]
+
+
+def split_texts_using_llm_batch(texts: list[str], batch_name: str) -> list[list[str]]:
+    """
+    Batch API counterpart of split_text_using_llm, for offline runs.
+    """
+    splitted_texts = generate_chat_responses_batch(
+        batch_name,
+        [prompt_mgr.render("split_long_text", {"text": text}) for text in texts],
+        structured_output=SplitTextOutput,
+    )
 
-    if (" ").join(result) == text:
-        return result
+    return [
+        validate_llm_split(text, splitted_text)
+        for text, splitted_text in zip(texts, splitted_texts)
+    ]
+
+
+def is_valid_split(text: str, splitted_text: SplitTextOutput | None) -> bool:
+    return (
+        isinstance(splitted_text, SplitTextOutput)
+        and (" ").join(splitted_text.segments) == text
+    )
+
+
+def validate_llm_split(text: str, splitted_text: SplitTextOutput | None) -> list[str]:
+    if is_valid_split(text, splitted_text):
+        return splitted_text.segments
     else:
+        # Fallback if structured output fails or does not rejoin into the text
         return [text]
 
 
 def subdivide_transcript_segments(
-    transcript_path: Path, max_segment_length: int = 100
+    transcript_path: Path, max_segment_length: int = 100, batch: bool = False
 ) -> None:
-    with open(transcript_path, "r", encoding="utf-8") as f:
-        transcript = yaml.safe_load(f)
+    """
+    Split the transcript segments on commas, then split the segments still
+    longer than max_segment_length on clause boundaries, and only use the LLM
+    for the segments without an acceptable local split. These are split by
+    concurrent requests of several segments each, or with batch=True through a
+    single (resumable) Batch API job.
+    """
+    transcript = read_transcript(transcript_path)
 
     segments = []
     coma_split_segments = []
     for segment in transcript["segments"]:
         coma_split_segments.extend(split_text_on_comas(segment))
 
+    local_splits = {}
+    long_segments = []
+    for segment in coma_split_segments:
+        if len(segment) < max_segment_length or segment in local_splits:
+            continue
+
+        local_split = split_clauses(
+            segment, max_segment_length, transcript.get("language") or "en"
+        )
+        if local_split is not None:
+            local_splits[segment] = local_split
+        else:
+            long_segments.append(segment)
+
+    with telemetry_context(
+        stage="transcript_subdivision", video_id=Path(transcript_path).stem
+    ):
+        if batch:
+            llm_splits = split_texts_using_llm_batch(
+                long_segments, f"{Path(transcript_path).stem}_split_long_text"
+            )
+        else:
+            llm_splits = split_texts_using_llm_concurrently(long_segments)
+
+    llm_splits = iter(llm_splits)
     for segment in coma_split_segments:
         if len(segment) < max_segment_length:
             segments.append(segment)
+        elif segment in local_splits:
+            segments.extend(local_splits[segment])
         else:
-            segments.extend(split_text_using_llm(segment))
+            segments.extend(next(llm_splits))
 
     transcript["segments"] = segments
-
-    with open(transcript_path, "w", encoding="utf-8") as file:
-        yaml.dump(transcript, file, allow_unicode=True, default_flow_style=False)
+    write_transcript(transcript, transcript_path)
@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+import assemblyai as aai
+
+from src.ai.transcription import (TRANSCRIPTION_CONFIG, UPLOAD_AUDIO_ENCODING,
+                                  save_transcript, transcript_to_data,
+                                  transcription_cassette_request, upload_audio)
+from src.core.cassettes import cassette_mode, load_cassette, save_cassette
+from src.core.transcripts import transcript_exists
+
+TRANSCRIPTION_JOBS_PATH = Path("data/transcription_jobs.json")
+
+# Rough progress of a job in each status, for display
+JOB_PROGRESS = {
+    "pending": 0.0,
+    "uploaded": 0.2,
+    "queued": 0.3,
+    "processing": 0.6,
+    "completed": 1.0,
+    "error": 1.0,
+}
+JOB_FINAL_STATUSES = ("completed", "error")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TranscriptionJob:
+    audio_path: str
+    output_dir: str
+    audio_sha256: str
+    status: str = "pending"
+    upload_url: Optional[str] = None
+    audio_bytes: int = 0
+    upload_bytes: int = 0
+    upload_seconds: float = 0.0
+    transcript_id: Optional[str] = None
+    transcript_path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    submitted_at: Optional[float] = None
+    completed_at: Optional[float] = None
+    polls: int = 0
+    next_poll_at: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return Path(self.audio_path).stem
+
+    @property
+    def progress(self) -> float:
+        return JOB_PROGRESS[self.status]
+
+    @property
+    def done(self) -> bool:
+        return self.status in JOB_FINAL_STATUSES
+
+
+class TranscriptionJobManager:
+    """
+    Transcribes several audio files at once with AssemblyAI.
+
+    Files are uploaded (compressed with upload_encoding while being sent) and
+    submitted concurrently, at most max_submissions at a time, then polled
+    concurrently, each job with an exponential backoff between poll_interval
+    and max_poll_interval, until it fails if it is not transcribed
+    job_timeout seconds after its submission. The state of every job is
+    saved in state_path after each step, so after a restart the jobs resume
+    polling instead of uploading the files again.
+    """
+
+    def __init__(
+        self,
+        state_path: Path = TRANSCRIPTION_JOBS_PATH,
+        max_submissions: int = 4,
+        poll_interval: float = 3,
+        max_poll_interval: float = 30,
+        job_timeout: float = 3 * 3600,
+        upload_encoding: str = UPLOAD_AUDIO_ENCODING,
+    ):
+        self.state_path = state_path
+        self.max_submissions = max_submissions
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.job_timeout = job_timeout
+        self.upload_encoding = upload_encoding
+        self.config = aai.TranscriptionConfig(**TRANSCRIPTION_CONFIG)
+        self._lock = threading.Lock()
+        self.jobs = self._load_state()
+
+    def _load_state(self) -> dict[str, TranscriptionJob]:
+        if not self.state_path.exists():
+            return {}
+
+        with open(str(self.state_path), "r", encoding="utf-8") as file:
+            return {
+                key: TranscriptionJob(**job) for key, job in json.load(file).items()
+            }
+
+    def _save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            state = {key: asdict(job) for key, job in self.jobs.items()}
+            with open(str(self.state_path), "w", encoding="utf-8") as file:
+                json.dump(state, file, indent=2)
+
+    def add(self, audio_path: Path, output_dir: Path) -> TranscriptionJob:
+        """
+        Add a transcription job, or return the existing job for the same audio.
+        A job that failed, or whose transcript was deleted, is started again,
+        without uploading the audio again if it failed after its upload.
+        """
+        cassette_request = transcription_cassette_request(audio_path)
+        key = cassette_request["audio_sha256"]
+
+        job = self.jobs.get(key)
+        if job is not None and not (
+            job.status == "error"
+            or (
+                job.status == "completed" and not transcript_exists(job.transcript_path)
+            )
+        ):
+            return job
+
+        previous_job = job
+        job = TranscriptionJob(str(audio_path), str(output_dir), key)
+        if previous_job is not None and previous_job.status == "error":
+            job.upload_url = previous_job.upload_url
+            job.audio_bytes = previous_job.audio_bytes
+            job.upload_bytes = previous_job.upload_bytes
+            job.upload_seconds = previous_job.upload_seconds
+            if job.upload_url is not None:
+                job.status = "uploaded"
+        with self._lock:
+            self.jobs[key] = job
+
+        if cassette_mode() == "replay":
+            self._complete(job, load_cassette("transcription", cassette_request))
+        self._save_state()
+
+        return job
+
+    def _submit(self, job: TranscriptionJob) -> None:
+        try:
+            transcriber = aai.Transcriber(config=self.config)
+            if job.upload_url is None:
+                start_time = time.perf_counter()
+                job.upload_url, job.upload_bytes = upload_audio(
+                    Path(job.audio_path), self.upload_encoding
+                )
+                job.upload_seconds = time.perf_counter() - start_time
+                job.audio_bytes = os.path.getsize(job.audio_path)
+                job.status = "uploaded"
+                self._save_state()
+
+            transcript = transcriber.submit(job.upload_url, self.config)
+            job.transcript_id = transcript.id
+            job.status = transcript.status.value
+            job.submitted_at = time.time()
+            job.next_poll_at = job.submitted_at + self.poll_interval
+        except Exception as e:
+            # The upload_url is kept, add reuses it to submit the audio again
+            logger.warning(f"Submission of {job.name} failed: {e}")
+            job.status = "error"
+            job.error = str(e)
+
+        self._save_state()
+
+    def _poll(self, job: TranscriptionJob) -> None:
+        transcript, transcript_data = None, None
+        try:
+            transcript = aai.Transcript.get_by_id(job.transcript_id)
+            if transcript.status == aai.TranscriptStatus.completed:
+                transcript_data = transcript_to_data(transcript)
+        except Exception as e:
+            # Transient polling errors only delay the next poll
+            logger.warning(f"Polling of {job.name} failed: {e}")
+
+        if transcript_data is not None:
+            if cassette_mode() == "record":
+                save_cassette(
+                    "transcription",
+                    transcription_cassette_request(Path(job.audio_path)),
+                    transcript_data,
+                )
+            self._complete(job, transcript_data)
+        elif transcript is not None and transcript.status == aai.TranscriptStatus.error:
+            job.status = "error"
+            job.error = transcript.error
+        elif time.time() > (job.submitted_at or job.created_at) + self.job_timeout:
+            logger.warning(f"Transcription of {job.name} timed out")
+            job.status = "error"
+            job.error = f"Not transcribed after {self.job_timeout:.0f} seconds"
+        else:
+            if transcript is not None and transcript.status in (
+                aai.TranscriptStatus.queued,
+                aai.TranscriptStatus.processing,
+            ):
+                job.status = transcript.status.value
+            job.polls += 1
+            job.next_poll_at = time.time() + min(
+                self.max_poll_interval, self.poll_interval * 2 ** (job.polls - 1)
+            )
+
+        self._save_state()
+
+    def _complete(self, job: TranscriptionJob, transcript_data: dict) -> None:
+        job.transcript_path = str(
+            save_transcript(transcript_data, Path(job.audio_path), Path(job.output_dir))
+        )
+        job.status = "completed"
+        job.completed_at = time.time()
+
+    def run(
+        self,
+        jobs: Optional[list[TranscriptionJob]] = None,
+        on_progress: Optional[Callable[[list[TranscriptionJob]], None]] = None,
+    ) -> list[TranscriptionJob]:
+        """
+        Submit and poll the jobs (all of them if None) until they are all
+        completed or failed.
+
+        Args:
+            jobs: Jobs to run, from add
+            on_progress: Called with the jobs after every step
+
+        Returns:
+            The jobs, with their transcript_path or error
+        """
+        jobs = list(self.jobs.values()) if jobs is None else jobs
+
+        with ThreadPoolExecutor(max_workers=self.max_submissions) as executor:
+            list(
+                executor.map(
+                    self._submit,
+                    [
+                        job
+                        for job in jobs
+                        if job.status in ("pending", "uploaded")
+                        and job.transcript_id is None
+                    ],
+                )
+            )
+            if on_progress:
+                on_progress(jobs)
+
+            while not all(job.done for job in jobs):
+                due_jobs = [
+                    job
+                    for job in jobs
+                    if not job.done and job.next_poll_at <= time.time()
+                ]
+                list(executor.map(self._poll, due_jobs))
+                if on_progress and due_jobs:
+                    on_progress(jobs)
+
+                pending_jobs = [job for job in jobs if not job.done]
+                if pending_jobs:
+                    next_poll_at = min(job.next_poll_at for job in pending_jobs)
+                    time.sleep(max(0.0, next_poll_at - time.time()))
+
+        return jobs
+
+
+def transcribe_audio_files(
+    audio_paths: list[Path],
+    output_dir: Path,
+    on_progress: Optional[Callable[[list[TranscriptionJob]], None]] = None,
+) -> list[TranscriptionJob]:
+    """
+    Transcribe several audio files concurrently, see TranscriptionJobManager.
+    """
+    manager = TranscriptionJobManager()
+    jobs = [manager.add(audio_path, output_dir) for audio_path in audio_paths]
+
+    return manager.run(jobs, on_progress)
@@ -1,14 +1,20 @@
-from src.core.models import Segment, Word
+import re
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
+
+from src.core.models import Segment, WordTable
+from src.llm.batch import generate_chat_responses_batch
 from src.llm.llm_wraper import generate_chat_response
-from src.llm.prompt_manager import PromptManager
+from src.llm.prompt_manager import prompt_mgr
 
-prompt_mgr = PromptManager()
+VOWEL_GROUPS_PATTERN = re.compile(r"[aeiouyàâäéèêëîïôöùûüœæåøáíóúıāēīōū]+", re.I)
 
 
-def translate_text_chunk(
-    text_chunk: list[str], source_lang: str, target_lang: str = "fr"
-) -> list[str]:
-    prompt = prompt_mgr.render(
+def _render_translation_prompt(
+    text_chunk: list[str], source_lang: str, target_lang: str
+) -> dict:
+    return prompt_mgr.render(
         "translate_splitted_text",
         {
             "text": ("\n").join(text_chunk),
@@ -16,20 +22,89 @@ def translate_text_chunk(
             "target_lang": target_lang,
         },
     )
+
+
+def translate_text_chunk(
+    text_chunk: list[str],
+    source_lang: str,
+    target_lang: str = "fr",
+    context: Optional[str] = None,
+) -> list[str]:
+    prompt = _render_translation_prompt(text_chunk, source_lang, target_lang)
     translated_text = generate_chat_response(
         base_prompt=prompt["base_prompt"],
         task_prompt=prompt["task_prompt"],
+        instructions=prompt["instructions"],
+        prompt_name=prompt["prompt_name"],
+        context=context,
         model=prompt["model"],
         temperature=prompt["temperature"],
     ).split("\n")
 
-    if len(translated_text) == len(text_chunk):
+    return fit_translated_lines(translated_text, len(text_chunk))
+
+
+def fit_translated_lines(translated_text: list[str], nb_lines: int) -> list[str]:
+    if len(translated_text) == nb_lines:
         return translated_text
     else:
-        if len(translated_text) < len(text_chunk):
-            return translated_text + ["."] * (len(text_chunk) - len(translated_text))
+        if len(translated_text) < nb_lines:
+            return translated_text + ["."] * (nb_lines - len(translated_text))
         else:
-            return translated_text[: len(text_chunk)]
+            return translated_text[:nb_lines]
+
+
+def iter_completed_lines(text_deltas: Iterable[str]) -> Iterator[str]:
+    """
+    Regroup streamed text deltas into lines, as str.split("\n") would.
+    """
+    buffer = ""
+    for delta in text_deltas:
+        buffer += delta
+        *lines, buffer = buffer.split("\n")
+        yield from lines
+
+    yield buffer
+
+
+def stream_text_chunk_translation(
+    text_chunk: list[str],
+    source_lang: str,
+    target_lang: str = "fr",
+    context: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of translate_text_chunk: yields each translated line
+    as soon as the model has finished writing it, always yielding exactly one
+    line per input line.
+    """
+    prompt = _render_translation_prompt(text_chunk, source_lang, target_lang)
+    text_deltas = generate_chat_response(
+        base_prompt=prompt["base_prompt"],
+        task_prompt=prompt["task_prompt"],
+        instructions=prompt["instructions"],
+        prompt_name=prompt["prompt_name"],
+        context=context,
+        model=prompt["model"],
+        temperature=prompt["temperature"],
+        stream=True,
+    )
+
+    nb_lines = 0
+    for line in iter_completed_lines(text_deltas):
+        if nb_lines == len(text_chunk):
+            break
+        yield line
+        nb_lines += 1
+
+    yield from ["."] * (len(text_chunk) - nb_lines)
+
+
+def _chunk_segments(segments: list, chunk_size: int, overlap: int) -> list[list]:
+    return [
+        segments[i : min(i + chunk_size, len(segments))]
+        for i in range(0, len(segments), chunk_size - overlap)
+    ]
 
 
 def translate_segments(
@@ -38,6 +113,7 @@ def translate_segments(
     target_lang: str = "fr",
     chunk_size: int = 12,
     overlap: int = 2,
+    context: Optional[str] = None,
 ) -> list[str]:
     """
     Translate text in sentence-based chunks using the OpenAI API.
@@ -47,18 +123,19 @@ def translate_segments(
     :param overlap: Number of overlapping sentences between chunks.
     :param source_lang: Source language name (e.g., "French").
     :param target_lang: Target language name (e.g., "English").
+    :param context: Optional text shared by every chunk call (e.g. the full
+        transcript), sent as part of the cacheable prompt prefix.
     :return: Translated text segments.
     """
 
     # Create chunks of sentences
-    chunks = [
-        segments[i : min(i + chunk_size, len(segments))]
-        for i in range(0, len(segments), chunk_size - overlap)
-    ]
+    chunks = _chunk_segments(segments, chunk_size, overlap)
 
     translated_chunks = []
     for i, chunk in enumerate(chunks):
-        translated_chunk = translate_text_chunk(chunk, source_lang, target_lang)
+        translated_chunk = translate_text_chunk(
+            chunk, source_lang, target_lang, context
+        )
 
         if i == 0:
             translated_chunks += translated_chunk
@@ -68,33 +145,234 @@ def translate_segments(
     return translated_chunks
 
 
+def translate_segments_batch(
+    segments_lists: list[list[str]],
+    source_lang: str,
+    target_lang: str,
+    batch_name: str,
+    chunk_size: int = 12,
+    overlap: int = 2,
+    context: Optional[str] = None,
+) -> list[list[str]]:
+    """
+    Batch API counterpart of translate_segments: the chunks of every list of
+    segments are translated in a single (resumable) batch job. The chunks the
+    batch did not translate are translated with translate_text_chunk.
+    """
+    chunks_lists = [
+        _chunk_segments(segments, chunk_size, overlap) for segments in segments_lists
+    ]
+    chunks = [chunk for chunks in chunks_lists for chunk in chunks]
+
+    translated_texts = iter(
+        generate_chat_responses_batch(
+            batch_name,
+            [
+                _render_translation_prompt(chunk, source_lang, target_lang)
+                for chunk in chunks
+            ],
+            context=context,
+        )
+    )
+
+    translated_segments_lists = []
+    for chunks in chunks_lists:
+        translated_segments = []
+        for i, chunk in enumerate(chunks):
+            translated_text = next(translated_texts)
+            if translated_text is None:
+                # Failed in the batch, or the batch did not complete
+                translated_chunk = translate_text_chunk(
+                    chunk, source_lang, target_lang, context
+                )
+            else:
+                translated_chunk = fit_translated_lines(
+                    translated_text.split("\n"), len(chunk)
+                )
+            translated_segments += (
+                translated_chunk if i == 0 else translated_chunk[overlap:]
+            )
+        translated_segments_lists.append(translated_segments)
+
+    return translated_segments_lists
+
+
+def stream_translate_segments(
+    segments: list[str],
+    source_lang: str,
+    target_lang: str = "fr",
+    chunk_size: int = 12,
+    overlap: int = 2,
+    context: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of translate_segments: yields the translated
+    segments one by one, in order, as soon as they are generated.
+    """
+    for i, chunk in enumerate(_chunk_segments(segments, chunk_size, overlap)):
+        translated_lines = stream_text_chunk_translation(
+            chunk, source_lang, target_lang, context
+        )
+        for j, translated_line in enumerate(translated_lines):
+            if i == 0 or j >= overlap:
+                yield translated_line
+
+
+def stream_translated_segments(
+    segments: list[Segment],
+    source_lang: str,
+    target_lang: str = "fr",
+    weights: str | Callable[[str], float] = "characters",
+) -> Iterator[Segment]:
+    """
+    Yield timed translated segments as they arrive, ready to be fed to
+    generate_subtitles.
+    """
+    translated_lines = stream_translate_segments(
+        [segment.text for segment in segments], source_lang, target_lang
+    )
+    for segment, translated_line in zip(segments, translated_lines):
+        yield create_translated_segments([segment], [translated_line], weights)[0]
+
+
+def estimate_syllables(word: str) -> int:
+    """
+    Rough syllable estimate: number of vowel groups, at least one per word.
+    """
+    return max(1, len(VOWEL_GROUPS_PATTERN.findall(word)))
+
+
+WORD_WEIGHT_FUNCTIONS: dict[str, Callable[[str], float]] = {
+    "characters": len,
+    "syllables": estimate_syllables,
+    # The source profile spreads words by characters, then warps the result
+    # along the original word timings (see allocate_word_timings).
+    "source": len,
+}
+
+
+def allocate_word_timings(
+    segments: list[Segment],
+    segments_words: list[list[str]],
+    weights: str | Callable[[str], float] = "characters",
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Assign start/end times to every word of every segment in a single pass.
+
+    Each word gets a share of its segment duration proportional to its weight.
+    Segments whose words all weigh zero are split evenly.
+
+    :param segments: Segments providing the time span of each word list.
+    :param segments_words: Words to time, one list per segment.
+    :param weights: "characters", "syllables", "source" or a callable giving
+        the weight of a word. "source" follows the timing profile of the
+        original segment words instead of assuming a constant speech rate.
+    :return: Flat arrays of word starts and ends, in segment order.
+    """
+    weight_function = (
+        WORD_WEIGHT_FUNCTIONS[weights] if isinstance(weights, str) else weights
+    )
+
+    counts = np.fromiter((len(words) for words in segments_words), dtype=np.int64)
+    if counts.sum() == 0:
+        return np.empty(0), np.empty(0)
+
+    segment_index = np.repeat(np.arange(len(segments_words)), counts)
+    first_word_index = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    word_weights = np.fromiter(
+        (weight_function(word) for words in segments_words for word in words),
+        dtype=np.float64,
+        count=int(counts.sum()),
+    )
+
+    non_empty = counts > 0
+    totals = np.zeros(len(counts))
+    totals[non_empty] = np.add.reduceat(word_weights, first_word_index[non_empty])
+    word_weights = np.where(totals[segment_index] > 0, word_weights, 1.0)
+    totals[non_empty] = np.add.reduceat(word_weights, first_word_index[non_empty])
+
+    cumulative = np.concatenate(([0.0], np.cumsum(word_weights)))
+    weight_before_segment = cumulative[first_word_index]
+    word_end_fraction = (
+        cumulative[1:] - weight_before_segment[segment_index]
+    ) / totals[segment_index]
+    word_start_fraction = word_end_fraction - word_weights / totals[segment_index]
+
+    if weights == "source":
+        return (
+            _warp_on_source_timings(segments, segment_index, word_start_fraction),
+            _warp_on_source_timings(segments, segment_index, word_end_fraction),
+        )
+
+    segment_starts = np.fromiter((s.start for s in segments), dtype=np.float64)
+    segment_durations = (
+        np.fromiter((s.end for s in segments), dtype=np.float64) - segment_starts
+    )
+    starts = (
+        segment_starts[segment_index]
+        + segment_durations[segment_index] * word_start_fraction
+    )
+    ends = (
+        segment_starts[segment_index]
+        + segment_durations[segment_index] * word_end_fraction
+    )
+
+    return starts, ends
+
+
+def _warp_on_source_timings(
+    segments: list[Segment], segment_index: np.ndarray, fractions: np.ndarray
+) -> np.ndarray:
+    # Every segment maps its [0, 1] character fraction onto a disjoint
+    # [2k, 2k + 1] range, so one np.interp call covers all segments.
+    knots_x, knots_y = [], []
+    for k, segment in enumerate(segments):
+        source_words = segment.words or []
+        total_chars = sum(len(word.word) for word in source_words)
+        knots_x.append(2 * k)
+        knots_y.append(segment.start)
+        chars_before = 0
+        for word in source_words if total_chars else []:
+            knots_x.append(2 * k + chars_before / total_chars)
+            knots_y.append(word.start)
+            chars_before += len(word.word)
+            knots_x.append(2 * k + chars_before / total_chars)
+            knots_y.append(word.end)
+        knots_x.append(2 * k + 1)
+        knots_y.append(segment.end)
+
+    return np.interp(2 * segment_index + fractions, knots_x, knots_y)
+
+
 def create_translated_segments(
-    segments: list[Segment], translated_text_segments: list[str]
+    segments: list[Segment],
+    translated_text_segments: list[str],
+    weights: str | Callable[[str], float] = "characters",
 ) -> list[Segment]:
-    translated_segments = []
-    print(translated_text_segments)
     assert len(segments) == len(
         translated_text_segments
     ), f"Number of segments and translated segments should match: {len(segments)}!={len(translated_text_segments)}"
 
-    for segment, translated_text in zip(segments, translated_text_segments):
-        words = translated_text.split(" ")
-        segment_duration = segment.end - segment.start
-
-        translated_words = []
-        for i, word in enumerate(words):
-            translated_word_start = segment.start + segment_duration * len(
-                "".join(words[:i])
-            ) / len("".join(words))
-            translated_word_end = segment.start + segment_duration * len(
-                "".join(words[: i + 1])
-            ) / len("".join(words))
-            translated_words.append(
-                Word(word, translated_word_start, translated_word_end)
-            )
+    segments_words = [text.split(" ") for text in translated_text_segments]
+    starts, ends = allocate_word_timings(segments, segments_words, weights)
+    words = WordTable.from_lists(
+        [word for words in segments_words for word in words], starts, ends
+    )
 
+    translated_segments = []
+    word_index = 0
+    for segment, translated_text, segment_words in zip(
+        segments, translated_text_segments, segments_words
+    ):
+        next_word_index = word_index + len(segment_words)
         translated_segments.append(
-            Segment(translated_text, segment.start, segment.end, translated_words)
+            Segment(
+                translated_text,
+                segment.start,
+                segment.end,
+                words[word_index:next_word_index],
+            )
         )
+        word_index = next_word_index
 
     return translated_segments
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(KeyError):
+    pass
+
+
+def cassette_mode() -> str:
+    """
+    Cassette mode from the CASSETTE_MODE environment variable:
+    - off: call the services
+    - record: call the services and save every response
+    - replay: serve the saved responses, without any network call
+    """
+    mode = os.getenv("CASSETTE_MODE", "off")
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"CASSETTE_MODE should be one of {CASSETTE_MODES}: {mode}")
+    return mode
+
+
+def cassette_dir() -> Path:
+    return Path(os.getenv("CASSETTE_DIR", "data/cassettes"))
+
+
+def cassette_path(namespace: str, request: dict) -> Path:
+    request_hash = hashlib.sha256(
+        json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return cassette_dir() / namespace / f"{request_hash}.json"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(str(path), "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_cassette(namespace: str, request: dict) -> dict:
+    path = cassette_path(namespace, request)
+    if not path.exists():
+        raise CassetteMissError(f"No {namespace} cassette recorded for {path.stem}")
+
+    with open(str(path), "r", encoding="utf-8") as file:
+        return json.load(file)["response"]
+
+
+def save_cassette(namespace: str, request: dict, response: dict) -> None:
+    path = cassette_path(namespace, request)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(str(path), "w", encoding="utf-8") as file:
+        json.dump(
+            {"request": request, "response": response},
+            file,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def with_cassette(namespace: str, request: dict, call: Callable[[], dict]) -> dict:
+    """
+    Run call() according to the cassette mode: record its JSON-serialisable
+    response under the request hash, or replay a previously recorded one.
+    """
+    mode = cassette_mode()
+
+    if mode == "replay":
+        return load_cassette(namespace, request)
+
+    response = call()
+    if mode == "record":
+        save_cassette(namespace, request, response)
+
+    return response
@@ -1,17 +1,281 @@
-from typing import List
+from typing import Iterator, List, Optional, Sequence, Union
 
+import numpy as np
 from pydantic import BaseModel, Field
 
+# Separates the texts of a text blob, see encode_texts. Texts may contain it
+# too, the offsets are what delimits them (see decode_texts)
+TEXT_SEPARATOR = b"\n"
+
+
+def encode_texts(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encode texts as a single UTF-8 blob, with the offset of every text in it.
+    Text i is blob[offsets[i] : offsets[i + 1] - 1], the last byte being the
+    separator.
+    """
+    encoded_texts = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded_texts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) + 1 for text in encoded_texts])
+
+    blob = TEXT_SEPARATOR.join(encoded_texts)
+    return offsets, np.frombuffer(blob, dtype=np.uint8)
+
+
+def decode_texts(
+    blob: np.ndarray, offsets: np.ndarray, first: int = 0, last: Optional[int] = None
+) -> list[str]:
+    """
+    Decode the texts [first, last) of a blob written by encode_texts.
+    """
+    last = len(offsets) - 1 if last is None else last
+    if first >= last:
+        return []
+
+    start = int(offsets[first])
+    data = blob[start : int(offsets[last]) - 1].tobytes()
+    texts = data.decode("utf-8").split(TEXT_SEPARATOR.decode())
+    if len(texts) == last - first:
+        return texts
+
+    # Some texts contain the separator: cut them at their offsets instead
+    bounds = (offsets[first : last + 1] - start).tolist()
+    return [
+        data[text_start : text_end - 1].decode("utf-8")
+        for text_start, text_end in zip(bounds, bounds[1:])
+    ]
+
 
 class Word:
-    def __init__(self, word: str, start: int, end: int):
+    __slots__ = ("word", "start", "end")
+
+    def __init__(self, word: str, start: float, end: float):
         self.word = word
         self.start = start
         self.end = end
 
 
+class WordTable:
+    """
+    Words stored column-wise: texts as a blob with offsets (see encode_texts),
+    starts and ends as arrays, e.g. the float32 columns of a transcript file
+    with decimals=3 to read them back as the millisecond times they were, and
+    time_offset subtracted from the times once read (e.g. to make them
+    relative to the start of a short).
+
+    A table is a view on the [first, last) range of its columns: slicing it
+    returns a view on the same columns without copying them, and Word objects
+    are only created when words are accessed.
+    """
+
+    __slots__ = (
+        "_text",
+        "_offsets",
+        "_starts",
+        "_ends",
+        "_first",
+        "_last",
+        "_decimals",
+        "_time_offset",
+    )
+
+    def __init__(
+        self,
+        text: np.ndarray,
+        offsets: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        first: int = 0,
+        last: Optional[int] = None,
+        decimals: Optional[int] = None,
+        time_offset: float = 0,
+    ):
+        self._text = text
+        self._offsets = offsets
+        self._starts = starts
+        self._ends = ends
+        self._first = first
+        self._last = len(starts) if last is None else last
+        self._decimals = decimals
+        self._time_offset = time_offset
+
+    @classmethod
+    def from_lists(
+        cls, words: list[str], starts: Sequence[float], ends: Sequence[float]
+    ) -> "WordTable":
+        offsets, text = encode_texts(words)
+        return cls(
+            text,
+            offsets,
+            np.asarray(starts, dtype=np.float64),
+            np.asarray(ends, dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return self._last - self._first
+
+    def __iter__(self) -> Iterator[Word]:
+        for index in range(self._first, self._last):
+            yield self._word(index)
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Word, "WordTable"]:
+        if isinstance(key, slice):
+            first, last, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("WordTable slices must be contiguous")
+            return WordTable(
+                self._text,
+                self._offsets,
+                self._starts,
+                self._ends,
+                self._first + first,
+                self._first + max(first, last),
+                self._decimals,
+                self._time_offset,
+            )
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("WordTable index out of range")
+        return self._word(self._first + key)
+
+    def _word(self, index: int) -> Word:
+        return Word(
+            self._word_text(index),
+            self._time(self._starts[index]),
+            self._time(self._ends[index]),
+        )
+
+    def _time(self, time: np.floating) -> float:
+        time = float(time)
+        if self._decimals is not None:
+            time = round(time, self._decimals)
+        return time - self._time_offset if self._time_offset else time
+
+    def _times(self, times: np.ndarray) -> list[float]:
+        """
+        Times as _time reads them, for a whole column at once.
+        """
+        times = times.tolist()
+        if self._decimals is not None and self._time_offset:
+            return [round(time, self._decimals) - self._time_offset for time in times]
+        if self._decimals is not None:
+            return [round(time, self._decimals) for time in times]
+        if self._time_offset:
+            return [time - self._time_offset for time in times]
+        return times
+
+    def _word_text(self, index: int) -> str:
+        return (
+            self._text[self._offsets[index] : self._offsets[index + 1] - 1]
+            .tobytes()
+            .decode("utf-8")
+        )
+
+    @property
+    def texts(self) -> list[str]:
+        return decode_texts(self._text, self._offsets, self._first, self._last)
+
+    @property
+    def starts(self) -> np.ndarray:
+        """
+        Start column of the words, as stored (see start_times).
+        """
+        return self._starts[self._first : self._last]
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self._ends[self._first : self._last]
+
+    @property
+    def start_times(self) -> list[float]:
+        """
+        Starts of the words, as those of the Word objects.
+        """
+        return self._times(self.starts)
+
+    @property
+    def end_times(self) -> list[float]:
+        return self._times(self.ends)
+
+    def shifted(self, time_offset: float) -> "WordTable":
+        """
+        View on the same words, with time_offset subtracted from their times.
+        """
+        return WordTable(
+            self._text,
+            self._offsets,
+            self._starts,
+            self._ends,
+            self._first,
+            self._last,
+            self._decimals,
+            self._time_offset + time_offset,
+        )
+
+    def upper(self) -> "WordTable":
+        """
+        The same words in upper case, with the same time columns.
+        """
+        offsets, text = encode_texts([word.upper() for word in self.texts])
+        return WordTable(
+            text,
+            offsets,
+            self.starts,
+            self.ends,
+            decimals=self._decimals,
+            time_offset=self._time_offset,
+        )
+
+    def precedes(self, other: "WordTable") -> bool:
+        """
+        Whether other is the range that follows this one, in the same columns.
+        """
+        return (
+            self._starts is other._starts
+            and self._last == other._first
+            and self._time_offset == other._time_offset
+        )
+
+    def extend_to(self, other: "WordTable") -> "WordTable":
+        """
+        View from the start of this range to the end of other.
+        """
+        return WordTable(
+            self._text,
+            self._offsets,
+            self._starts,
+            self._ends,
+            self._first,
+            other._last,
+            self._decimals,
+            self._time_offset,
+        )
+
+
+def concatenate_words(words_lists: list[Sequence[Word]]) -> Sequence[Word]:
+    """
+    Words of consecutive segments: a view on their table when they are
+    consecutive ranges of the same WordTable, a list of words otherwise.
+    """
+    if (
+        words_lists
+        and all(isinstance(words, WordTable) for words in words_lists)
+        and all(
+            words.precedes(next_words)
+            for words, next_words in zip(words_lists, words_lists[1:])
+        )
+    ):
+        return words_lists[0].extend_to(words_lists[-1])
+
+    return [word for words in words_lists for word in words]
+
+
 class Segment:
-    def __init__(self, text: str, start: int, end: int, words: list[Word]):
+    __slots__ = ("text", "start", "end", "words")
+
+    def __init__(self, text: str, start: float, end: float, words: Sequence[Word]):
         self.text = text
         self.start = start
         self.end = end
@@ -19,7 +283,9 @@ class Segment:
 
 
 class Subtitle:
-    def __init__(self, text: str, start: int, end: int, words: list[Word]):
+    __slots__ = ("text", "start", "end", "words")
+
+    def __init__(self, text: str, start: float, end: float, words: Sequence[Word]):
         self.text = text
         self.start = start
         self.end = end
@@ -30,6 +296,10 @@ class SplitTextOutput(BaseModel):
     segments: List[str]
 
 
+class SplitTextsOutput(BaseModel):
+    splits: List[List[str]]
+
+
 class VideoMetadata(BaseModel):
     title: str
     description: str
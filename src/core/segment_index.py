@@ -0,0 +1,91 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.core.models import Segment
+
+
+class SegmentIndex:
+    """
+    Interval index over time-ordered, non-overlapping segments (or
+    sentences): their starts and ends as sorted arrays, and the prefix sums of
+    their durations.
+
+    Finding the segments within a time range or at a time takes O(log n), the
+    duration of a range of segments O(1).
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        # Sorted even if a segment ends after the next one
+        self._sorted_ends = np.maximum.accumulate(self.ends) if len(ends) else ends
+        self.cumulative_durations = np.concatenate(
+            ([0.0], np.cumsum(self.ends - self.starts))
+        )
+
+    @classmethod
+    def from_segments(cls, segments: Sequence[Segment]) -> "SegmentIndex":
+        return cls(
+            np.fromiter((segment.start for segment in segments), dtype=np.float64),
+            np.fromiter((segment.end for segment in segments), dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def within(self, start: float, end: float) -> tuple[int, int]:
+        """
+        Range [first, last) of the segments that lie within [start, end].
+        """
+        first = int(np.searchsorted(self.starts, start, side="left"))
+        last = int(np.searchsorted(self._sorted_ends, end, side="right"))
+        return first, max(first, last)
+
+    def at(self, time: float) -> Optional[int]:
+        """
+        Index of the segment being spoken at time, if any.
+        """
+        index = int(np.searchsorted(self.starts, time, side="right")) - 1
+        if index >= 0 and time <= self.ends[index]:
+            return index
+
+        return None
+
+    def duration(self, first: int = 0, last: Optional[int] = None) -> float:
+        """
+        Total duration of the segments [first, last), without the gaps
+        between them.
+        """
+        last = len(self) if last is None else last
+        return float(self.cumulative_durations[last] - self.cumulative_durations[first])
+
+    def selection_duration(self, indexes: Sequence[int]) -> float:
+        """
+        Total duration of the segments at indexes, e.g. a selection of
+        segments that are not contiguous.
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        return float(
+            np.sum(
+                self.cumulative_durations[indexes + 1]
+                - self.cumulative_durations[indexes]
+            )
+        )
+
+    def fitting(self, first: int, last: int, max_duration: float) -> int:
+        """
+        End of the longest range of segments from first (and up to last) whose
+        duration is at most max_duration.
+        """
+        fitting_last = (
+            int(
+                np.searchsorted(
+                    self.cumulative_durations,
+                    self.cumulative_durations[first] + max_duration,
+                    side="right",
+                )
+            )
+            - 1
+        )
+        return max(first, min(last, fitting_last))
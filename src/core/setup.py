@@ -1,8 +1,11 @@
 from pathlib import Path
 
+import numpy as np
 import yaml
 
-from src.core.models import Segment, Word
+from src.core.models import Segment, concatenate_words
+from src.core.segment_index import SegmentIndex
+from src.core.transcripts import SegmentEdit, TranscriptStore, transcript_cache
 
 
 def setup_dirs():
@@ -57,6 +60,9 @@ def load_subtitles_config(subtitles_config_path: Path, video_height: int) -> dic
         "max_length": subtitles_config["subtitles_parameters"]["max_length"],
         "max_words": subtitles_config["subtitles_parameters"]["max_words"],
         "upper_case": subtitles_config["subtitles_parameters"]["upper_case"],
+        # Optional, see max_gap_rule and max_cps_rule
+        "max_gap": subtitles_config["subtitles_parameters"].get("max_gap"),
+        "max_cps": subtitles_config["subtitles_parameters"].get("max_cps"),
     }
 
     special_effect = [
@@ -78,36 +84,86 @@ def load_subtitles_config(subtitles_config_path: Path, video_height: int) -> dic
 
 
 def load_transcript_segments(transcript_path: Path) -> tuple[str, list[Segment]]:
+    """
+    Load the segments of a transcript. They are loaded once per version of the
+    file and shared by every session and page through transcript_cache, so
+    they must not be modified.
+    """
+    language, segments = transcript_cache.get(transcript_path, _load_segments)
+    return language, list(segments)
+
+
+def load_segment_index(transcript_path: Path) -> SegmentIndex:
+    """
+    Interval index over the segments of a transcript, built from the columns
+    of the transcript file and shared through transcript_cache.
+    """
+    return transcript_cache.get(transcript_path, _load_segment_index)
+
+
+def _load_segment_index(transcript: TranscriptStore) -> SegmentIndex:
+    segment_bounds = transcript.segment_bounds
+    return SegmentIndex(
+        np.round(transcript.word_starts[segment_bounds[:-1]].astype(np.float64), 3),
+        np.round(transcript.word_ends[segment_bounds[1:] - 1].astype(np.float64), 3),
+    )
 
-    with open(str(transcript_path), "r", encoding="utf-8") as file:
-        transcript = yaml.safe_load(file)
 
-    segments = []
-    word_index_start = 0
+def _load_segments(transcript: TranscriptStore) -> tuple[str, list[Segment]]:
+    """
+    Segments of a transcript, whose words are views on a single WordTable of
+    the whole transcript.
+    """
+    words = transcript.word_table()
+    segment_bounds = transcript.segment_bounds.tolist()
 
-    for segment in transcript["segments"]:
-        segment_words = segment.strip().split(" ")
-        word_index_end = word_index_start + len(segment_words)
+    segments = []
+    for segment, word_index_start, word_index_end in zip(
+        transcript.segments, segment_bounds, segment_bounds[1:]
+    ):
+        segment_words = segment.split(" ")
+        first_word, last_word = words[word_index_start], words[word_index_end - 1]
 
         assert (
-            segment_words[0] == transcript["words"][word_index_start]["word"]
-        ), f"Misalignment between words and segments: {segment_words[0]} and {transcript['words'][word_index_start]['word']}"
+            segment_words[0] == first_word.word
+        ), f"Misalignment between words and segments: {segment_words[0]} and {first_word.word}"
         assert (
-            segment_words[-1] == transcript["words"][word_index_end - 1]["word"]
-        ), f"Misalignment between words and segments: {segment_words[-1]} and {transcript['words'][word_index_end-1]['word']}"
+            segment_words[-1] == last_word.word
+        ), f"Misalignment between words and segments: {segment_words[-1]} and {last_word.word}"
 
         segments.append(
             Segment(
-                segment.strip(),
-                transcript["words"][word_index_start]["start"],
-                transcript["words"][word_index_end - 1]["end"],
-                [
-                    Word(word["word"], word["start"], word["end"])
-                    for word in transcript["words"][word_index_start:word_index_end]
-                ],
+                segment,
+                first_word.start,
+                last_word.end,
+                words[word_index_start:word_index_end],
+            )
+        )
+
+    return transcript.language, segments
+
+
+def _patch_segments(value: tuple[str, list[Segment]], edit: SegmentEdit) -> None:
+    """
+    Apply a segment edit to loaded segments, with views on the same words.
+    """
+    _, segments = value
+    words = concatenate_words(
+        [segment.words for segment in segments[edit.start : edit.end]]
+    )
+
+    edited_segments = []
+    word_index = 0
+    for segment in edit.segments:
+        segment_words = words[word_index : word_index + len(segment.split(" "))]
+        word_index += len(segment_words)
+        edited_segments.append(
+            Segment(
+                segment, segment_words[0].start, segment_words[-1].end, segment_words
             )
         )
 
-        word_index_start = word_index_end
+    segments[edit.start : edit.end] = edited_segments
+
 
-    return transcript["language"], segments
+transcript_cache.register_patch(_load_segments, _patch_segments)
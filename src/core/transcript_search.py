@@ -0,0 +1,262 @@
+import json
+import re
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.core.transcripts import (TRANSCRIPT_SUFFIX, TranscriptStore,
+                                  open_transcript, transcript_cache)
+
+TRANSCRIPT_INDEX_PATH = Path("data/transcript_index.sqlite")
+TRANSCRIPTS_DIR = Path("data/transcriptions")
+
+# Accents are ignored, "etre" finds "être"
+SEARCH_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# Indexed for the words without letters or digits, so that every word is
+# exactly one token and token offsets are word offsets
+EMPTY_TOKEN = "\ue000"
+
+NON_TOKEN_PATTERN = re.compile(r"[\W_]+")
+
+# Around the matched tokens in highlight()
+MATCH_START, MATCH_END = "\x01", "\x02"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS transcripts (
+    name TEXT PRIMARY KEY,
+    version TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    transcript TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    tokens TEXT NOT NULL,
+    word_starts BLOB NOT NULL,
+    word_ends BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_transcript ON segments (transcript);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    tokens, content='segments', content_rowid='id',
+    tokenize='{SEARCH_TOKENIZER}'
+);
+"""
+
+
+def search_token(word: str) -> str:
+    return NON_TOKEN_PATTERN.sub("", word.lower()) or EMPTY_TOKEN
+
+
+def match_query(query: str) -> Optional[str]:
+    """
+    FTS5 query of the words of a search: all of them, the last one as a
+    prefix, or the exact phrase when the search is in double quotes.
+    """
+    tokens = [NON_TOKEN_PATTERN.sub("", word.lower()) for word in query.split()]
+    tokens = [token for token in tokens if token]
+    if not tokens:
+        return None
+
+    if len(query.strip()) > 1 and query.strip()[0] == query.strip()[-1] == '"':
+        return '"' + " ".join(tokens) + '"'
+
+    return " ".join(f'"{token}"' for token in tokens[:-1]) + f' "{tokens[-1]}"*'
+
+
+@dataclass
+class TranscriptMatch:
+    transcript: str
+    segment: int
+    text: str
+    start: float
+    end: float
+    # (start, end) of the matched words, in seconds
+    word_times: list[tuple[float, float]]
+
+
+class TranscriptSearchIndex:
+    """
+    Full-text index of every transcript of transcripts_dir, in a SQLite FTS5
+    table stored at index_path.
+
+    Every segment is a document whose tokens are its words, one token per
+    word, stored with the timestamps of the words: the offsets of the tokens
+    matched by a search give the matched words and their times. update
+    re-indexes only the transcripts whose file or edit log changed since they
+    were indexed.
+    """
+
+    def __init__(
+        self,
+        index_path: Path = TRANSCRIPT_INDEX_PATH,
+        transcripts_dir: Path = TRANSCRIPTS_DIR,
+    ):
+        self.index_path = index_path
+        self.transcripts_dir = transcripts_dir
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.index_path), timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def update(self) -> int:
+        """
+        Index the new and modified transcripts, and forget the deleted ones.
+
+        Returns:
+            The number of transcripts indexed
+        """
+        names = {
+            path.stem
+            for pattern in (f"*{TRANSCRIPT_SUFFIX}", "*.yaml")
+            for path in self.transcripts_dir.glob(pattern)
+        }
+
+        connection = self._connect()
+        try:
+            indexed_versions = dict(
+                connection.execute("SELECT name, version FROM transcripts")
+            )
+
+            for name in set(indexed_versions) - names:
+                with connection:
+                    self._remove(connection, name)
+
+            nb_indexed = 0
+            for name in sorted(names):
+                # Imports YAML transcripts if needed
+                with open_transcript(
+                    self.transcripts_dir / (name + TRANSCRIPT_SUFFIX)
+                ) as transcript:
+                    version = json.dumps(transcript_cache.version(transcript.path))
+                    if indexed_versions.get(name) == version:
+                        continue
+                    with connection:
+                        self._remove(connection, name)
+                        self._add(connection, name, transcript, version)
+                nb_indexed += 1
+        finally:
+            connection.close()
+
+        return nb_indexed
+
+    @staticmethod
+    def _remove(connection: sqlite3.Connection, name: str) -> None:
+        connection.execute(
+            "INSERT INTO segments_fts (segments_fts, rowid, tokens) "
+            "SELECT 'delete', id, tokens FROM segments WHERE transcript = ?",
+            (name,),
+        )
+        connection.execute("DELETE FROM segments WHERE transcript = ?", (name,))
+        connection.execute("DELETE FROM transcripts WHERE name = ?", (name,))
+
+    @staticmethod
+    def _add(
+        connection: sqlite3.Connection,
+        name: str,
+        transcript: TranscriptStore,
+        version: str,
+    ) -> None:
+        tokens = [search_token(word) for word in transcript.words]
+        segment_bounds = transcript.segment_bounds.tolist()
+
+        rows = [
+            (
+                name,
+                index,
+                segment,
+                " ".join(tokens[first_word:last_word]),
+                transcript.word_starts[first_word:last_word].tobytes(),
+                transcript.word_ends[first_word:last_word].tobytes(),
+            )
+            for index, (segment, first_word, last_word) in enumerate(
+                zip(transcript.segments, segment_bounds, segment_bounds[1:])
+            )
+        ]
+        connection.executemany(
+            "INSERT INTO segments "
+            "(transcript, segment, text, tokens, word_starts, word_ends) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        connection.execute(
+            "INSERT INTO segments_fts (rowid, tokens) "
+            "SELECT id, tokens FROM segments WHERE transcript = ?",
+            (name,),
+        )
+        connection.execute(
+            "INSERT INTO transcripts (name, version) VALUES (?, ?)", (name, version)
+        )
+
+    def search(self, query: str, limit: int = 20) -> list[TranscriptMatch]:
+        """
+        Segments matching a search (see match_query), best matches first.
+        """
+        fts_query = match_query(query)
+        if fts_query is None:
+            return []
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT s.transcript, s.segment, s.text, s.word_starts, s.word_ends, "
+                "highlight(segments_fts, 0, ?, ?) "
+                "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid "
+                "WHERE segments_fts MATCH ? ORDER BY rank LIMIT ?",
+                (MATCH_START, MATCH_END, fts_query, limit),
+            ).fetchall()
+        finally:
+            connection.close()
+
+        matches = []
+        for name, segment, text, word_starts, word_ends, highlighted in rows:
+            starts = np.frombuffer(word_starts, dtype=np.float32)
+            ends = np.frombuffer(word_ends, dtype=np.float32)
+            matches.append(
+                TranscriptMatch(
+                    name,
+                    segment,
+                    text,
+                    round(float(starts[0]), 3),
+                    round(float(ends[-1]), 3),
+                    [
+                        (round(float(starts[i]), 3), round(float(ends[i]), 3))
+                        for i in _matched_offsets(highlighted)
+                    ],
+                )
+            )
+
+        return matches
+
+
+def _matched_offsets(highlighted: str) -> list[int]:
+    """
+    Offsets of the tokens between MATCH_START and MATCH_END.
+    """
+    offsets = []
+    in_match = False
+    for offset, token in enumerate(highlighted.split(" ")):
+        in_match = in_match or MATCH_START in token
+        if in_match:
+            offsets.append(offset)
+        in_match = in_match and MATCH_END not in token
+
+    return offsets
+
+
+def search_transcripts(query: str, limit: int = 20) -> list[TranscriptMatch]:
+    """
+    Search every transcript, after indexing the ones that changed.
+    """
+    index = TranscriptSearchIndex()
+    index.update()
+
+    return index.search(query, limit)
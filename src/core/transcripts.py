@@ -0,0 +1,684 @@
+import json
+import mmap
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+import numpy as np
+import yaml
+
+from src.core.models import WordTable, decode_texts, encode_texts
+
+TRANSCRIPT_SUFFIX = ".transcript"
+
+# File layout: magic, header length (8 bytes, little endian), JSON header,
+# then the columns, each aligned on COLUMN_ALIGNMENT bytes
+TRANSCRIPT_MAGIC = b"TRNSCRPT"
+TRANSCRIPT_VERSION = 1
+COLUMN_ALIGNMENT = 8
+
+# Segment edits are appended to <name>.transcript.edits, and merged into the
+# transcript file once there are that many
+COMPACT_EDITS_AFTER = 20
+
+CachedValue = TypeVar("CachedValue")
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // COLUMN_ALIGNMENT) * COLUMN_ALIGNMENT
+
+
+@dataclass
+class SegmentEdit:
+    """
+    Replacement of the segments [start, end) by other segments covering the
+    same words.
+    """
+
+    start: int
+    end: int
+    segments: list[str]
+
+
+def transcript_edits_path(transcript_path: Path) -> Path:
+    store_path = transcript_store_path(transcript_path)
+    return store_path.with_name(store_path.name + ".edits")
+
+
+class TranscriptStore:
+    """
+    Transcript in the columnar format written by write_transcript:
+    - word texts as a single blob with offsets, word starts and ends as
+      float32 arrays (in seconds)
+    - segment texts as a single blob with offsets, and the index of the
+      first word of every segment (plus the number of words) as segment_bounds
+
+    The file is memory-mapped: opening it only reads its header, columns are
+    views on the mapping and texts are decoded when first accessed. The
+    mapping is released by close (or at the end of a with block), or once
+    the store and the views on its columns are garbage collected.
+
+    Segment edits appended since the file was written (see
+    edit_transcript_segments) are applied to the segments and their bounds.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+        with open(str(self.path), "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(TRANSCRIPT_MAGIC)] != TRANSCRIPT_MAGIC:
+            raise ValueError(f"{self.path} is not a transcript file")
+
+        header_start = len(TRANSCRIPT_MAGIC) + 8
+        header_length = int.from_bytes(
+            self._mmap[len(TRANSCRIPT_MAGIC) : header_start], "little"
+        )
+        header = json.loads(self._mmap[header_start : header_start + header_length])
+
+        self.id: Optional[str] = header.get("id")
+        self.language: Optional[str] = header["language"]
+        self.source: Optional[dict] = header.get("source")
+        self._columns: dict = header["columns"]
+        self._data_start = _aligned(header_start + header_length)
+
+    def close(self) -> None:
+        """
+        Release the mapping of the file, so that it can be replaced on Windows.
+        It is kept while views on its columns are in use (e.g. by the words of
+        loaded segments), until they are garbage collected.
+        """
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self) -> "TranscriptStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, "_mmap"):
+            self.close()
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Read-only view of a column of the file, without copy.
+        """
+        dtype, offset, length = self._columns[name]
+        return np.frombuffer(
+            self._mmap, dtype=dtype, count=length, offset=self._data_start + offset
+        )
+
+    def _texts(self, name: str) -> list[str]:
+        return decode_texts(self.column(f"{name}_text"), self.column(f"{name}_offsets"))
+
+    def _text(self, name: str, index: int) -> str:
+        offsets = self.column(f"{name}_offsets")
+        return (
+            self.column(f"{name}_text")[offsets[index] : offsets[index + 1] - 1]
+            .tobytes()
+            .decode("utf-8")
+        )
+
+    @property
+    def nb_words(self) -> int:
+        return self._columns["word_starts"][2]
+
+    @property
+    def nb_segments(self) -> int:
+        return len(self.segment_bounds) - 1
+
+    @property
+    def word_starts(self) -> np.ndarray:
+        return self.column("word_starts")
+
+    @property
+    def word_ends(self) -> np.ndarray:
+        return self.column("word_ends")
+
+    @cached_property
+    def edits(self) -> list[SegmentEdit]:
+        """
+        Segment edits of the edit log made on this version of the file.
+        """
+        edits_path = transcript_edits_path(self.path)
+        if not edits_path.exists():
+            return []
+
+        edits = []
+        with open(str(edits_path), "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    edit = json.loads(line)
+                except json.JSONDecodeError:
+                    # Interrupted append, the next edits were appended after it
+                    continue
+                if edit.pop("base") == self.id:
+                    edits.append(SegmentEdit(**edit))
+
+        return edits
+
+    @cached_property
+    def _edited_segments(self) -> tuple[list[str], np.ndarray]:
+        segments = self._texts("segment")
+        # A copy, a view would keep the file mapped after close
+        segment_bounds = self.column("segment_bounds").copy()
+        if not self.edits:
+            return segments, segment_bounds
+
+        segment_bounds = segment_bounds.tolist()
+        for edit in self.edits:
+            segments[edit.start : edit.end] = edit.segments
+            segment_bounds[edit.start : edit.end + 1] = segment_edit_bounds(
+                edit, segment_bounds[edit.start]
+            )
+
+        return segments, np.array(segment_bounds, dtype=np.int64)
+
+    @property
+    def segment_bounds(self) -> np.ndarray:
+        return self._edited_segments[1]
+
+    @cached_property
+    def words(self) -> list[str]:
+        return self._texts("word")
+
+    @property
+    def segments(self) -> list[str]:
+        return self._edited_segments[0]
+
+    @cached_property
+    def text(self) -> str:
+        return self.column("transcript_text").tobytes().decode("utf-8")
+
+    def word(self, index: int) -> str:
+        return self._text("word", index)
+
+    def segment(self, index: int) -> str:
+        if self.edits:
+            return self.segments[index]
+        return self._text("segment", index)
+
+    def word_timestamps(self) -> tuple[list[float], list[float]]:
+        """
+        Starts and ends of the words rounded to the millisecond, as written by
+        save_transcript.
+        """
+        return (
+            [round(start, 3) for start in self.word_starts.tolist()],
+            [round(end, 3) for end in self.word_ends.tolist()],
+        )
+
+    def word_table(self) -> WordTable:
+        """
+        The words, as views on the columns of the mapped file.
+        """
+        return WordTable(
+            self.column("word_text"),
+            self.column("word_offsets"),
+            self.word_starts,
+            self.word_ends,
+            decimals=3,
+        )
+
+    def to_dict(self) -> dict:
+        """
+        The whole transcript, with the schema of the YAML transcripts.
+        """
+        starts, ends = self.word_timestamps()
+        transcript = {
+            "language": self.language,
+            "transcript": self.text,
+            "segments": list(self.segments),
+            "words": [
+                {"word": word, "start": start, "end": end}
+                for word, start, end in zip(self.words, starts, ends)
+            ],
+        }
+        if self.source:
+            transcript["source"] = self.source
+
+        return transcript
+
+
+def transcript_store_path(transcript_path: Path) -> Path:
+    return Path(transcript_path).with_suffix(TRANSCRIPT_SUFFIX)
+
+
+def segment_edit_bounds(edit: SegmentEdit, first_word: int) -> list[int]:
+    """
+    Bounds of the segments of an edit, from the index of their first word.
+    """
+    bounds = [first_word]
+    for segment in edit.segments:
+        bounds.append(bounds[-1] + len(segment.split(" ")))
+
+    return bounds
+
+
+def write_transcript(transcript: dict, transcript_path: Path) -> Path:
+    """
+    Write a transcript, with the schema of the YAML transcripts, in the
+    columnar format (see TranscriptStore). The file is replaced atomically,
+    and its edit log is dropped.
+
+    Returns:
+        The path of the written file
+    """
+    transcript_path = transcript_store_path(transcript_path)
+
+    segments = [segment.strip() for segment in transcript["segments"]]
+    segment_bounds = np.zeros(len(segments) + 1, dtype=np.int64)
+    segment_bounds[1:] = np.cumsum([len(segment.split(" ")) for segment in segments])
+
+    word_offsets, word_text = encode_texts(
+        [word["word"] for word in transcript["words"]]
+    )
+    segment_offsets, segment_text = encode_texts(segments)
+
+    columns = {
+        "word_starts": np.array(
+            [word["start"] for word in transcript["words"]], dtype=np.float32
+        ),
+        "word_ends": np.array(
+            [word["end"] for word in transcript["words"]], dtype=np.float32
+        ),
+        "word_offsets": word_offsets,
+        "word_text": word_text,
+        "segment_bounds": segment_bounds,
+        "segment_offsets": segment_offsets,
+        "segment_text": segment_text,
+        "transcript_text": np.frombuffer(
+            transcript["transcript"].encode("utf-8"), dtype=np.uint8
+        ),
+    }
+
+    # Column offsets are relative to the data, which starts after the header
+    column_layout = {}
+    offset = 0
+    for name, column in columns.items():
+        column_layout[name] = [column.dtype.str, offset, len(column)]
+        offset += _aligned(column.nbytes)
+
+    encoded_header = json.dumps(
+        {
+            "version": TRANSCRIPT_VERSION,
+            "id": uuid.uuid4().hex,
+            "language": transcript["language"],
+            "source": transcript.get("source"),
+            "columns": column_layout,
+        }
+    ).encode("utf-8")
+    data_start = _aligned(len(TRANSCRIPT_MAGIC) + 8 + len(encoded_header))
+
+    temporary_path = transcript_path.with_name(transcript_path.name + ".tmp")
+    with open(str(temporary_path), "wb") as file:
+        file.write(TRANSCRIPT_MAGIC)
+        file.write(len(encoded_header).to_bytes(8, "little"))
+        file.write(encoded_header)
+        for name, column in columns.items():
+            file.write(b"\0" * (data_start + column_layout[name][1] - file.tell()))
+            file.write(column.tobytes())
+    # Unmaps the previous file, which can't be replaced while mapped on Windows
+    transcript_cache.invalidate(transcript_path)
+    os.replace(temporary_path, transcript_path)
+    # Edits of the previous file are ignored from now on (see
+    # TranscriptStore.edits), the log can go
+    transcript_edits_path(transcript_path).unlink(missing_ok=True)
+
+    return transcript_path
+
+
+def import_transcript_yaml(
+    yaml_path: Path, transcript_path: Optional[Path] = None
+) -> Path:
+    """
+    Convert a YAML transcript to the columnar format, next to it by default.
+    """
+    with open(str(yaml_path), "r", encoding="utf-8") as file:
+        transcript = yaml.safe_load(file)
+
+    return write_transcript(transcript, transcript_path or yaml_path)
+
+
+def export_transcript_yaml(
+    transcript_path: Path, yaml_path: Optional[Path] = None
+) -> Path:
+    """
+    Write a transcript as YAML, next to it by default.
+    """
+    yaml_path = yaml_path or transcript_store_path(transcript_path).with_suffix(".yaml")
+    with open(str(yaml_path), "w", encoding="utf-8") as file:
+        yaml.dump(
+            read_transcript(transcript_path),
+            file,
+            allow_unicode=True,
+            default_flow_style=False,
+        )
+
+    return yaml_path
+
+
+def _import_modified_yaml(transcript_path: Path) -> Path:
+    """
+    Import the YAML transcript with the same name if there is no columnar
+    file yet, or if the YAML file was modified since.
+
+    Returns:
+        The path of the columnar file
+    """
+    store_path = transcript_store_path(transcript_path)
+    yaml_path = store_path.with_suffix(".yaml")
+
+    if yaml_path.exists() and (
+        not store_path.exists()
+        or yaml_path.stat().st_mtime > store_path.stat().st_mtime
+    ):
+        import_transcript_yaml(yaml_path, store_path)
+
+    return store_path
+
+
+def open_transcript(transcript_path: Path) -> TranscriptStore:
+    """
+    Open a transcript from its columnar file, importing it from YAML first if
+    needed (see _import_modified_yaml).
+    """
+    return TranscriptStore(_import_modified_yaml(transcript_path))
+
+
+def read_transcript(transcript_path: Path) -> dict:
+    """
+    Read a whole transcript, with the schema of the YAML transcripts.
+    """
+    return open_transcript(transcript_path).to_dict()
+
+
+def transcript_exists(transcript_path: Path) -> bool:
+    store_path = transcript_store_path(transcript_path)
+    return store_path.exists() or store_path.with_suffix(".yaml").exists()
+
+
+class TranscriptCache:
+    """
+    Process-wide cache of values loaded from transcripts (e.g. their
+    segments), shared by every Streamlit session and page.
+
+    Values are keyed by transcript file and loading function, and stamped
+    with the version of the file and its edit log: they are loaded again once
+    it has been rewritten, and write_transcript drops them right away. Segment
+    edits patch them in place when their loading function registered a patch.
+    The max_entries most recently used values are kept, and the transcript
+    files of the dropped values are closed.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Version, value and the store it was loaded from
+        self._entries: OrderedDict[tuple, tuple[tuple, Any, TranscriptStore]] = (
+            OrderedDict()
+        )
+        self._patches: dict[Callable, Callable[[Any, SegmentEdit], None]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version(transcript_path: Path) -> tuple:
+        """
+        Modification time, size and inode of the transcript file, and size of
+        its edit log.
+        """
+        stat = transcript_store_path(transcript_path).stat()
+        edits_path = transcript_edits_path(transcript_path)
+        return (
+            stat.st_mtime_ns,
+            stat.st_size,
+            stat.st_ino,
+            edits_path.stat().st_size if edits_path.exists() else 0,
+        )
+
+    def register_patch(
+        self,
+        load: Callable[[TranscriptStore], CachedValue],
+        patch: Callable[[CachedValue, SegmentEdit], None],
+    ) -> None:
+        """
+        Update the cached values of load in place with patch after segment
+        edits, instead of loading them again.
+        """
+        self._patches[load] = patch
+
+    def get(
+        self, transcript_path: Path, load: Callable[[TranscriptStore], CachedValue]
+    ) -> CachedValue:
+        """
+        The value of load for the transcript, loaded only if it is not cached
+        for the current version of the file.
+        """
+        store_path = _import_modified_yaml(transcript_path)
+        key = (str(store_path.resolve()), load)
+        version = self.version(store_path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        transcript = TranscriptStore(store_path)
+        value = load(transcript)
+
+        with self._lock:
+            self.misses += 1
+            dropped_entries = [self._entries.pop(key, None)]
+            self._entries[key] = (version, value, transcript)
+            while len(self._entries) > self.max_entries:
+                dropped_entries.append(self._entries.popitem(last=False)[1])
+
+        _close_entries(dropped_entries)
+        return value
+
+    def apply_edit(
+        self, transcript_path: Path, edit: SegmentEdit, previous_version: tuple
+    ) -> None:
+        """
+        Patch the values of a transcript cached for previous_version, the
+        version before the edit. The others are dropped.
+        """
+        path = str(transcript_store_path(transcript_path).resolve())
+        version = self.version(transcript_path)
+        dropped_entries = []
+
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                entry_version, value, transcript = self._entries[key]
+                patch = self._patches.get(key[1])
+                if patch is None or entry_version != previous_version:
+                    dropped_entries.append(self._entries.pop(key))
+                    continue
+
+                patch(value, edit)
+                self._entries[key] = (version, value, transcript)
+
+        _close_entries(dropped_entries)
+
+    def invalidate(self, transcript_path: Optional[Path] = None) -> None:
+        """
+        Drop the values of a transcript, or of all transcripts if None.
+        """
+        with self._lock:
+            if transcript_path is None:
+                dropped_entries = list(self._entries.values())
+                self._entries.clear()
+            else:
+                path = str(transcript_store_path(transcript_path).resolve())
+                dropped_entries = [
+                    self._entries.pop(key)
+                    for key in list(self._entries)
+                    if key[0] == path
+                ]
+
+        _close_entries(dropped_entries)
+
+
+def _close_entries(entries: list[Optional[tuple]]) -> None:
+    for entry in entries:
+        if entry is not None:
+            entry[2].close()
+
+
+transcript_cache = TranscriptCache()
+
+
+def slice_transcript(
+    transcript: dict, start: float, end: float, parent_name: Optional[str] = None
+) -> dict:
+    """
+    Derive the transcript of the [start, end] part (in seconds) of a video
+    from the transcript of the whole video.
+
+    A word is kept when its middle falls in the range, segments are cut to
+    their kept words, and timestamps are rebased on start. The lineage is
+    recorded under "source": the parent name, the range in the parent and the
+    parent's own source, if it was derived too.
+
+    Args:
+        transcript: Transcript as written by save_transcript
+        start: Start of the part, in seconds
+        end: End of the part, in seconds
+        parent_name: Name of the parent transcript
+
+    Returns:
+        The transcript of the part, with the same schema
+    """
+    words, segments = [], []
+    word_index = 0
+
+    for segment in transcript["segments"]:
+        segment_tokens = segment.strip().split(" ")
+        segment_words = transcript["words"][
+            word_index : word_index + len(segment_tokens)
+        ]
+        word_index += len(segment_tokens)
+
+        kept_tokens = []
+        for token, word in zip(segment_tokens, segment_words):
+            if start <= (word["start"] + word["end"]) / 2 < end:
+                kept_tokens.append(token)
+                words.append(
+                    {
+                        "word": word["word"],
+                        "start": round(max(0.0, word["start"] - start), 3),
+                        "end": round(min(end, word["end"]) - start, 3),
+                    }
+                )
+
+        if kept_tokens:
+            segments.append(" ".join(kept_tokens))
+
+    source = {"transcript": parent_name, "start": start, "end": end}
+    if transcript.get("source"):
+        source["source"] = transcript["source"]
+
+    return {
+        "language": transcript["language"],
+        "transcript": " ".join(word["word"] for word in words),
+        "segments": segments,
+        "words": words,
+        "source": source,
+    }
+
+
+def slice_transcript_file(
+    transcript_path: Path, start: float, end: float, output_path: Path
+) -> Path:
+    """
+    Write the transcript of the [start, end] part of the video of
+    transcript_path, e.g. for a trimmed copy of the video, without any API call.
+    """
+    sliced_transcript = slice_transcript(
+        read_transcript(transcript_path),
+        start,
+        end,
+        parent_name=transcript_store_path(transcript_path).stem,
+    )
+
+    return write_transcript(sliced_transcript, output_path)
+
+
+def edit_transcript_segments(
+    transcript_path: Path, start: int, end: int, segments: list[str]
+) -> None:
+    """
+    Replace the segments [start, end) of a transcript, e.g. to move their
+    boundaries or fix their text, without rewriting the file.
+
+    Only the words of the edited range are re-aligned: the new segments must
+    cover the same words, starting and ending with them like every segment.
+    The edit is appended to the edit log of the transcript, which is merged
+    into the file after COMPACT_EDITS_AFTER edits, and the cached values that
+    support it are updated in place (see TranscriptCache.apply_edit).
+
+    Raises:
+        ValueError: If the new segments do not match the words of the range
+    """
+    edit = SegmentEdit(
+        start, end, [segment.strip() for segment in segments if segment.strip()]
+    )
+
+    # Closed before compaction, which replaces the file
+    with open_transcript(transcript_path) as transcript:
+        first_word, last_word = transcript.segment_bounds[[start, end]].tolist()
+        bounds = segment_edit_bounds(edit, first_word)
+        if bounds[-1] != last_word:
+            raise ValueError(
+                f"The segments have {bounds[-1] - first_word} words instead of "
+                f"{last_word - first_word}: words can't be added or removed"
+            )
+        for segment, segment_start, segment_end in zip(
+            edit.segments, bounds, bounds[1:]
+        ):
+            tokens = segment.split(" ")
+            if (tokens[0], tokens[-1]) != (
+                transcript.word(segment_start),
+                transcript.word(segment_end - 1),
+            ):
+                raise ValueError(
+                    f"Segment {segment!r} does not start and end with the words "
+                    f"{transcript.word(segment_start)!r} and "
+                    f"{transcript.word(segment_end - 1)!r}"
+                )
+
+        transcript_id = transcript.id
+        compacted_transcript = (
+            transcript.to_dict()
+            if len(transcript.edits) + 1 >= COMPACT_EDITS_AFTER
+            else None
+        )
+
+    if compacted_transcript is not None:
+        compacted_transcript["segments"][start:end] = edit.segments
+        write_transcript(compacted_transcript, transcript_path)
+        return
+
+    previous_version = transcript_cache.version(transcript_path)
+    with open(str(transcript_edits_path(transcript_path)), "ab+") as file:
+        # Drop the end of an interrupted append, so that the edit starts a line
+        file.seek(0)
+        log = file.read()
+        file.truncate(log.rfind(b"\n") + 1)
+        file.write(
+            (json.dumps({"base": transcript_id, **asdict(edit)}) + "\n").encode("utf-8")
+        )
+    transcript_cache.apply_edit(transcript_path, edit, previous_version)
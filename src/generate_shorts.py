@@ -1,12 +1,16 @@
 from pathlib import Path
 
-from src.ai.metadata_generation import generate_short_metadata
+from src.ai.metadata_generation import (generate_short_metadata,
+                                        generate_short_metadata_batch)
 from src.ai.short_content_selection import generate_shorts_from_long_transcript
 from src.ai.speaker_detection import (get_average_speaker_position,
                                       group_bboxes_by_overlap)
-from src.ai.translation import create_translated_segments, translate_segments
+from src.ai.translation import (create_translated_segments, translate_segments,
+                                translate_segments_batch)
 from src.core.models import Segment
-from src.processing.subtitles import generate_ass_file, generate_subtitles
+from src.llm.telemetry import telemetry_context
+from src.processing.subtitles import (generate_ass_file, generate_subtitles,
+                                      max_cps_rule, max_gap_rule)
 from src.processing.videos import (burn_subtitles, get_video_resolution,
                                    merge_videos, resize_video_to_9_16,
                                    trim_video)
@@ -20,31 +24,77 @@ def generate_shorts_proposal(
     chunk_overlap: int = 60,
     translate_subtitles: bool = False,
     translate_language: str = "French",
+    transcript_context: bool = False,
+    video_id: str | None = None,
+    batch: bool = False,
 ):
-
-    shorts_proposal = generate_shorts_from_long_transcript(
-        segments, target_duration, chunk_duration, chunk_overlap
-    )
+    """
+    Select, translate and describe shorts from a transcript. With batch=True,
+    every LLM stage runs as a resumable Batch API job named after video_id,
+    for offline runs where latency doesn't matter.
+    """
+    if batch and not video_id:
+        raise ValueError("A video_id is required to name the batch jobs")
+
+    with telemetry_context(stage="short_selection", video_id=video_id):
+        shorts_proposal = generate_shorts_from_long_transcript(
+            segments,
+            target_duration,
+            chunk_duration,
+            chunk_overlap,
+            transcript_context=transcript_context,
+            batch_name=f"{video_id}_select_short_content" if batch else None,
+        )
     shorts_metadata = []
 
     if translate_subtitles:
-        for i, short in enumerate(shorts_proposal):
-            translated_text = translate_segments(
-                [segment.text for segment in short], video_lang, translate_language
+        with telemetry_context(stage="translation", video_id=video_id):
+            if batch:
+                translated_texts = translate_segments_batch(
+                    [[segment.text for segment in short] for short in shorts_proposal],
+                    video_lang,
+                    translate_language,
+                    f"{video_id}_translate_splitted_text",
+                )
+            else:
+                translated_texts = [
+                    translate_segments(
+                        [segment.text for segment in short],
+                        video_lang,
+                        translate_language,
+                    )
+                    for short in shorts_proposal
+                ]
+
+            for i, (short, translated_text) in enumerate(
+                zip(shorts_proposal, translated_texts)
+            ):
+                translated_segments = create_translated_segments(short, translated_text)
+
+                shorts_proposal[i] = translated_segments
+
+    with telemetry_context(stage="metadata", video_id=video_id):
+        short_transcripts = [
+            " ".join([segment.text for segment in short]) for short in shorts_proposal
+        ]
+        if batch:
+            shorts_metadata = generate_short_metadata_batch(
+                short_transcripts, f"{video_id}_generate_short_metadata"
             )
-
-            translated_segments = create_translated_segments(short, translated_text)
-
-            shorts_proposal[i] = translated_segments
-
-    for short in shorts_proposal:
-        text = " ".join([segment.text for segment in short])
-        metadata = generate_short_metadata(text)
-        shorts_metadata.append(metadata)
+        else:
+            for text in short_transcripts:
+                metadata = generate_short_metadata(text)
+                shorts_metadata.append(metadata)
 
     # Combine and sort by viral_score descending
-    combined = list(zip(shorts_proposal, shorts_metadata))
+    combined = [
+        (short, metadata)
+        for short, metadata in zip(shorts_proposal, shorts_metadata)
+        if metadata is not None
+    ]
     combined.sort(key=lambda x: x[1].viral_score, reverse=True)
+    if not combined:
+        return [], []
 
     # Unzip back to separate lists
     shorts_proposal, shorts_metadata = zip(*combined)
@@ -94,6 +144,12 @@ def generate_subtitled_short(
     if automatic_speaker_detection:
         crop_positions = group_bboxes_by_overlap(crop_positions)
 
+    break_rules = []
+    if subtitles_config.get("max_gap") is not None:
+        break_rules.append(max_gap_rule(subtitles_config["max_gap"]))
+    if subtitles_config.get("max_cps") is not None:
+        break_rules.append(max_cps_rule(subtitles_config["max_cps"]))
+
     for i, segment in enumerate(selected_segments):
         resize_video_to_9_16(
             temporary_dir / f"{i}.mp4",
@@ -106,6 +162,7 @@ def generate_subtitled_short(
             max_words_per_subtitle=subtitles_config["max_words"],
             upper_case=subtitles_config["upper_case"],
             time_offset=segment.start,
+            break_rules=break_rules,
         )
         generate_ass_file(
             subtitles,
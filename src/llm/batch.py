@@ -0,0 +1,304 @@
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from openai.types import CompletionUsage
+from pydantic import ValidationError
+
+from src.llm.llm_wraper import PydanticModelType, build_messages, client
+from src.llm.telemetry import telemetry
+
+BATCH_STATE_DIR = Path("data/batches")
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+logger = logging.getLogger(__name__)
+
+
+def strict_json_schema(schema):
+    """
+    JSON schema made strict as structured outputs require it: every object
+    closed to other properties, with all its properties required, and no null
+    defaults.
+    """
+    if isinstance(schema, list):
+        return [strict_json_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+
+    schema = {key: strict_json_schema(value) for key, value in schema.items()}
+    if schema.get("type") == "object":
+        schema.setdefault("additionalProperties", False)
+        schema["required"] = list(schema.get("properties", {}))
+    if "default" in schema and schema["default"] is None:
+        del schema["default"]
+
+    return schema
+
+
+def response_format_param(structured_output: PydanticModelType) -> dict:
+    """
+    response_format of a structured output request, as the client builds it
+    for chat.completions.parse.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "schema": strict_json_schema(structured_output.model_json_schema()),
+            "name": structured_output.__name__,
+            "strict": True,
+        },
+    }
+
+
+def build_chat_request_body(
+    prompt: dict,
+    structured_output: Optional[PydanticModelType] = None,
+    max_tokens: Optional[int] = None,
+    context: Optional[str] = None,
+) -> dict:
+    """
+    Build the body of a chat completion request from a rendered prompt, with
+    the same message layout as generate_chat_response.
+    """
+    body = {
+        "model": prompt["model"],
+        "messages": build_messages(
+            prompt["base_prompt"],
+            prompt["task_prompt"],
+            prompt.get("instructions"),
+            context,
+        ),
+        "temperature": prompt["temperature"],
+    }
+
+    if max_tokens:
+        body["max_tokens"] = max_tokens
+    if structured_output:
+        body["response_format"] = response_format_param(structured_output)
+
+    return body
+
+
+class ChatBatch:
+    """
+    A resumable OpenAI batch of chat completions.
+
+    The batch state (input file, batch ID, status) is saved in
+    <state_dir>/<name>.json after every step, so running the same batch again
+    after a restart resumes polling instead of submitting it a second time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        request_bodies: list[dict],
+        state_dir: Path = BATCH_STATE_DIR,
+        poll_interval: float = 30,
+    ):
+        self.name = name
+        self.request_bodies = request_bodies
+        self.poll_interval = poll_interval
+
+        state_dir.mkdir(parents=True, exist_ok=True)
+        self.state_path = state_dir / f"{name}.json"
+        self.input_path = state_dir / f"{name}_input.jsonl"
+        self.output_path = state_dir / f"{name}_output.jsonl"
+
+        self.requests_hash = hashlib.sha256(
+            json.dumps(request_bodies, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        self.state = self._load_state()
+
+    def _load_state(self) -> dict:
+        if not self.state_path.exists():
+            return {"requests_hash": self.requests_hash}
+
+        with open(str(self.state_path), "r", encoding="utf-8") as file:
+            state = json.load(file)
+
+        if state["requests_hash"] != self.requests_hash:
+            raise ValueError(
+                f'Batch "{self.name}" already exists with different requests. '
+                f"Remove {self.state_path} to submit a new batch."
+            )
+
+        return state
+
+    def _save_state(self) -> None:
+        with open(str(self.state_path), "w", encoding="utf-8") as file:
+            json.dump(self.state, file, indent=2)
+
+    def submit(self) -> None:
+        if self.state.get("batch_id"):
+            return
+
+        with open(str(self.input_path), "w", encoding="utf-8") as file:
+            for i, body in enumerate(self.request_bodies):
+                request = {
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": body,
+                }
+                file.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+        with open(str(self.input_path), "rb") as file:
+            input_file = client.files.create(file=file, purpose="batch")
+        self.state["input_file_id"] = input_file.id
+        self._save_state()
+
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+            metadata={"name": self.name},
+        )
+        self.state["batch_id"] = batch.id
+        self.state["status"] = batch.status
+        self._save_state()
+        logger.info(f'Batch "{self.name}" submitted: {batch.id}')
+
+    def wait(self):
+        while True:
+            batch = client.batches.retrieve(self.state["batch_id"])
+            self.state["status"] = batch.status
+            self._save_state()
+
+            if batch.status in BATCH_FINAL_STATUSES:
+                return batch
+
+            # Not set until the batch starts
+            request_counts = (
+                f": {batch.request_counts.completed}/{batch.request_counts.total}"
+                if batch.request_counts
+                else ""
+            )
+            logger.info(f'Batch "{self.name}" {batch.status}{request_counts}')
+            time.sleep(self.poll_interval)
+
+    def _download_output(self, batch) -> None:
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.append(client.files.content(file_id).text.strip())
+
+        with open(str(self.output_path), "w", encoding="utf-8") as file:
+            file.write("\n".join(line for line in lines if line) + "\n")
+
+    def run(self) -> list[Optional[str]]:
+        """
+        Submit the batch if needed, wait for it and return the message content
+        of every request, in order. Failed requests give None.
+
+        A batch that ends without completing (failed, expired or cancelled)
+        gives only None, and is submitted again by the next run.
+        """
+        results = [None] * len(self.request_bodies)
+        if not self.request_bodies:
+            return results
+
+        self.submit()
+
+        # Results already downloaded by a previous run are not recorded twice
+        record_telemetry = False
+        if not self.output_path.exists():
+            batch = self.wait()
+            if batch.status != "completed":
+                logger.warning(
+                    f'Batch "{self.name}" {batch.status}, it will be submitted '
+                    "again by the next run"
+                )
+                del self.state["batch_id"]
+                self._save_state()
+                return results
+
+            self._download_output(batch)
+            record_telemetry = True
+
+        with open(str(self.output_path), "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+
+                output = json.loads(line)
+                response = output.get("response") or {}
+                if response.get("status_code") != 200:
+                    logger.warning(
+                        f'Batch "{self.name}" request {output["custom_id"]} failed: '
+                        f'{output.get("error") or response.get("body")}'
+                    )
+                    continue
+
+                body = response["body"]
+                results[int(output["custom_id"])] = body["choices"][0]["message"][
+                    "content"
+                ]
+                if record_telemetry:
+                    # Batch requests have no latency of their own
+                    telemetry.record(
+                        body["model"],
+                        self.state.get("prompt_name"),
+                        None,
+                        CompletionUsage.model_validate(body["usage"]),
+                    )
+
+        return results
+
+
+def generate_chat_responses_batch(
+    name: str,
+    prompts: list[dict],
+    structured_output: Optional[PydanticModelType] = None,
+    context: Optional[str] = None,
+    poll_interval: float = 30,
+) -> list[Union[str, PydanticModelType, None]]:
+    """
+    Batch counterpart of generate_chat_response for a list of rendered prompts.
+
+    Args:
+        name: Unique name of the batch, used to resume it after a restart
+        prompts: Prompts rendered by the PromptManager
+        structured_output: Optional Pydantic model for structured output
+        context: Optional shared context sent with every prompt
+        poll_interval: Seconds between two status checks
+
+    Returns:
+        The response of every prompt, in order: a string, a parsed Pydantic
+        model instance, or None if the request failed
+    """
+    if not prompts:
+        return []
+
+    batch = ChatBatch(
+        name,
+        [
+            build_chat_request_body(prompt, structured_output, context=context)
+            for prompt in prompts
+        ],
+        poll_interval=poll_interval,
+    )
+    batch.state["prompt_name"] = prompts[0].get("prompt_name")
+
+    results = batch.run()
+
+    if not structured_output:
+        return results
+
+    return [_parse_structured_output(result, structured_output) for result in results]
+
+
+def _parse_structured_output(
+    result: Optional[str], structured_output: PydanticModelType
+) -> Optional[PydanticModelType]:
+    if result is None:
+        return None
+
+    try:
+        return structured_output.model_validate_json(result)
+    except ValidationError as e:
+        logger.warning(f"Invalid structured output in batch result: {e}")
+        return None
@@ -1,43 +1,81 @@
 import logging
 import os
-from typing import Optional, TypeVar, Union
+import time
+from dataclasses import replace
+from typing import Iterator, Optional, TypeVar, Union
 
 import openai
-import tiktoken
 from dotenv import load_dotenv
+from openai.types import CompletionUsage
 from pydantic import BaseModel
 
+from src.core.cassettes import (
+    cassette_mode,
+    load_cassette,
+    save_cassette,
+    with_cassette,
+)
+from src.llm.retry import LLMCallError, RetryPolicy, call_with_retries
+from src.llm.telemetry import telemetry
+
 load_dotenv()
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Retries are handled by call_with_retries, not by the client
+client = openai.OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL"),
+    max_retries=0,
+)
+
+DEFAULT_RETRY_POLICY = RetryPolicy(
+    hedge=os.getenv("LLM_HEDGING", "false").lower() in ("1", "true")
+)
 
 PydanticModelType = TypeVar("PydanticModelType ", bound=BaseModel)
 
 DISPLAY_TOKENS = True
 
+CONTEXT_HEADER = "Full transcript, for context only:\n"
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def count_tokens(text: str, model: str = "gpt-4") -> int:
+def build_messages(
+    base_prompt: str,
+    task_prompt: str,
+    instructions: Optional[str] = None,
+    context: Optional[str] = None,
+) -> list[dict]:
     """
-    Count the number of tokens in a text string for a given model.
+    Lay out the messages with everything that is shared between calls first.
 
-    Args:
-        text: The text to count tokens for
-        model: The model to use for token counting
+    The system prompt, the instructions and the optional context form a prefix
+    that stays byte-identical across the chunk calls of a run, which lets the
+    provider serve it from its prompt cache. Only the final user message varies.
+    """
+    system_prompt = (
+        base_prompt if not instructions else f"{base_prompt}\n\n{instructions}"
+    )
+    messages = [{"role": "system", "content": system_prompt}]
 
-    Returns:
-        Number of tokens
+    if context:
+        messages.append({"role": "user", "content": CONTEXT_HEADER + context})
 
-    Raises:
-        ValueError: If the model is not supported
-    """
-    try:
-        enc = tiktoken.encoding_for_model(model)
-        return len(enc.encode(text))
-    except KeyError as e:
-        raise ValueError(f"Unsupported model for token counting: {model}") from e
+    messages.append({"role": "user", "content": task_prompt})
+
+    return messages
+
+
+def log_token_usage(usage, model: str) -> None:
+    cached_tokens = 0
+    if usage.prompt_tokens_details and usage.prompt_tokens_details.cached_tokens:
+        cached_tokens = usage.prompt_tokens_details.cached_tokens
+
+    logger.info(
+        f"{usage.prompt_tokens} tokens as input for model {model} ({cached_tokens} cached)"
+    )
+    logger.info(f"{usage.completion_tokens} tokens as output for model {model}")
 
 
 def generate_chat_response(
@@ -48,7 +86,12 @@ def generate_chat_response(
     structured_output: Optional[PydanticModelType] = None,
     max_tokens: Optional[int] = None,
     display_tokens: bool = DISPLAY_TOKENS,
-) -> Union[str, PydanticModelType]:
+    stream: bool = False,
+    instructions: Optional[str] = None,
+    context: Optional[str] = None,
+    prompt_name: Optional[str] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> Union[str, PydanticModelType, Iterator[str]]:
     """
     Generate a chat completion using OpenAI's API.
 
@@ -59,13 +102,23 @@ def generate_chat_response(
         temperature: Controls randomness (0.0 to 1.0)
         structured_output: Optional Pydantic model for structured output
         display_tokens: Whether to display token counts
+        stream: Whether to return an iterator over the text as it is generated
+        instructions: Static task instructions, appended to the system prompt
+        context: Optional shared context (e.g. the full transcript) sent before
+            the task prompt
+        prompt_name: Name of the prompt in configs/prompts.yaml, for telemetry
+        retry_policy: Retries, deadline and hedging of the call, the
+            DEFAULT_RETRY_POLICY if None. Streamed calls are never hedged
 
     Returns:
-        Either a string response or a parsed Pydantic model instance
+        Either a string response, a parsed Pydantic model instance or, when
+        streaming, an iterator over the response text deltas
 
     Raises:
         ValueError: If parameters are invalid
-        openai.OpenAIError: If there's an API error
+        LLMCallError: If the call failed after its retries, or with a non
+            retryable API error
+        LLMDeadlineExceeded: If the call did not succeed before its deadline
     """
     # Parameter validation
     if not 0 <= temperature <= 1:
@@ -74,42 +127,169 @@ def generate_chat_response(
         raise ValueError("Prompts cannot be empty")
     if not model:
         raise ValueError("Model name cannot be empty")
+    if stream and structured_output:
+        raise ValueError("Structured output cannot be streamed")
 
-    # Common message structure
-    messages = [
-        {"role": "system", "content": base_prompt},
-        {"role": "user", "content": task_prompt},
-    ]
+    messages = build_messages(base_prompt, task_prompt, instructions, context)
 
-    try:
+    cassette_request = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "structured_output": structured_output.__name__ if structured_output else None,
+    }
+
+    retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+
+    if stream:
+        return _stream_chat_response(
+            messages,
+            model,
+            temperature,
+            max_tokens,
+            display_tokens,
+            prompt_name,
+            cassette_request,
+            retry_policy,
+        )
+
+    retries = 0
 
+    def request_once(timeout: Optional[float]):
         if structured_output:
-            completion = client.beta.chat.completions.parse(
+            return client.beta.chat.completions.parse(
                 model=model,
                 messages=messages,
                 response_format=structured_output,
                 temperature=temperature,
                 max_tokens=max_tokens,
+                timeout=timeout,
             )
-            result = completion.choices[0].message.parsed
-        else:
-            completion = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
+
+        return client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+        )
+
+    def request_completion() -> dict:
+        nonlocal retries
+        completion, retries = call_with_retries(
+            request_once, retry_policy, latency_key=(model, prompt_name)
+        )
+
+        return {
+            "content": completion.choices[0].message.content,
+            "usage": completion.usage.model_dump() if completion.usage else None,
+        }
+
+    start_time = time.perf_counter()
+
+    response = with_cassette("chat", cassette_request, request_completion)
+    usage = (
+        CompletionUsage.model_validate(response["usage"]) if response["usage"] else None
+    )
+
+    if structured_output and response["content"] is not None:
+        result = structured_output.model_validate_json(response["content"])
+    else:
+        result = response["content"]
+
+    telemetry.record(
+        model,
+        prompt_name,
+        time.perf_counter() - start_time,
+        usage,
+        retries=retries,
+        cache_hit=cassette_mode() == "replay",
+    )
+    if display_tokens and usage:
+        log_token_usage(usage, model)
+
+    return result
+
+
+def _stream_chat_response(
+    messages: list[dict],
+    model: str,
+    temperature: float,
+    max_tokens: Optional[int],
+    display_tokens: bool,
+    prompt_name: Optional[str],
+    cassette_request: dict,
+    retry_policy: RetryPolicy,
+) -> Iterator[str]:
+    if cassette_mode() == "replay":
+        response = load_cassette("chat", cassette_request)
+        telemetry.record(
+            model,
+            prompt_name,
+            0.0,
+            (
+                CompletionUsage.model_validate(response["usage"])
+                if response["usage"]
+                else None
+            ),
+            cache_hit=True,
+        )
+        yield response["content"]
+        return
+
+    # Only opening the stream is retried, text already yielded cannot be taken back
+    stream_policy = replace(retry_policy, hedge=False)
+    start_time = time.perf_counter()
+    usage = None
+    content = ""
+    completion, retries = call_with_retries(
+        lambda timeout: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout,
+        ),
+        stream_policy,
+        latency_key=(model, prompt_name),
+    )
+
+    def record_call() -> None:
+        telemetry.record(
+            model,
+            prompt_name,
+            time.perf_counter() - start_time,
+            usage,
+            retries=retries,
+        )
+        if cassette_mode() == "record":
+            save_cassette(
+                "chat",
+                cassette_request,
+                {"content": content, "usage": usage.model_dump() if usage else None},
             )
-            result = completion.choices[0].message.content
+        if display_tokens and usage:
+            log_token_usage(usage, model)
 
-        if display_tokens:
-            input_tokens = count_tokens(base_prompt) + count_tokens(task_prompt)
-            logger.info(f"{input_tokens} tokens as input for model {model}")
-            output_tokens = count_tokens(str(result))
-            logger.info(f"{output_tokens} tokens as output for model {model}")
+    try:
+        with completion:
+            for chunk in completion:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content += chunk.choices[0].delta.content
+                    yield chunk.choices[0].delta.content
 
-        return result
+                if chunk.usage:
+                    usage = chunk.usage
+    except GeneratorExit:
+        # The caller stopped reading (e.g. the translator has all its lines):
+        # the call is recorded with the content read so far, which replays the
+        # same way, and without usage, which only comes at the end
+        record_call()
+        raise
+    except openai.APIError as e:
+        raise LLMCallError(f"OpenAI stream interrupted: {e}", retries) from e
 
-    except openai.OpenAIError as e:
-        raise openai.OpenAIError(f"OpenAI API error: {str(e)}") from e
-    except Exception as e:
-        raise Exception(f"Unexpected error: {str(e)}") from e
+    record_call()
@@ -1,26 +1,109 @@
+import os
+
 import yaml
-from jinja2 import Template
+from jinja2 import (Environment, FileSystemBytecodeCache, FileSystemLoader,
+                    TemplateError)
+
+REQUIRED_PROMPT_KEYS = ("path", "base_prompt")
+PROMPT_FILE_KEYS = ("path", "instructions", "base_prompt")
 
 
 class PromptManager:
+    """
+    Renders the prompts declared in configs/prompts.yaml.
+
+    Templates are compiled once by a shared Jinja environment (with a bytecode
+    cache on disk) and only recompiled when their file changes on disk.
+    """
+
     def __init__(self, config_path="configs/prompts.yaml"):
         with open(config_path) as f:
             self.config = yaml.safe_load(f)
 
+        self.environment = Environment(
+            loader=FileSystemLoader("."),
+            bytecode_cache=FileSystemBytecodeCache(),
+            auto_reload=True,
+        )
+        self._base_prompts = {}
+
+        self.validate()
+
+    def validate(self) -> None:
+        """
+        Check that every prompt declares its files, that they exist and that
+        the templates compile, so that a broken configuration fails at startup.
+        """
+        errors = []
+
+        for prompt_name, prompt_cfg in self.config.items():
+            for key in REQUIRED_PROMPT_KEYS:
+                if key not in prompt_cfg:
+                    errors.append(f"{prompt_name}: missing '{key}'")
+
+            for key in PROMPT_FILE_KEYS:
+                if key in prompt_cfg and not os.path.isfile(prompt_cfg[key]):
+                    errors.append(
+                        f"{prompt_name}: {key} file not found: {prompt_cfg[key]}"
+                    )
+
+            for key in ("path", "instructions"):
+                if key in prompt_cfg and os.path.isfile(prompt_cfg[key]):
+                    try:
+                        self.environment.get_template(prompt_cfg[key])
+                    except TemplateError as e:
+                        errors.append(
+                            f"{prompt_name}: invalid template {prompt_cfg[key]}: {e}"
+                        )
+
+            if not 0 <= prompt_cfg.get("temperature", 0.7) <= 1:
+                errors.append(f"{prompt_name}: temperature must be between 0 and 1")
+
+            routing = prompt_cfg.get("routing")
+            if routing is not None and not routing.get("models"):
+                errors.append(f"{prompt_name}: routing needs a list of models")
+
+        if errors:
+            raise ValueError("Invalid prompts configuration:\n" + "\n".join(errors))
+
+    def _read_base_prompt(self, path: str) -> str:
+        mtime = os.path.getmtime(path)
+        cached = self._base_prompts.get(path)
+
+        if cached is None or cached[0] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = (mtime, f.read())
+            self._base_prompts[path] = cached
+
+        return cached[1]
+
     def render(self, prompt_name: str, variables: dict):
+        """
+        Render a prompt split into a stable prefix (base prompt and
+        instructions, identical across the chunks of a run) and a variable
+        task prompt, so that provider-side prompt caching can reuse the prefix.
+        """
         prompt_cfg = self.config[prompt_name]
 
-        with open(prompt_cfg["path"], "r", encoding="utf-8") as f:
-            prompt_template = Template(f.read())
-
-        prompt_text = prompt_template.render(**variables)
+        prompt_text = self.environment.get_template(prompt_cfg["path"]).render(
+            **variables
+        )
 
-        with open(prompt_cfg["base_prompt"]) as f:
-            base_prompt = f.read()
+        instructions = None
+        if prompt_cfg.get("instructions"):
+            instructions = self.environment.get_template(
+                prompt_cfg["instructions"]
+            ).render(**variables)
 
         return {
-            "base_prompt": base_prompt,
+            "prompt_name": prompt_name,
+            "base_prompt": self._read_base_prompt(prompt_cfg["base_prompt"]),
+            "instructions": instructions,
             "task_prompt": prompt_text,
             "model": prompt_cfg.get("model", "gpt-4.1"),
             "temperature": prompt_cfg.get("temperature", 0.7),
+            "routing": prompt_cfg.get("routing"),
         }
+
+
+prompt_mgr = PromptManager()
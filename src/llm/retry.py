@@ -0,0 +1,259 @@
+import concurrent.futures
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional, TypeVar
+
+import numpy as np
+import openai
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCallError(openai.OpenAIError):
+    """
+    An LLM call that failed for good: a non retryable API error, or a retryable
+    one that kept happening until the retries or the deadline ran out.
+    """
+
+    def __init__(self, message: str, retries: int = 0):
+        super().__init__(message)
+        self.retries = retries
+
+
+class LLMDeadlineExceeded(LLMCallError):
+    pass
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How a single LLM call is retried and hedged.
+
+    Attributes:
+        max_retries: Retries after the first attempt
+        base_delay: Backoff of the first retry, doubled at every retry
+        max_delay: Upper bound of a single backoff
+        deadline: Seconds allowed for the whole call, retries included
+        hedge: Whether to send a duplicate request when the first one is slower
+            than the hedge threshold, keeping whichever answer arrives first
+        hedge_after: Fixed hedge threshold in seconds. When None, the observed
+            hedge_quantile latency of the same model and prompt is used
+        hedge_quantile: Latency quantile used as hedge threshold
+        hedge_min_samples: Latencies needed before hedging on the quantile
+    """
+
+    max_retries: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    deadline: Optional[float] = 180.0
+    hedge: bool = False
+    hedge_after: Optional[float] = None
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+
+
+class LatencyTracker:
+    """
+    Sliding window of the latencies of successful attempts, per key.
+    """
+
+    def __init__(self, window: int = 200):
+        self._latencies: dict[Hashable, deque] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, latency: float) -> None:
+        with self._lock:
+            self._latencies[key].append(latency)
+
+    def quantile(
+        self, key: Hashable, quantile: float, min_samples: int = 1
+    ) -> Optional[float]:
+        with self._lock:
+            latencies = list(self._latencies[key])
+
+        if len(latencies) < min_samples:
+            return None
+
+        return float(np.quantile(latencies, quantile))
+
+
+latency_tracker = LatencyTracker()
+
+# Hedged attempts run in threads, the loser keeps running until it returns
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=16, thread_name_prefix="llm-hedge"
+)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Delay requested by the server in the Retry-After headers of the error, if any.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+
+    return None
+
+
+def backoff_delay(
+    attempt: int, policy: RetryPolicy, error: Optional[Exception] = None
+) -> float:
+    """
+    Delay before the retry following the given attempt (0 for the first one):
+    the server Retry-After if there is one, otherwise a full jitter exponential
+    backoff.
+    """
+    server_delay = retry_after(error) if error is not None else None
+    if server_delay is not None:
+        return min(server_delay, policy.max_delay)
+
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * 2**attempt))
+
+
+def _hedge_threshold(policy: RetryPolicy, latency_key: Hashable) -> Optional[float]:
+    if not policy.hedge:
+        return None
+    if policy.hedge_after is not None:
+        return policy.hedge_after
+
+    return latency_tracker.quantile(
+        latency_key, policy.hedge_quantile, policy.hedge_min_samples
+    )
+
+
+def _hedged_attempt(
+    call: Callable[[Optional[float]], T],
+    timeout: Optional[float],
+    hedge_after: float,
+) -> T:
+    """
+    Run call in the background, send a duplicate after hedge_after seconds if
+    it has not returned yet, and return the first successful result. Raises
+    the last error if every request failed.
+    """
+    futures = [_executor.submit(contextvars.copy_context().run, call, timeout)]
+    done, _ = concurrent.futures.wait(futures, timeout=hedge_after)
+
+    if not done:
+        logger.info(f"Hedging LLM call still running after {hedge_after:.2f}s")
+        hedge_timeout = None if timeout is None else max(timeout - hedge_after, 0.1)
+        futures.append(
+            _executor.submit(contextvars.copy_context().run, call, hedge_timeout)
+        )
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(
+            pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        if not done:
+            raise LLMDeadlineExceeded("LLM call deadline exceeded")
+
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+
+    raise error
+
+
+def call_with_retries(
+    call: Callable[[Optional[float]], T],
+    policy: Optional[RetryPolicy] = None,
+    latency_key: Hashable = None,
+) -> tuple[T, int]:
+    """
+    Call an LLM endpoint with retries, backoff, deadline and optional hedging.
+
+    Args:
+        call: Function doing one request, given the request timeout in seconds
+            (None for no timeout)
+        policy: Retry policy, the default one if None
+        latency_key: Key under which latencies are tracked for hedging,
+            e.g. (model, prompt_name)
+
+    Returns:
+        The result of call and the number of retries it took
+
+    Raises:
+        LLMDeadlineExceeded: If the deadline is reached before a success
+        LLMCallError: If the error is not retryable or the retries ran out
+    """
+    policy = policy or RetryPolicy()
+    deadline = (
+        time.monotonic() + policy.deadline if policy.deadline is not None else None
+    )
+
+    attempt = 0
+    while True:
+        timeout = None if deadline is None else deadline - time.monotonic()
+        if timeout is not None and timeout <= 0:
+            raise LLMDeadlineExceeded(
+                f"LLM call deadline of {policy.deadline}s exceeded", attempt
+            )
+
+        hedge_after = _hedge_threshold(policy, latency_key)
+        start_time = time.perf_counter()
+        try:
+            if hedge_after is not None and (timeout is None or hedge_after < timeout):
+                result = _hedged_attempt(call, timeout, hedge_after)
+            else:
+                result = call(timeout)
+
+            latency_tracker.add(latency_key, time.perf_counter() - start_time)
+            return result, attempt
+
+        except RETRYABLE_ERRORS as e:
+            if attempt >= policy.max_retries:
+                raise LLMCallError(
+                    f"LLM call failed after {attempt} retries: {e}", attempt
+                ) from e
+
+            delay = backoff_delay(attempt, policy, e)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise LLMDeadlineExceeded(
+                    f"LLM call deadline of {policy.deadline}s exceeded: {e}", attempt
+                ) from e
+
+            logger.warning(
+                f"Retryable LLM error ({type(e).__name__}), "
+                f"retry {attempt + 1}/{policy.max_retries} in {delay:.2f}s"
+            )
+            time.sleep(delay)
+            attempt += 1
+
+        except LLMDeadlineExceeded as e:
+            e.retries = attempt
+            raise
+
+        except openai.APIStatusError as e:
+            raise LLMCallError(
+                f"OpenAI API error {e.status_code}: {e.message}", attempt
+            ) from e
@@ -0,0 +1,303 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional, TypeVar
+
+from src.llm.llm_wraper import PydanticModelType
+from src.llm.retry import latency_tracker
+from src.llm.telemetry import LLMCallRecord, telemetry
+
+T = TypeVar("T")
+
+# Raw decisions kept for the JSON export, the summary covers every decision
+MAX_DECISIONS = 1000
+
+# USD per million tokens: input, cached input, output
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def call_cost(
+    model: str, input_tokens: int, cached_tokens: int, output_tokens: int
+) -> float:
+    """
+    Cost of a call in USD, 0 for models without a known price.
+    """
+    if model not in MODEL_PRICES:
+        return 0.0
+
+    input_price, cached_price, output_price = MODEL_PRICES[model]
+    return (
+        (input_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+def records_cost(records: list[LLMCallRecord], model: Optional[str] = None) -> float:
+    """
+    Cost of the recorded calls, or what they would have cost with the given model.
+    """
+    return sum(
+        call_cost(
+            model or call_record.model,
+            call_record.input_tokens,
+            call_record.cached_tokens,
+            call_record.output_tokens,
+        )
+        for call_record in records
+    )
+
+
+@dataclass
+class RoutingDecision:
+    prompt_name: str
+    input_chars: int
+    reason: str
+    models_tried: list[str]
+    model: str
+    accepted: bool
+    latency: float
+    cost: float
+    baseline_model: str
+    baseline_cost: float
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def savings(self) -> float:
+        return self.baseline_cost - self.cost
+
+
+class ModelRouter:
+    """
+    Picks the model of each call from the routing policy of its prompt in
+    configs/prompts.yaml:
+
+        routing:
+          models: ["gpt-4o-mini", "gpt-4o"]  # cheapest first
+          max_input_chars: 2000              # larger inputs go to the last model
+          max_latency: 10                    # skip models slower than this (p95)
+          final_model_schemas: []            # structured outputs for the last model
+
+    Models are tried in order until the output passes validation. A model
+    whose outputs keep failing validation for a prompt is skipped, except for
+    one probe call every probe_interval calls, until its failure rate goes
+    down again. Prompts without a routing policy use their configured model.
+
+    Every routed call is recorded as a RoutingDecision, with its cost and the
+    cost the same tokens would have had with the configured model. Only the
+    max_decisions most recent decisions are kept, and every decision is added
+    to running totals per prompt and final model for the summary.
+    """
+
+    def __init__(
+        self,
+        failure_window: int = 50,
+        max_failure_rate: float = 0.5,
+        min_samples: int = 10,
+        probe_interval: int = 10,
+        max_decisions: int = MAX_DECISIONS,
+    ):
+        self.max_failure_rate = max_failure_rate
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self._skips: dict[tuple[str, str], int] = defaultdict(int)
+        self.decisions: deque[RoutingDecision] = deque(maxlen=max_decisions)
+        self._totals: dict[tuple[str, str], dict] = {}
+        self._validations: dict[tuple[str, str], deque] = defaultdict(
+            lambda: deque(maxlen=failure_window)
+        )
+        self._lock = threading.Lock()
+
+    def failure_rate(self, prompt_name: str, model: str) -> Optional[float]:
+        with self._lock:
+            validations = list(self._validations[(prompt_name, model)])
+
+        if len(validations) < self.min_samples:
+            return None
+
+        return 1 - sum(validations) / len(validations)
+
+    def _should_probe(self, prompt_name: str, model: str) -> bool:
+        with self._lock:
+            self._skips[(prompt_name, model)] += 1
+            return self._skips[(prompt_name, model)] % self.probe_interval == 0
+
+    def candidates(
+        self,
+        prompt: dict,
+        input_chars: int,
+        structured_output: Optional[PydanticModelType] = None,
+    ) -> tuple[list[str], str]:
+        """
+        Models to try for a call, in order, and the reason of the choice.
+        """
+        routing = prompt.get("routing")
+        if not routing:
+            return [prompt["model"]], "no routing policy"
+
+        *cascade, final_model = routing["models"]
+
+        if input_chars > routing.get("max_input_chars", float("inf")):
+            return [final_model], "large input"
+        if structured_output and structured_output.__name__ in routing.get(
+            "final_model_schemas", []
+        ):
+            return [final_model], f"{structured_output.__name__} schema"
+
+        models, skipped = [], []
+        for model in cascade:
+            failure_rate = self.failure_rate(prompt["prompt_name"], model)
+            p95_latency = latency_tracker.quantile(
+                (model, prompt["prompt_name"]), 0.95, self.min_samples
+            )
+
+            if failure_rate is not None and failure_rate > self.max_failure_rate:
+                if self._should_probe(prompt["prompt_name"], model):
+                    models.append(model)
+                else:
+                    skipped.append(f"{model} failure rate {failure_rate:.0%}")
+            elif (
+                routing.get("max_latency")
+                and p95_latency is not None
+                and p95_latency > routing["max_latency"]
+            ):
+                skipped.append(f"{model} p95 latency {p95_latency:.1f}s")
+            else:
+                models.append(model)
+
+        reason = "cascade" if not skipped else "skipped " + ", ".join(skipped)
+        return models + [final_model], reason
+
+    def route(
+        self,
+        prompt: dict,
+        call: Callable[[str], T],
+        validate: Optional[Callable[[T], bool]] = None,
+        input_chars: Optional[int] = None,
+        structured_output: Optional[PydanticModelType] = None,
+    ) -> T:
+        """
+        Run call(model) with the routed models until validate accepts the
+        result. The result of the last model is returned even if it fails
+        validation, and errors of the last model are raised.
+
+        Args:
+            prompt: Prompt rendered by the PromptManager
+            call: Function doing the LLM call with the given model
+            validate: Whether a result is acceptable, any result if None
+            input_chars: Size of the variable input, the task prompt if None
+            structured_output: Pydantic model of the structured output, if any
+
+        Returns:
+            The result of the accepted call
+        """
+        if input_chars is None:
+            input_chars = len(prompt["task_prompt"])
+        models, reason = self.candidates(prompt, input_chars, structured_output)
+
+        start_time = time.perf_counter()
+        all_records = []
+        models_tried = []
+        for i, model in enumerate(models):
+            models_tried.append(model)
+            is_last = i == len(models) - 1
+
+            with telemetry.capture() as attempt_records:
+                try:
+                    result = call(model)
+                    accepted = validate is None or validate(result)
+                except Exception as e:
+                    if is_last:
+                        raise
+                    logger.warning(f"{model} failed, escalating: {e}")
+                    accepted = False
+            all_records.extend(attempt_records)
+
+            with self._lock:
+                self._validations[(prompt["prompt_name"], model)].append(accepted)
+
+            if accepted or is_last:
+                break
+
+            logger.info(f"{model} output rejected for {prompt['prompt_name']}")
+
+        # The baseline is the call without routing: the final attempt's tokens
+        # (with its retries) priced at the baseline model. The cost covers every
+        # attempt, so rejected attempts count against the savings.
+        self._record(
+            RoutingDecision(
+                prompt_name=prompt["prompt_name"],
+                input_chars=input_chars,
+                reason=reason,
+                models_tried=models_tried,
+                model=model,
+                accepted=accepted,
+                latency=time.perf_counter() - start_time,
+                cost=records_cost(all_records),
+                baseline_model=prompt["model"],
+                baseline_cost=records_cost(attempt_records, prompt["model"]),
+            )
+        )
+
+        return result
+
+    def _record(self, decision: RoutingDecision) -> None:
+        with self._lock:
+            self.decisions.append(decision)
+            totals = self._totals.setdefault(
+                (decision.prompt_name, decision.model),
+                {
+                    "calls": 0,
+                    "escalations": 0,
+                    "rejected": 0,
+                    "cost": 0.0,
+                    "baseline_cost": 0.0,
+                },
+            )
+            totals["calls"] += 1
+            totals["escalations"] += len(decision.models_tried) - 1
+            totals["rejected"] += int(not decision.accepted)
+            totals["cost"] += decision.cost
+            totals["baseline_cost"] += decision.baseline_cost
+
+    def summary(self) -> list[dict]:
+        """
+        Routing decisions and savings per prompt and final model.
+        """
+        with self._lock:
+            groups = {key: dict(values) for key, values in self._totals.items()}
+
+        return [
+            {
+                "prompt_name": prompt_name,
+                "model": model,
+                **values,
+                "savings": values["baseline_cost"] - values["cost"],
+            }
+            for (prompt_name, model), values in groups.items()
+        ]
+
+    def to_json(self) -> str:
+        with self._lock:
+            decisions = [asdict(decision) for decision in self.decisions]
+
+        return json.dumps({"summary": self.summary(), "decisions": decisions}, indent=2)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.decisions.clear()
+            self._totals = {}
+
+
+model_router = ModelRouter()
@@ -0,0 +1,271 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+_current_stage: ContextVar[Optional[str]] = ContextVar("llm_stage", default=None)
+_current_video_id: ContextVar[Optional[str]] = ContextVar("llm_video_id", default=None)
+_captured_records: ContextVar[Optional[list]] = ContextVar(
+    "llm_captured_records", default=None
+)
+
+AGGREGATE_KEYS = ("stage", "prompt_name", "model")
+
+# Raw records kept for the JSON export, the aggregates cover every call
+MAX_RECORDS = 1000
+
+
+@dataclass
+class LLMCallRecord:
+    model: str
+    prompt_name: Optional[str]
+    stage: Optional[str]
+    video_id: Optional[str]
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    # None for the requests of a batch, which have no latency of their own
+    latency: Optional[float]
+    retries: int = 0
+    # Replayed from a cassette, no API call was made
+    cache_hit: bool = False
+    # Part of the prompt was served from the provider prompt cache
+    prompt_cache_hit: bool = False
+    timestamp: float = field(default_factory=time.time)
+
+
+@contextmanager
+def telemetry_context(
+    stage: Optional[str] = None, video_id: Optional[str] = None
+) -> Iterator[None]:
+    """
+    Tag every LLM call made inside the block with a pipeline stage and a video
+    ID. Nested blocks inherit the values they don't override.
+    """
+    stage_token = _current_stage.set(stage or _current_stage.get())
+    video_id_token = _current_video_id.set(video_id or _current_video_id.get())
+    try:
+        yield
+    finally:
+        _current_stage.reset(stage_token)
+        _current_video_id.reset(video_id_token)
+
+
+def _empty_totals() -> dict:
+    return {
+        "calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+        "retries": 0,
+        "cache_hits": 0,
+        "prompt_cache_hits": 0,
+        "timed_calls": 0,
+        "latency_total": 0.0,
+        "latency_max": 0.0,
+    }
+
+
+class TelemetryRecorder:
+    """
+    Collects one record per LLM call and exports aggregates as JSON or in the
+    Prometheus text exposition format.
+
+    Only the max_records most recent records are kept. Every call is also
+    added to running totals per AGGREGATE_KEYS, so the aggregates cover all
+    the calls since the last reset, in constant memory.
+    """
+
+    def __init__(self, max_records: int = MAX_RECORDS):
+        self.records: deque[LLMCallRecord] = deque(maxlen=max_records)
+        self._totals: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        model: str,
+        prompt_name: Optional[str],
+        latency: Optional[float],
+        usage=None,
+        retries: int = 0,
+        cache_hit: bool = False,
+    ) -> LLMCallRecord:
+        """
+        Record a call from the usage object returned by the API. cache_hit is
+        for calls replayed from a cassette, calls that reused the provider
+        prompt cache are counted apart as prompt cache hits.
+        """
+        cached_tokens = 0
+        if usage and usage.prompt_tokens_details:
+            cached_tokens = usage.prompt_tokens_details.cached_tokens or 0
+
+        call_record = LLMCallRecord(
+            model=model,
+            prompt_name=prompt_name,
+            stage=_current_stage.get(),
+            video_id=_current_video_id.get(),
+            input_tokens=usage.prompt_tokens if usage else 0,
+            output_tokens=usage.completion_tokens if usage else 0,
+            cached_tokens=cached_tokens,
+            latency=latency,
+            retries=retries,
+            cache_hit=cache_hit,
+            prompt_cache_hit=cached_tokens > 0,
+        )
+
+        key = tuple(getattr(call_record, key) for key in AGGREGATE_KEYS)
+        with self._lock:
+            self.records.append(call_record)
+            totals = self._totals.setdefault(key, _empty_totals())
+            totals["calls"] += 1
+            totals["input_tokens"] += call_record.input_tokens
+            totals["output_tokens"] += call_record.output_tokens
+            totals["cached_tokens"] += call_record.cached_tokens
+            totals["retries"] += call_record.retries
+            totals["cache_hits"] += int(call_record.cache_hit)
+            totals["prompt_cache_hits"] += int(call_record.prompt_cache_hit)
+            if call_record.latency is not None:
+                totals["timed_calls"] += 1
+                totals["latency_total"] += call_record.latency
+                totals["latency_max"] = max(totals["latency_max"], call_record.latency)
+
+        captured_records = _captured_records.get()
+        if captured_records is not None:
+            captured_records.append(call_record)
+
+        return call_record
+
+    @contextmanager
+    def capture(self) -> Iterator[list[LLMCallRecord]]:
+        """
+        Collect the records of the calls made inside the block (in this context
+        and the contexts copied from it), in addition to recording them.
+        """
+        captured_records = []
+        token = _captured_records.set(captured_records)
+        try:
+            yield captured_records
+        finally:
+            _captured_records.reset(token)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self._totals = {}
+
+    def aggregate(self, group_by: tuple[str, ...] = AGGREGATE_KEYS) -> list[dict]:
+        """
+        Totals of the calls per group, sorted by total latency (slowest
+        first). group_by is a subset of AGGREGATE_KEYS.
+        """
+        with self._lock:
+            totals = [(key, dict(values)) for key, values in self._totals.items()]
+
+        groups = {}
+        for key, values in totals:
+            keys = dict(zip(AGGREGATE_KEYS, key))
+            group = groups.setdefault(
+                tuple(keys[name] for name in group_by), _empty_totals()
+            )
+            for name, value in values.items():
+                if name == "latency_max":
+                    group[name] = max(group[name], value)
+                else:
+                    group[name] += value
+
+        aggregates = [
+            {
+                **dict(zip(group_by, key)),
+                **values,
+                "latency_mean": (
+                    values["latency_total"] / values["timed_calls"]
+                    if values["timed_calls"]
+                    else None
+                ),
+            }
+            for key, values in groups.items()
+        ]
+
+        return sorted(aggregates, key=lambda a: a["latency_total"], reverse=True)
+
+    def to_json(self) -> str:
+        with self._lock:
+            records = [asdict(call_record) for call_record in self.records]
+
+        return json.dumps(
+            {"aggregates": self.aggregate(), "records": records}, indent=2
+        )
+
+    def export_json(self, output_path: Path) -> None:
+        with open(str(output_path), "w", encoding="utf-8") as file:
+            file.write(self.to_json())
+
+    def to_prometheus(self) -> str:
+        metrics = [
+            ("llm_calls_total", "counter", "Number of LLM calls", "calls"),
+            ("llm_input_tokens_total", "counter", "Prompt tokens", "input_tokens"),
+            (
+                "llm_output_tokens_total",
+                "counter",
+                "Completion tokens",
+                "output_tokens",
+            ),
+            (
+                "llm_cached_tokens_total",
+                "counter",
+                "Prompt tokens served from the provider cache",
+                "cached_tokens",
+            ),
+            ("llm_retries_total", "counter", "Retried LLM calls", "retries"),
+            (
+                "llm_cache_hits_total",
+                "counter",
+                "LLM calls replayed from a cassette",
+                "cache_hits",
+            ),
+            (
+                "llm_prompt_cache_hits_total",
+                "counter",
+                "LLM calls that reused the provider prompt cache",
+                "prompt_cache_hits",
+            ),
+            (
+                "llm_latency_seconds_sum",
+                "counter",
+                "Total LLM call latency",
+                "latency_total",
+            ),
+            (
+                "llm_latency_seconds_max",
+                "gauge",
+                "Slowest LLM call latency",
+                "latency_max",
+            ),
+        ]
+        aggregates = self.aggregate()
+
+        lines = []
+        for name, metric_type, description, value_key in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for aggregate in aggregates:
+                labels = ",".join(
+                    f'{key}="{_escape_label(aggregate[key])}"' for key in AGGREGATE_KEYS
+                )
+                lines.append(f"{name}{{{labels}}} {aggregate[value_key]}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: Optional[str]) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+telemetry = TelemetryRecorder()
@@ -0,0 +1,109 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# How far ahead to look for the next matching word after a mismatch
+RESYNC_WINDOW = 8
+
+NON_WORD_PATTERN = re.compile(r"\W+")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AlignmentMismatch:
+    word_index: int
+    word: str
+    tokens: list[str]
+
+    def __str__(self) -> str:
+        return f"word {self.word_index} {self.word!r} <-> {' '.join(self.tokens)!r}"
+
+
+def normalize_token(token: str) -> str:
+    return NON_WORD_PATTERN.sub("", token.lower())
+
+
+def _resync(
+    tokens: list[str], words: list[str], i: int, j: int
+) -> Optional[tuple[int, int]]:
+    """
+    Smallest (token skip, word skip) after which tokens and words match again.
+    """
+    for distance in range(1, RESYNC_WINDOW + 1):
+        for token_skip in range(distance + 1):
+            word_skip = distance - token_skip
+            if i + token_skip < len(tokens) and j + word_skip < len(words):
+                if normalize_token(tokens[i + token_skip]) == normalize_token(
+                    words[j + word_skip]
+                ):
+                    return token_skip, word_skip
+
+    return None
+
+
+def align_punctuated_words(
+    text: str, words: list[str]
+) -> tuple[list[str], list[AlignmentMismatch]]:
+    """
+    Give every transcribed word its punctuated form from the transcript text,
+    in a single pass.
+
+    Tokens of the text are matched to the words on their letters and digits.
+    When they differ, the alignment resyncs on the next match within
+    RESYNC_WINDOW tokens: substituted words take the token of the text and
+    the words without a token keep their own text.
+
+    Args:
+        text: Punctuated transcript text
+        words: Text of the transcribed words, in order
+
+    Returns:
+        The punctuated words (one per word) and the mismatches found
+    """
+    tokens = text.split()
+    punctuated_words = []
+    mismatches = []
+
+    i = 0
+    for j, word in enumerate(words):
+        if i < len(tokens) and normalize_token(tokens[i]) == normalize_token(word):
+            punctuated_words.append(tokens[i])
+            i += 1
+            continue
+
+        token_skip, word_skip = _resync(tokens, words, i, j) or (1, 1)
+        if word_skip == 0:
+            # Extra tokens in the text before this word
+            mismatches.append(AlignmentMismatch(j, word, tokens[i : i + token_skip]))
+            punctuated_words.append(tokens[i + token_skip])
+            i += token_skip + 1
+        elif token_skip == word_skip and i < len(tokens):
+            # Substituted word, e.g. a different spelling
+            mismatches.append(AlignmentMismatch(j, word, tokens[i : i + 1]))
+            punctuated_words.append(tokens[i])
+            i += 1
+        else:
+            # No token for this word: keep its own text
+            mismatches.append(AlignmentMismatch(j, word, tokens[i : i + token_skip]))
+            punctuated_words.append(word)
+            i += token_skip
+
+    if i < len(tokens):
+        mismatches.append(AlignmentMismatch(len(words), "", tokens[i:]))
+
+    return punctuated_words, mismatches
+
+
+def log_alignment_mismatches(
+    mismatches: list[AlignmentMismatch], nb_words: int, max_examples: int = 5
+) -> None:
+    if not mismatches:
+        return
+
+    examples = "\n".join(f"  {mismatch}" for mismatch in mismatches[:max_examples])
+    logger.warning(
+        f"{len(mismatches)} mismatches aligning the transcript text with its "
+        f"{nb_words} words:\n{examples}"
+    )
@@ -0,0 +1,92 @@
+import wave
+from pathlib import Path
+
+import numpy as np
+
+
+def wav_duration(wav_path: Path) -> float:
+    with wave.open(str(wav_path), "rb") as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+def detect_silences(
+    wav_path: Path,
+    threshold_db: float = -40,
+    min_silence_duration: float = 0.3,
+    frame_duration: float = 0.05,
+    block_duration: float = 60,
+) -> list[tuple[float, float]]:
+    """
+    Find the silences of a 16-bit PCM WAV file (as written by extract_audio),
+    reading it block by block.
+
+    Args:
+        wav_path: Path of the WAV file
+        threshold_db: Level (in dBFS) under which a frame is silent
+        min_silence_duration: Minimum duration of a silence, in seconds
+        frame_duration: Duration of the frames whose level is measured
+        block_duration: Duration of audio read at once
+
+    Returns:
+        The (start, end) of every silence, in seconds
+    """
+    with wave.open(str(wav_path), "rb") as wav_file:
+        if wav_file.getsampwidth() != 2:
+            raise ValueError(f"{wav_path} is not a 16-bit PCM WAV file")
+
+        framerate = wav_file.getframerate()
+        channels = wav_file.getnchannels()
+        frame_samples = max(1, int(frame_duration * framerate))
+        block_frames = frame_samples * max(1, int(block_duration / frame_duration))
+
+        levels = []
+        while True:
+            block = wav_file.readframes(block_frames)
+            if not block:
+                break
+
+            samples = np.frombuffer(block, dtype=np.int16).astype(np.float32)
+            samples = samples.reshape(-1, channels).mean(axis=1)
+            samples = samples[: len(samples) // frame_samples * frame_samples]
+            if not len(samples):
+                break
+
+            rms = np.sqrt(np.mean(samples.reshape(-1, frame_samples) ** 2, axis=1))
+            levels.append(20 * np.log10(np.maximum(rms, 1) / 32768))
+
+    if not levels:
+        return []
+
+    silent = np.concatenate(levels) < threshold_db
+
+    # Start and end frames of the silent runs
+    edges = np.diff(np.concatenate([[0], silent.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    frame_time = frame_samples / framerate
+    return [
+        (float(start * frame_time), float(end * frame_time))
+        for start, end in zip(starts, ends)
+        if (end - start) * frame_time >= min_silence_duration
+    ]
+
+
+def write_wav_segment(
+    wav_path: Path, start: float, end: float, output_path: Path
+) -> None:
+    """
+    Copy the audio between start and end (in seconds) to a new WAV file.
+    """
+    with wave.open(str(wav_path), "rb") as wav_file:
+        framerate = wav_file.getframerate()
+        start_frame = max(0, int(start * framerate))
+        end_frame = min(wav_file.getnframes(), int(end * framerate))
+
+        wav_file.setpos(start_frame)
+        frames = wav_file.readframes(end_frame - start_frame)
+        params = wav_file.getparams()
+
+    with wave.open(str(output_path), "wb") as output_file:
+        output_file.setparams(params)
+        output_file.writeframes(frames)
@@ -1,75 +1,133 @@
 from datetime import timedelta
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
 
-from src.core.models import Segment, Subtitle, Word
+from src.core.models import Segment, Subtitle, WordTable
+
+# Zoom from 60% to 100% in the first 100 ms
+ZOOM_IN_TAG = r"{\fscx60\fscy60\t(0,100,\fscx100\fscy100)}"
+
+# A subtitle ends after a word containing one of them
+SUBTITLE_END_MARKS = frozenset("?!")
+
+
+class SubtitleChunk:
+    """
+    Subtitle being built by generate_subtitles: its number of words, its
+    length as "word word " (each word followed by a space), its start and end,
+    and whether its last word contains one of SUBTITLE_END_MARKS.
+    """
+
+    __slots__ = ("nb_words", "length", "start", "end", "ended")
+
+    def __init__(self, start: float):
+        self.nb_words = 0
+        self.length = 0
+        self.start = start
+        self.end = start
+        self.ended = False
+
+    def add(self, word: str, end: float) -> None:
+        self.nb_words += 1
+        self.length += len(word) + 1
+        self.end = end
+        self.ended = not SUBTITLE_END_MARKS.isdisjoint(word)
+
+
+# Whether to start a new subtitle before a word, given the current subtitle,
+# and the text, start and end of the word
+BreakRule = Callable[[SubtitleChunk, str, float, float], bool]
+
+
+def max_gap_rule(max_gap: float) -> BreakRule:
+    """
+    Break when the speaker pauses for more than max_gap seconds.
+    """
+
+    def rule(chunk: SubtitleChunk, word: str, start: float, end: float) -> bool:
+        return start - chunk.end > max_gap
+
+    return rule
+
+
+def max_cps_rule(max_cps: float) -> BreakRule:
+    """
+    Break before a word that would make the subtitle show more than max_cps
+    characters per second.
+    """
+
+    def rule(chunk: SubtitleChunk, word: str, start: float, end: float) -> bool:
+        return chunk.length + len(word) > max_cps * max(end - chunk.start, 0.001)
+
+    return rule
 
 
 def generate_subtitles(
-    selected_segments: list[Segment],
+    selected_segments: Iterable[Segment],
     max_subtitle_length: int = 20,
     max_words_per_subtitle: int = 3,
     upper_case: bool = False,
     time_offset: int = 0,
+    break_rules: Optional[list[BreakRule]] = None,
 ) -> list[Subtitle]:
+    """
+    Split segments into subtitles in a single pass over their words. A new
+    subtitle starts before a word when it would make the subtitle longer than
+    max_subtitle_length, when the subtitle already has max_words_per_subtitle
+    words or ends with "?" or "!", or when one of break_rules says so (see
+    max_gap_rule and max_cps_rule).
+
+    The words of the subtitles are views on the words of the segments (see
+    WordTable), with time_offset subtracted from their times.
+    """
+    break_rules = break_rules or []
     subtitles = []
 
     for segment in selected_segments:
         words = segment.words
-        current_subtitle = ""
-        current_subtitle_start = segment.start - time_offset
-        current_subtitle_words = []
-
-        for word in words:
-            if (
-                (len(current_subtitle + " " + word.word) > max_subtitle_length)
-                or (len(current_subtitle.split(" ")) > max_words_per_subtitle)
-                or any(punct in current_subtitle for punct in "?!")
+        if not isinstance(words, WordTable):
+            words = WordTable.from_lists(
+                [word.word for word in words],
+                [word.start for word in words],
+                [word.end for word in words],
+            )
+        if upper_case:
+            words = words.upper()
+        words = words.shifted(time_offset)
+
+        texts = words.texts
+        chunk = SubtitleChunk(segment.start - time_offset)
+        first = 0
+
+        for index, (text, start, end) in enumerate(
+            zip(texts, words.start_times, words.end_times)
+        ):
+            if chunk.nb_words and (
+                chunk.length + 1 + len(text) > max_subtitle_length
+                or chunk.nb_words >= max_words_per_subtitle
+                or chunk.ended
+                or (
+                    break_rules
+                    and any(rule(chunk, text, start, end) for rule in break_rules)
+                )
             ):
                 subtitles.append(
                     Subtitle(
-                        (
-                            current_subtitle.strip().upper()
-                            if upper_case
-                            else current_subtitle.strip()
-                        ),
-                        current_subtitle_start,
-                        current_subtitle_end,
-                        current_subtitle_words,
-                    )
-                )
-                current_subtitle = word.word + " "
-                current_subtitle_start = word.start - time_offset
-                current_subtitle_end = word.end - time_offset
-                current_subtitle_words = [
-                    Word(
-                        word.word.upper() if upper_case else word.word,
-                        word.start - time_offset,
-                        word.end - time_offset,
-                    )
-                ]
-            else:
-                current_subtitle += word.word + " "
-                current_subtitle_end = word.end - time_offset
-                current_subtitle_words.append(
-                    Word(
-                        word.word.upper() if upper_case else word.word,
-                        word.start - time_offset,
-                        word.end - time_offset,
+                        " ".join(texts[first:index]),
+                        chunk.start,
+                        chunk.end,
+                        words[first:index],
                     )
                 )
+                chunk = SubtitleChunk(start)
+                first = index
+
+            chunk.add(text, end)
 
-        subtitles.append(
-            Subtitle(
-                (
-                    current_subtitle.strip().upper()
-                    if upper_case
-                    else current_subtitle.strip()
-                ),
-                current_subtitle_start,
-                current_subtitle_end,
-                current_subtitle_words,
+        if chunk.nb_words:
+            subtitles.append(
+                Subtitle(" ".join(texts[first:]), chunk.start, chunk.end, words[first:])
             )
-        )
 
     return subtitles
 
@@ -93,8 +151,23 @@ def format_srt_subtitles(subtitles: list[Subtitle]) -> str:
 
 
 def format_time_ass(seconds: float) -> str:
-    td = timedelta(seconds=seconds)
-    return str(td).split(".")[0] + ":" + str(td.microseconds // 10000).zfill(2)
+    """
+    Format seconds as H:MM:SS:CC, rounded to the microsecond and truncated to
+    the centisecond as timedelta does.
+    """
+    whole_seconds = int(seconds)
+    microseconds = round((seconds - whole_seconds) * 1e6)
+    if microseconds == 1_000_000:
+        whole_seconds, microseconds = whole_seconds + 1, 0
+    minutes, secs = divmod(whole_seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if seconds < 0 or hours >= 24:
+        # Days and negative times, written as timedelta writes them
+        td = timedelta(seconds=seconds)
+        return str(td).split(".")[0] + ":" + str(td.microseconds // 10000).zfill(2)
+
+    return "%d:%02d:%02d:%02d" % (hours, minutes, secs, microseconds // 10000)
 
 
 def time_format_ass_to_seconds(time_str: str) -> float:
@@ -112,8 +185,8 @@ def time_format_ass_to_seconds(time_str: str) -> float:
         raise ValueError("Input must be in the format HH:MM:SS:CC")
 
 
-def format_ass_subtitles(
-    subtitles: list[Subtitle],
+def iter_ass_subtitles(
+    subtitles: Iterable[Subtitle],
     video_width: int,
     video_height: int,
     fontname: str = "Impact",
@@ -130,9 +203,13 @@ def format_ass_subtitles(
     MarginR: int = 10,
     MarginV: int = 100,
     special_effect: str = None,
-) -> str:
+) -> Iterator[str]:
+    """
+    Content of the ASS file of subtitles, yielded line by line after the
+    header, so that it can be written as it is generated.
+    """
 
-    ass_content = f"""[Script Info]
+    yield f"""[Script Info]
 Title: Converted Subtitle
 ScriptType: v4.00+
 Collisions: Normal
@@ -151,12 +228,22 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
     line_index = 0
     for subtitle in subtitles:
-        ass_content += generate_dialogue_lines(
+        lines = generate_dialogue_lines(
             line_index, subtitle, special_effect, SecondaryColour
         )
-        line_index = int(ass_content.split("\n")[-2].split(",")[0].split(": ")[-1]) + 1
+        yield from lines
+        line_index += len(lines)
+
 
-    return ass_content
+def format_ass_subtitles(
+    subtitles: Iterable[Subtitle],
+    video_width: int,
+    video_height: int,
+    **ass_parameters,
+) -> str:
+    return "".join(
+        iter_ass_subtitles(subtitles, video_width, video_height, **ass_parameters)
+    )
 
 
 def generate_dialogue_lines(
@@ -164,44 +251,57 @@ def generate_dialogue_lines(
     subtitle: Subtitle,
     special_effect: str | None = None,
     special_effect_color: str | None = None,
-) -> str:
+) -> list[str]:
+    """
+    Dialogue lines of a subtitle, numbered from index: one line, or one line
+    per word for the word highlight effects.
+    """
 
     if special_effect is None:
-        return f"Dialogue: {index},{format_time_ass(subtitle.start)},{format_time_ass(subtitle.end)},Default,,0,0,0,,{subtitle.text}\n"
+        return [
+            f"Dialogue: {index},{format_time_ass(subtitle.start)},{format_time_ass(subtitle.end)},Default,,0,0,0,,{subtitle.text}\n"
+        ]
     elif special_effect == "zoom_in":
-        return f'Dialogue: {index},{format_time_ass(subtitle.start)},{format_time_ass(subtitle.end)},Default,,0,0,0,,{"{\\fscx60\\fscy60\\t(0,100,\\fscx100\\fscy100)}"} {subtitle.text}\n'
+        return [
+            f"Dialogue: {index},{format_time_ass(subtitle.start)},{format_time_ass(subtitle.end)},Default,,0,0,0,,{ZOOM_IN_TAG} {subtitle.text}\n"
+        ]
     else:
-        dialogues_lines = ""
-        words = [word.word for word in subtitle.words]
-        for i, word in enumerate(subtitle.words):
-            if i < len(subtitle.words) - 1:
-                line = f"Dialogue: {index+i},{format_time_ass(subtitle.words[i].start)},{format_time_ass(subtitle.words[i+1].start)},Default,,0,0,0,,"
-            else:
-                line = f"Dialogue: {index+i},{format_time_ass(word.start)},{format_time_ass(word.end)},Default,,0,0,0,,"
+        dialogue_lines = []
+        subtitle_words = list(subtitle.words)
+        words = [word.word for word in subtitle_words]
+        # A word is highlighted until the next one starts, the last one until
+        # it ends
+        times = [format_time_ass(word.start) for word in subtitle_words]
+        if subtitle_words:
+            times.append(format_time_ass(subtitle_words[-1].end))
+
+        for i, word in enumerate(words):
+            line = f"Dialogue: {index+i},{times[i]},{times[i+1]},Default,,0,0,0,,"
+            word = word.replace("\n", "")
 
             if special_effect == "box_highlight":
                 line += (
                     f"{{\\bord0\\shad0\\1c{special_effect_color}}}"
-                    + (" ").join(words[:i])
+                    + " ".join(words[:i])
                     + "{\\r} "
-                    + word.word.replace("\n", "")
+                    + word
                     + f" {{\\bord0\\shad0\\1c{special_effect_color}}}"
-                    + (" ".join(words[i + 1 :]) if i + 1 < len(subtitle.words) else "")
+                    + " ".join(words[i + 1 :])
                     + "{\\r} "
                 )
             elif special_effect == "karaoke_highlight":
                 line += (
                     f"{{\\1c{special_effect_color}}}"
-                    + (" ").join(words[: i + 1])
+                    + " ".join(words[: i + 1])
                     + "{\\r} "
-                    + (" ".join(words[i + 1 :]) if i + 1 < len(subtitle.words) else "")
+                    + " ".join(words[i + 1 :])
                 )
             elif special_effect == "color_highlight":
                 line += (
-                    (" ").join(words[:i])
+                    " ".join(words[:i])
                     + " "
-                    + f"{{\\1c{special_effect_color}}}{word.word.replace('\n','')}{{\\r}} "
-                    + (" ".join(words[i + 1 :]) if i + 1 < len(subtitle.words) else "")
+                    + f"{{\\1c{special_effect_color}}}{word}{{\\r}} "
+                    + " ".join(words[i + 1 :])
                 )
 
             else:
@@ -209,21 +309,24 @@ def generate_dialogue_lines(
                     f'Special Effect "{special_effect}" not recognize. Should be: box_highlight, karaoke_highlight, color_highlight, zoom_in or None.'
                 )
 
-            dialogues_lines += line.strip() + "\n"
+            dialogue_lines.append(line.strip() + "\n")
 
-        return dialogues_lines
+        return dialogue_lines
 
 
 def generate_ass_file(
-    subtitles: list[dict],
+    subtitles: list[Subtitle],
     video_width: int,
     video_height: int,
     ass_file_path: Path,
     subtitles_parameters: dict,
 ) -> None:
-    ass_content = format_ass_subtitles(
-        subtitles, video_width, video_height, **subtitles_parameters
-    )
-
+    """
+    Write the ASS file of subtitles, line by line as they are formatted.
+    """
     with open(str(ass_file_path), "w", encoding="utf-8") as file:
-        file.write(ass_content)
+        file.writelines(
+            iter_ass_subtitles(
+                subtitles, video_width, video_height, **subtitles_parameters
+            )
+        )
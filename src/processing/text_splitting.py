@@ -0,0 +1,234 @@
+import re
+from typing import Optional
+
+# Break costs, the lower the more natural
+SENTENCE_END_COST = 0
+PUNCTUATION_COST = 1
+COORDINATING_COST = 2
+SUBORDINATING_COST = 3
+
+SENTENCE_END_PATTERN = re.compile(r"[.!?;:…]+[\"')\]»”]*$")
+PUNCTUATION_PATTERN = re.compile(r"([,)\]»”]|--|—|–)$")
+
+# Words a clause can start with, per language: (coordinating, subordinating)
+CLAUSE_CONJUNCTIONS = {
+    "en": (
+        {"and", "but", "or", "so", "yet", "nor", "then"},
+        {
+            "because",
+            "although",
+            "though",
+            "while",
+            "when",
+            "whenever",
+            "which",
+            "who",
+            "where",
+            "if",
+            "since",
+            "until",
+            "unless",
+            "whereas",
+            "before",
+            "after",
+            "that",
+        },
+    ),
+    "fr": (
+        {"et", "mais", "ou", "donc", "car", "puis", "alors", "ni"},
+        {
+            "parce",
+            "quand",
+            "lorsque",
+            "lorsqu'",
+            "puisque",
+            "puisqu'",
+            "si",
+            "comme",
+            "qui",
+            "que",
+            "qu'",
+            "où",
+            "dont",
+            "pendant",
+            "avant",
+            "après",
+            "bien",
+            "tandis",
+        },
+    ),
+    "es": (
+        {"y", "e", "pero", "o", "u", "sino", "entonces", "pues"},
+        {
+            "porque",
+            "aunque",
+            "cuando",
+            "mientras",
+            "si",
+            "que",
+            "donde",
+            "como",
+            "quien",
+            "antes",
+            "después",
+        },
+    ),
+    "it": (
+        {"e", "ma", "o", "però", "quindi", "poi", "allora"},
+        {
+            "perché",
+            "anche",
+            "quando",
+            "mentre",
+            "se",
+            "che",
+            "dove",
+            "come",
+            "poiché",
+            "sebbene",
+            "prima",
+            "dopo",
+        },
+    ),
+    "pt": (
+        {"e", "mas", "ou", "então", "porém", "pois"},
+        {
+            "porque",
+            "embora",
+            "quando",
+            "enquanto",
+            "se",
+            "que",
+            "onde",
+            "como",
+            "antes",
+            "depois",
+        },
+    ),
+    "de": (
+        {"und", "aber", "oder", "sondern", "denn", "dann", "also"},
+        {
+            "weil",
+            "obwohl",
+            "wenn",
+            "als",
+            "während",
+            "dass",
+            "ob",
+            "bevor",
+            "nachdem",
+            "damit",
+            "wo",
+        },
+    ),
+}
+
+
+def _clause_word(token: str) -> str:
+    return token.lower().lstrip("\"'(«“¿¡")
+
+
+def boundary_costs(tokens: list[str], language: str = "en") -> list[Optional[int]]:
+    """
+    Cost of splitting after each token but the last, None where the text
+    should not be split.
+    """
+    coordinating, subordinating = CLAUSE_CONJUNCTIONS.get(
+        language.split("_")[0].lower(), CLAUSE_CONJUNCTIONS["en"]
+    )
+
+    costs = []
+    for token, next_token in zip(tokens, tokens[1:]):
+        next_word = _clause_word(next_token)
+        elided_word = next_word.split("'")[0] + "'" if "'" in next_word else None
+
+        if SENTENCE_END_PATTERN.search(token):
+            costs.append(SENTENCE_END_COST)
+        elif PUNCTUATION_PATTERN.search(token) or next_token in ("—", "–", "--"):
+            costs.append(PUNCTUATION_COST)
+        elif next_word in coordinating:
+            costs.append(COORDINATING_COST)
+        elif next_word in subordinating or elided_word in subordinating:
+            costs.append(SUBORDINATING_COST)
+        else:
+            costs.append(None)
+
+    return costs
+
+
+def split_clauses(
+    text: str,
+    max_segment_length: int,
+    language: str = "en",
+    min_segment_length: int = 10,
+) -> Optional[list[str]]:
+    """
+    Split a text on clause boundaries (punctuation and conjunctions) into
+    segments shorter than max_segment_length, with " ".join(segments) == text.
+
+    A dynamic program over the possible boundaries finds the split with the
+    fewest segments, then the most natural boundaries and the most balanced
+    lengths. Segments shorter than min_segment_length are avoided when possible.
+
+    Args:
+        text: Text to split
+        max_segment_length: Exclusive upper bound on the segment length
+        language: Language code of the text, for its conjunctions
+        min_segment_length: Length under which a segment is penalized
+
+    Returns:
+        The segments, or None if the text cannot be split on clause boundaries
+    """
+    if len(text) < max_segment_length:
+        return [text]
+
+    tokens = text.split(" ")
+    costs = boundary_costs(tokens, language)
+
+    # offsets[i]: length of " ".join(tokens[:i]) + 1
+    offsets = [0]
+    for token in tokens:
+        offsets.append(offsets[-1] + len(token) + 1)
+
+    nb_segments = -(-len(text) // (max_segment_length - 1))
+    ideal_length = len(text) / nb_segments
+
+    # best[i]: (segments, cost, previous boundary) of the best split of tokens[:i]
+    best: list[Optional[tuple]] = [None] * (len(tokens) + 1)
+    best[0] = (0, 0.0, None)
+    ends = [i + 1 for i, cost in enumerate(costs) if cost is not None]
+    starts = [0]
+
+    for end in ends + [len(tokens)]:
+        for start in starts:
+            if best[start] is None:
+                continue
+
+            length = offsets[end] - offsets[start] - 1
+            if length >= max_segment_length:
+                continue
+
+            break_cost = costs[end - 1] if end < len(tokens) else 0
+            cost = (
+                best[start][1]
+                + break_cost
+                + ((length - ideal_length) / ideal_length) ** 2
+                + (10 if length < min_segment_length else 0)
+            )
+            candidate = (best[start][0] + 1, cost, start)
+            if best[end] is None or candidate[:2] < best[end][:2]:
+                best[end] = candidate
+
+        starts.append(end)
+
+    if best[len(tokens)] is None:
+        return None
+
+    segments = []
+    end = len(tokens)
+    while end:
+        start = best[end][2]
+        segments.append(" ".join(tokens[start:end]))
+        end = start
+
+    return segments[::-1]
@@ -75,6 +75,46 @@ def extract_audio(video_path: Path, output_path: Path) -> None:
     subprocess.run(command, check=True)
 
 
+# ffmpeg codec and container options of the audio uploaded for transcription
+AUDIO_UPLOAD_ENCODINGS = {
+    "wav": ["-acodec", "pcm_s16le", "-f", "wav"],
+    "flac": ["-acodec", "flac", "-compression_level", "8", "-f", "flac"],
+    "opus": [
+        "-acodec",
+        "libopus",
+        "-b:a",
+        "32k",
+        "-application",
+        "voip",
+        "-f",
+        "ogg",
+    ],
+}
+
+
+def encode_audio_stream(input_path: Path, encoding: str = "opus") -> subprocess.Popen:
+    """
+    Start ffmpeg encoding the audio of input_path as 16 kHz mono to its stdout,
+    so that the output can be consumed while it is being encoded.
+    """
+    command = [
+        "ffmpeg",
+        "-loglevel",
+        "error",
+        "-i",
+        str(input_path),
+        "-vn",  # No video
+        "-ar",
+        "16000",  # Sample rate
+        "-ac",
+        "1",  # Mono
+        *AUDIO_UPLOAD_ENCODINGS[encoding],
+        "pipe:1",
+    ]
+
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
 def merge_audio_video(video_file: Path, audio_file: Path, output_file: Path) -> None:
 
     if output_file.exists():
@@ -0,0 +1,242 @@
+"""
+Local stand-in for the AssemblyAI endpoints used by the app: upload,
+transcript submission/polling and sentences.
+
+Transcripts are deterministic fixtures generated from the uploaded audio (one
+word every 400 ms of WAV audio), or read from <fixtures_dir>/<audio sha256>.json
+(a full transcript response) when such a file exists.
+
+Usage:
+    python -m src.stubs.assemblyai_stub --port 8002 --processing-time 5
+    ASSEMBLYAI_BASE_URL=http://127.0.0.1:8002 streamlit run streamlit_app/Home.py
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+from src.stubs.server import StubRequestHandler, add_fault_arguments, serve
+
+WORD_DURATION_MS = 400
+VOCABULARY = (
+    "the video shows how we build short clips from long talks and every "
+    "speaker explains one idea with a clear example before moving to the next "
+    "point so viewers can follow along"
+).split()
+
+
+def audio_duration_ms(audio: bytes) -> int:
+    # 16-bit PCM WAV as written by extract_audio, other formats are estimated
+    if audio[:4] == b"RIFF" and audio[8:12] == b"WAVE":
+        sample_rate = int.from_bytes(audio[24:28], "little")
+        byte_rate = int.from_bytes(audio[28:32], "little")
+        if sample_rate and byte_rate:
+            return int(1000 * max(0, len(audio) - 44) / byte_rate)
+
+    return int(1000 * len(audio) / 4000)
+
+
+def generate_transcript(audio: bytes) -> dict:
+    """
+    Build a deterministic transcript with punctuated sentences of 6 to 16 words.
+    """
+    seed = int(hashlib.sha256(audio).hexdigest(), 16)
+    rng = random.Random(seed)
+    nb_words = max(1, audio_duration_ms(audio) // WORD_DURATION_MS)
+
+    words, sentences = [], []
+    sentence_words = []
+    sentence_length = rng.randint(6, 16)
+    for i in range(nb_words):
+        text = rng.choice(VOCABULARY)
+        if not sentence_words:
+            text = text.capitalize()
+
+        last_word = len(sentence_words) + 1 == sentence_length or i == nb_words - 1
+        if last_word:
+            text += rng.choice(".?!") if rng.random() < 0.2 else "."
+        elif rng.random() < 0.1:
+            text += ","
+
+        word = {
+            "text": text,
+            "start": i * WORD_DURATION_MS,
+            "end": i * WORD_DURATION_MS + WORD_DURATION_MS - 50,
+            "confidence": 0.99,
+        }
+        words.append(word)
+        sentence_words.append(word)
+
+        if last_word:
+            sentences.append(sentence_words)
+            sentence_words = []
+            sentence_length = rng.randint(6, 16)
+
+    return {
+        "text": " ".join(word["text"] for word in words),
+        "words": words,
+        "language_code": "en",
+        "confidence": 0.99,
+        "audio_duration": nb_words * WORD_DURATION_MS // 1000,
+        "sentences": [
+            {
+                "text": " ".join(word["text"] for word in sentence),
+                "start": sentence[0]["start"],
+                "end": sentence[-1]["end"],
+                "confidence": 0.99,
+                "words": sentence,
+            }
+            for sentence in sentences
+        ],
+    }
+
+
+class AssemblyAIStub:
+    def __init__(
+        self, fixtures_dir: Optional[Path] = None, processing_time: float = 2.0
+    ):
+        self.fixtures_dir = fixtures_dir
+        self.processing_time = processing_time
+        self.uploads: dict[str, bytes] = {}
+        self.transcripts: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def upload(self, audio: bytes, base_url: str) -> str:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = audio
+
+        return f"{base_url}/v2/uploads/{upload_id}"
+
+    def create_transcript(self, request: dict) -> dict:
+        transcript = {
+            **request,
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "submitted_at": time.time(),
+        }
+        with self._lock:
+            self.transcripts[transcript["id"]] = transcript
+
+        return self.public_transcript(transcript)
+
+    def _result(self, transcript: dict) -> dict:
+        if "result" not in transcript:
+            audio = self.uploads.get(transcript["audio_url"].rsplit("/", 1)[-1], b"")
+            fixture_path = (
+                self.fixtures_dir / f"{hashlib.sha256(audio).hexdigest()}.json"
+                if self.fixtures_dir
+                else None
+            )
+            if fixture_path and fixture_path.exists():
+                with open(fixture_path, "r", encoding="utf-8") as f:
+                    transcript["result"] = json.load(f)
+            else:
+                transcript["result"] = generate_transcript(audio)
+
+        return transcript["result"]
+
+    def public_transcript(self, transcript: dict) -> dict:
+        elapsed = time.time() - transcript["submitted_at"]
+        if elapsed < self.processing_time / 2:
+            status = "queued"
+        elif elapsed < self.processing_time:
+            status = "processing"
+        else:
+            status = "completed"
+
+        public = {
+            key: value
+            for key, value in transcript.items()
+            if key not in ("result", "submitted_at")
+        }
+        public["status"] = status
+        if status == "completed":
+            result = self._result(transcript)
+            public.update(
+                {key: value for key, value in result.items() if key != "sentences"}
+            )
+
+        return public
+
+    def sentences(self, transcript: dict) -> dict:
+        result = self._result(transcript)
+        if "sentences" not in result:
+            result["sentences"] = split_fixture_sentences(result["words"])
+
+        return {
+            "sentences": result["sentences"],
+            "confidence": result.get("confidence", 0.99),
+            "audio_duration": result.get("audio_duration", 0),
+        }
+
+
+def split_fixture_sentences(words: list[dict]) -> list[dict]:
+    sentences, sentence = [], []
+    for word in words:
+        sentence.append(word)
+        if re.search(r"[.!?]$", word["text"]) or word is words[-1]:
+            sentences.append(
+                {
+                    "text": " ".join(w["text"] for w in sentence),
+                    "start": sentence[0]["start"],
+                    "end": sentence[-1]["end"],
+                    "confidence": 0.99,
+                    "words": sentence,
+                }
+            )
+            sentence = []
+
+    return sentences
+
+
+class AssemblyAIStubHandler(StubRequestHandler):
+    stub = AssemblyAIStub()
+
+    def handle_request(self, method: str) -> None:
+        path = urlparse(self.path).path
+
+        if method == "POST" and path == "/v2/upload":
+            base_url = f"http://{self.headers['Host']}"
+            self.send_json({"upload_url": self.stub.upload(self.read_body(), base_url)})
+        elif method == "POST" and path == "/v2/transcript":
+            self.send_json(self.stub.create_transcript(self.read_json()))
+        elif method == "GET" and re.fullmatch(r"/v2/transcript/\w+(/sentences)?", path):
+            transcript = self.stub.transcripts.get(path.split("/")[3])
+            if transcript is None:
+                self.send_error_json(404, "Transcript not found")
+            elif path.endswith("/sentences"):
+                self.send_json(self.stub.sentences(transcript))
+            else:
+                self.send_json(self.stub.public_transcript(transcript))
+        else:
+            self.read_body()
+            self.send_error_json(404, f"Unknown endpoint {method} {path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--fixtures-dir", type=Path, default=None)
+    parser.add_argument(
+        "--processing-time",
+        type=float,
+        default=2.0,
+        help="Seconds before a transcript is completed",
+    )
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    AssemblyAIStubHandler.stub = AssemblyAIStub(args.fixtures_dir, args.processing_time)
+    serve(AssemblyAIStubHandler, args).serve_forever()
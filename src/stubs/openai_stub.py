@@ -0,0 +1,425 @@
+"""
+Local stand-in for the OpenAI endpoints used by the app: chat completions
+(plain, structured and streamed), files and batches.
+
+Responses are deterministic fixtures derived from the request, or read from
+<fixtures_dir>/<request hash>.json ({"content": "..."}) when such a file exists.
+
+Usage:
+    python -m src.stubs.openai_stub --port 8001 --latency 0.5 --rate-limit 20
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 streamlit run streamlit_app/Home.py
+"""
+
+import argparse
+import email.parser
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from src.stubs.server import StubRequestHandler, add_fault_arguments, serve
+
+# OpenAI only caches prompt prefixes of at least 1024 tokens, by 128 blocks
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+
+def count_stub_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def request_hash(request: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(
+            [request.get("model"), request["messages"], request.get("response_format")],
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def _task_payload(task_prompt: str) -> str:
+    # Task prompts are "<header>:\n<payload>"
+    return task_prompt.split("\n", 1)[1] if "\n" in task_prompt else task_prompt
+
+
+def split_text_fixture(task_prompt: str, schema: dict, seed: int) -> dict:
+    text = _task_payload(task_prompt)
+    middle = text.find(" ", len(text) // 2)
+    if middle == -1:
+        return {"segments": [text]}
+    return {"segments": [text[:middle], text[middle + 1 :]]}
+
+
+def split_texts_fixture(task_prompt: str, schema: dict, seed: int) -> dict:
+    texts = re.findall(r"^\d+\. (.*)$", _task_payload(task_prompt), flags=re.M)
+    return {
+        "splits": [
+            split_text_fixture(f"\n{text}", schema, seed)["segments"] for text in texts
+        ]
+    }
+
+
+def short_selection_fixture(task_prompt: str, schema: dict, seed: int) -> dict:
+    nb_sentences = len(re.findall(r"^\d+\. ", task_prompt, flags=re.M))
+    start_index = 1 + seed % max(1, nb_sentences // 2)
+    return {
+        "brainstorming": "Stub selection",
+        "start_index": start_index,
+        "end_index": min(max(nb_sentences, 1), start_index + 8),
+    }
+
+
+def video_metadata_fixture(task_prompt: str, schema: dict, seed: int) -> dict:
+    words = _task_payload(task_prompt).split()
+    return {
+        "title": " ".join(words[:6]) or "Stub title",
+        "description": " ".join(words[:30]),
+        "tags": (words + ["stub"] * 5)[:5],
+        "viral_score": 1 + seed % 100,
+    }
+
+
+def schema_default(schema: dict, definitions: Optional[dict] = None):
+    definitions = definitions or schema.get("$defs", {})
+    if "$ref" in schema:
+        return schema_default(definitions[schema["$ref"].split("/")[-1]], definitions)
+
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {
+            name: schema_default(property_schema, definitions)
+            for name, property_schema in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return []
+    if schema_type == "integer":
+        return 0
+    if schema_type == "number":
+        return 0.0
+    if schema_type == "boolean":
+        return False
+    return "stub"
+
+
+STRUCTURED_FIXTURES: dict[str, Callable[[str, dict, int], dict]] = {
+    "SplitTextOutput": split_text_fixture,
+    "SplitTextsOutput": split_texts_fixture,
+    "ShortContentSelection": short_selection_fixture,
+    "VideoMetadata": video_metadata_fixture,
+}
+
+
+class OpenAIStub:
+    """
+    State of the stub: uploaded files, batches and the prompt prefixes seen so
+    far (to report cached tokens like the provider prompt cache does).
+    """
+
+    def __init__(
+        self,
+        fixtures_dir: Optional[Path] = None,
+        batch_delay: float = 1.0,
+        batch_error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.fixtures_dir = fixtures_dir
+        self.batch_delay = batch_delay
+        self.batch_error_rate = batch_error_rate
+        self._random = random.Random(seed)
+        self.files: dict[str, dict] = {}
+        self.batches: dict[str, dict] = {}
+        self.seen_prefixes: set[str] = set()
+        self._lock = threading.Lock()
+
+    def response_content(self, request: dict) -> str:
+        key = request_hash(request)
+        if self.fixtures_dir and (self.fixtures_dir / f"{key}.json").exists():
+            with open(self.fixtures_dir / f"{key}.json", "r", encoding="utf-8") as f:
+                return json.load(f)["content"]
+
+        task_prompt = request["messages"][-1]["content"]
+        response_format = request.get("response_format") or {}
+
+        if response_format.get("type") == "json_schema":
+            json_schema = response_format["json_schema"]
+            fixture = STRUCTURED_FIXTURES.get(
+                json_schema["name"],
+                lambda task_prompt, schema, seed: schema_default(schema),
+            )
+            return json.dumps(fixture(task_prompt, json_schema["schema"], int(key, 16)))
+
+        # Plain text prompts (translation): answer line for line
+        return _task_payload(task_prompt)
+
+    def usage(self, request: dict, content: str) -> dict:
+        prefix = json.dumps(request["messages"][:-1], sort_keys=True)
+        prefix_tokens = count_stub_tokens(prefix)
+        prompt_tokens = prefix_tokens + count_stub_tokens(
+            request["messages"][-1]["content"]
+        )
+
+        with self._lock:
+            cached = prefix in self.seen_prefixes
+            self.seen_prefixes.add(prefix)
+
+        cached_tokens = 0
+        if cached and prefix_tokens >= CACHE_MIN_TOKENS:
+            cached_tokens = prefix_tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+
+        completion_tokens = count_stub_tokens(content)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+    def chat_completion(self, request: dict) -> dict:
+        content = self.response_content(request)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                }
+            ],
+            "usage": self.usage(request, content),
+        }
+
+    def add_file(self, filename: str, content: bytes, purpose: str) -> dict:
+        file_object = {
+            "id": f"file-{uuid.uuid4().hex}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self._lock:
+            self.files[file_object["id"]] = {**file_object, "content": content}
+
+        return file_object
+
+    def create_batch(self, request: dict) -> dict:
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "metadata": request.get("metadata"),
+            "request_counts": {"completed": 0, "failed": 0, "total": 0},
+        }
+        with self._lock:
+            self.batches[batch["id"]] = batch
+
+        threading.Thread(target=self._run_batch, args=(batch,), daemon=True).start()
+        return batch
+
+    def _run_batch(self, batch: dict) -> None:
+        input_lines = self.files[batch["input_file_id"]]["content"].splitlines()
+        output_lines, error_lines = [], []
+        for line in input_lines:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+
+            with self._lock:
+                fail = self._random.random() < self.batch_error_rate
+            if fail:
+                error_lines.append(
+                    json.dumps(
+                        {
+                            "id": f"batch_req_{uuid.uuid4().hex}",
+                            "custom_id": request["custom_id"],
+                            "response": {
+                                "status_code": 500,
+                                "request_id": uuid.uuid4().hex,
+                                "body": {
+                                    "error": {
+                                        "message": "Injected failure",
+                                        "type": "server_error",
+                                    }
+                                },
+                            },
+                            "error": None,
+                        }
+                    )
+                )
+                continue
+
+            output_lines.append(
+                json.dumps(
+                    {
+                        "id": f"batch_req_{uuid.uuid4().hex}",
+                        "custom_id": request["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "request_id": uuid.uuid4().hex,
+                            "body": self.chat_completion(request["body"]),
+                        },
+                        "error": None,
+                    }
+                )
+            )
+
+        time.sleep(self.batch_delay)
+        output_file = self.add_file(
+            f"{batch['id']}_output.jsonl",
+            "\n".join(output_lines).encode(),
+            "batch_output",
+        )
+
+        error_file = None
+        if error_lines:
+            error_file = self.add_file(
+                f"{batch['id']}_errors.jsonl",
+                "\n".join(error_lines).encode(),
+                "batch_output",
+            )
+
+        with self._lock:
+            if batch["status"] != "in_progress":
+                # Cancelled or expired meanwhile
+                return
+            batch["request_counts"] = {
+                "completed": len(output_lines),
+                "failed": len(error_lines),
+                "total": len(output_lines) + len(error_lines),
+            }
+            batch["output_file_id"] = output_file["id"]
+            batch["error_file_id"] = error_file["id"] if error_file else None
+            batch["completed_at"] = int(time.time())
+            batch["status"] = "completed"
+
+
+class OpenAIStubHandler(StubRequestHandler):
+    stub = OpenAIStub()
+
+    def handle_request(self, method: str) -> None:
+        path = urlparse(self.path).path.removeprefix("/v1")
+
+        if method == "POST" and path == "/chat/completions":
+            self.chat_completions()
+        elif method == "POST" and path == "/files":
+            self.upload_file()
+        elif method == "GET" and re.fullmatch(r"/files/[\w-]+/content", path):
+            file_object = self.stub.files.get(path.split("/")[2])
+            if file_object is None:
+                self.send_error_json(404, "File not found")
+            else:
+                self.send_bytes(file_object["content"], "application/octet-stream")
+        elif method == "POST" and path == "/batches":
+            self.send_json(self.stub.create_batch(self.read_json()))
+        elif method == "GET" and re.fullmatch(r"/batches/[\w-]+", path):
+            batch = self.stub.batches.get(path.split("/")[2])
+            if batch is None:
+                self.send_error_json(404, "Batch not found")
+            else:
+                self.send_json(batch)
+        else:
+            self.read_body()
+            self.send_error_json(404, f"Unknown endpoint {method} {path}")
+
+    def chat_completions(self) -> None:
+        request = self.read_json()
+        completion = self.stub.chat_completion(request)
+
+        if not request.get("stream"):
+            self.send_json(completion)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        content = completion["choices"][0]["message"]["content"]
+        chunk = {
+            "id": completion["id"],
+            "object": "chat.completion.chunk",
+            "created": completion["created"],
+            "model": completion["model"],
+        }
+        deltas = [content[i : i + 16] for i in range(0, len(content), 16)]
+        for delta in deltas:
+            self._send_event(
+                {
+                    **chunk,
+                    "choices": [
+                        {"index": 0, "delta": {"content": delta}, "finish_reason": None}
+                    ],
+                }
+            )
+        self._send_event(
+            {
+                **chunk,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+        )
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event({**chunk, "choices": [], "usage": completion["usage"]})
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send_event(self, payload: dict) -> None:
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def upload_file(self) -> None:
+        body = self.read_body()
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+
+        fields, filename, content = {}, "upload", b""
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename():
+                filename, content = part.get_filename(), part.get_payload(decode=True)
+            else:
+                fields[name] = part.get_payload(decode=True).decode("utf-8")
+
+        self.send_json(
+            self.stub.add_file(filename, content, fields.get("purpose", "batch"))
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--fixtures-dir", type=Path, default=None)
+    parser.add_argument(
+        "--batch-delay", type=float, default=1.0, help="Seconds per batch"
+    )
+    parser.add_argument(
+        "--batch-error-rate",
+        type=float,
+        default=0.0,
+        help="Share of the batch requests that fail",
+    )
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    OpenAIStubHandler.stub = OpenAIStub(
+        args.fixtures_dir, args.batch_delay, args.batch_error_rate, args.seed
+    )
+    serve(OpenAIStubHandler, args).serve_forever()
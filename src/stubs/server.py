@@ -0,0 +1,176 @@
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FaultInjector:
+    """
+    Latency, rate-limit and error injection shared by all the requests of a
+    stub server. Randomness is seeded so that runs are reproducible.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit: Optional[float] = None,
+        error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rate_limit or 0.0
+        self._last_refill = time.monotonic()
+
+    def _take_rate_limit_token(self) -> bool:
+        if not self.rate_limit:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate_limit,
+                self._tokens + (now - self._last_refill) * self.rate_limit,
+            )
+            self._last_refill = now
+
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def before_request(self) -> Optional[tuple[int, dict]]:
+        """
+        Sleep for the injected latency, then return the (status, headers) of an
+        injected failure, or None if the request should be served.
+        """
+        with self._lock:
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter))
+            fail = self._random.random() < self.error_rate
+
+        time.sleep(delay)
+
+        if not self._take_rate_limit_token():
+            return 429, {"Retry-After": str(self.retry_after)}
+        if fail:
+            return 500, {}
+        return None
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    faults: FaultInjector = FaultInjector()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                chunk_size = int(self.rfile.readline().strip(), 16)
+                if chunk_size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(chunk_size)
+                self.rfile.readline()
+
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def read_json(self) -> dict:
+        return json.loads(self.read_body() or b"{}")
+
+    def send_json(
+        self, payload: dict, status: int = 200, headers: Optional[dict] = None
+    ) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(
+        self, status: int, message: str, headers: Optional[dict] = None
+    ) -> None:
+        self.send_json({"error": {"message": message, "code": status}}, status, headers)
+
+    def handle_request(self, method: str) -> None:
+        """
+        Answer a request that passed fault injection, overridden by every stub.
+        """
+        self.read_body()
+        self.send_error_json(404, f"No route for {method} {self.path}")
+
+    def _dispatch(self, method: str) -> None:
+        failure = self.faults.before_request()
+        if failure:
+            # The request body must be consumed to keep the connection usable
+            self.read_body()
+            status, headers = failure
+            self.send_error_json(status, "Injected failure", headers)
+            return
+
+        self.handle_request(method)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency stddev")
+    parser.add_argument(
+        "--rate-limit", type=float, default=None, help="Requests per second"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def serve(
+    handler_class: type[StubRequestHandler], args: argparse.Namespace
+) -> ThreadingHTTPServer:
+    handler_class.faults = FaultInjector(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), handler_class)
+    # The actual port, when args.port is 0
+    logger.info(
+        f"{handler_class.__name__} listening on "
+        f"http://{args.host}:{server.server_address[1]}"
+    )
+
+    return server
@@ -3,12 +3,15 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 import streamlit as st
-import yaml
 
 sys.path.append(str(Path(__file__).resolve().parents[2]))
-from src.ai.transcription import (subdivide_transcript_segments,
-                                  transcribe_audio)
+from src.ai.long_transcription import transcribe_audio_in_pieces
+from src.ai.transcription import subdivide_transcript_segments
+from src.ai.transcription_jobs import transcribe_audio_files
 from src.core.setup import setup_dirs
+from src.core.transcripts import (TRANSCRIPT_SUFFIX, edit_transcript_segments,
+                                  open_transcript, slice_transcript_file,
+                                  transcript_exists)
 from src.processing.videos import extract_audio, get_video_duration, trim_video
 from src.processing.youtube_downloader import download_video_from_youtube
 
@@ -97,75 +100,130 @@ def trim_video_component():
         + float(video_end.split(":")[2])
     )
 
+    trimmed_video_name = f"{st.session_state.video_to_process}_{video_start.replace(':','_').split('.')[0]}_{video_end.replace(':','_').split('.')[0]}"
+
     if st.button("Trim long video", use_container_width=True):
         with st.spinner("Trimming video..."):
             trim_video(
                 video_path,
                 video_start_sec,
                 video_end_sec,
-                raw_videos_dir
-                / f"{st.session_state.video_to_process}_{video_start.replace(':','_').split('.')[0]}_{video_end.replace(':','_').split('.')[0]}.mp4",
+                raw_videos_dir / f"{trimmed_video_name}.mp4",
             )
         st.success("Video trimmed successfully!")
 
+        # Reuse the transcript of the long video instead of transcribing again
+        transcript_path = transcripts_dir / (
+            st.session_state.video_to_process + TRANSCRIPT_SUFFIX
+        )
+        if transcript_exists(transcript_path):
+            slice_transcript_file(
+                transcript_path,
+                video_start_sec,
+                video_end_sec,
+                transcripts_dir / f"{trimmed_video_name}{TRANSCRIPT_SUFFIX}",
+            )
+            st.success("Transcript derived from the long video transcript!")
+
 
 def transcription_component():
     st.title("AI Transcription")
-    video_path = raw_videos_dir / (st.session_state.video_to_process + ".mp4")
+    videos_to_transcribe = st.multiselect(
+        "Videos to transcribe:",
+        [file.stem for file in raw_videos_dir.iterdir()],
+        default=[st.session_state.video_to_process],
+    )
+
+    split_long_audio = st.toggle(
+        "Transcribe long recordings in parallel pieces",
+        help="Cut the audio at silences about every 20 minutes and transcribe "
+        "the pieces concurrently",
+    )
+
     if st.button("Generate Transcription", use_container_width=True):
-        with st.spinner("Processing video with AI..."):
-            extract_audio(
-                video_path,
-                transcripts_dir / (st.session_state.video_to_process + ".wav"),
-            )
-            transcript_path = transcribe_audio(
-                transcripts_dir / (st.session_state.video_to_process + ".wav"),
-                transcripts_dir,
-            )
-            subdivide_transcript_segments(transcript_path)
-        st.success("Transcript generated successfully!")
+        with st.spinner("Extracting audio..."):
+            audio_paths = []
+            for video_name in videos_to_transcribe:
+                audio_path = transcripts_dir / (video_name + ".wav")
+                extract_audio(raw_videos_dir / (video_name + ".mp4"), audio_path)
+                audio_paths.append(audio_path)
+
+        if split_long_audio:
+            for audio_path in audio_paths:
+                with st.spinner(f"Transcribing {audio_path.stem} in pieces..."):
+                    transcript_path = transcribe_audio_in_pieces(
+                        audio_path, transcripts_dir
+                    )
+                    subdivide_transcript_segments(transcript_path)
+                st.success(f"Transcript of {audio_path.stem} generated successfully!")
+            return
+
+        progress_bars = {
+            audio_path.stem: st.progress(0.0, text=audio_path.stem)
+            for audio_path in audio_paths
+        }
+
+        def on_progress(jobs):
+            for job in jobs:
+                progress_bars[job.name].progress(
+                    job.progress, text=f"{job.name}: {job.status}"
+                )
+
+        jobs = transcribe_audio_files(audio_paths, transcripts_dir, on_progress)
+
+        with st.spinner("Splitting transcript segments..."):
+            for job in jobs:
+                if job.status == "completed":
+                    subdivide_transcript_segments(Path(job.transcript_path))
+
+        for job in jobs:
+            if job.status == "completed":
+                st.success(f"Transcript of {job.name} generated successfully!")
+                if job.upload_bytes:
+                    st.caption(
+                        f"Uploaded {job.upload_bytes / 1e6:.1f} MB "
+                        f"({job.audio_bytes / 1e6:.1f} MB on disk) "
+                        f"in {job.upload_seconds:.1f}s"
+                    )
+            else:
+                st.error(f"Transcription of {job.name} failed: {job.error}")
 
 
 def manual_segments_correction_component():
     st.title("Manual Segments Correction")
 
-    transcription_path = transcripts_dir / (st.session_state.video_to_process + ".yaml")
-
-    if transcription_path.exists():
-        with open(str(transcription_path), "r", encoding="utf-8") as f:
-            transcript = yaml.safe_load(f)
+    transcription_path = transcripts_dir / (
+        st.session_state.video_to_process + TRANSCRIPT_SUFFIX
+    )
 
-        nb_segments = len(transcript["segments"])
+    if transcript_exists(transcription_path):
+        # Only the segment texts are decoded, the file is closed before edits
+        with open_transcript(transcription_path) as transcript:
+            nb_segments = transcript.nb_segments
 
-        start_segment, end_segment = st.select_slider(
-            "Select the part of the video you want to trim",
-            options=range(nb_segments),
-            value=(0, 10),
-        )
+            start_segment, end_segment = st.select_slider(
+                "Select the part of the video you want to trim",
+                options=range(nb_segments),
+                value=(0, 10),
+            )
 
-        segments = ("\n").join(
-            transcript["segments"][
-                start_segment : min(len(transcript["segments"]), end_segment)
-            ]
-        )
+            segments = ("\n").join(
+                transcript.segments[start_segment : min(nb_segments, end_segment)]
+            )
         modified_segments = st.text_area(
             "Segments", segments, height=50 * (end_segment - start_segment)
         )
 
         if st.button("Validate Changes", use_container_width=True):
-
-            transcript["segments"] = (
-                transcript["segments"][:start_segment]
-                + [seg.strip() for seg in modified_segments.split("\n")]
-                + transcript["segments"][
-                    min(len(transcript["segments"]), end_segment) :
-                ]
-            )
-
-            with open(str(transcription_path), "w", encoding="utf-8") as file:
-                yaml.dump(
-                    transcript, file, allow_unicode=True, default_flow_style=False
+            try:
+                edit_transcript_segments(
+                    transcription_path,
+                    start_segment,
+                    min(nb_segments, end_segment),
+                    modified_segments.split("\n"),
                 )
+            except ValueError as e:
+                st.error(f"Changes not saved: {e}")
 
 
 st.set_page_config(layout="wide")
@@ -1,3 +1,4 @@
+import bisect
 import sys
 from pathlib import Path
 
@@ -8,10 +9,15 @@ sys.path.append(str(Path(__file__).resolve().parents[2]))
 
 from datetime import datetime, timedelta
 
-from src.ai.translation import create_translated_segments, translate_segments
-from src.core.setup import (load_subtitles_config, load_transcript_segments,
-                            setup_dirs)
+from src.ai.translation import (create_translated_segments,
+                                stream_translated_segments)
+from src.core.models import Segment, WordTable
+from src.core.setup import (load_segment_index, load_subtitles_config,
+                            load_transcript_segments, setup_dirs)
+from src.core.transcript_search import search_transcripts
+from src.core.transcripts import TRANSCRIPT_SUFFIX
 from src.generate_shorts import generate_subtitled_short
+from src.llm.telemetry import telemetry_context
 from src.processing.videos import (extract_and_crop_frame, get_video_duration,
                                    get_video_resolution)
 
@@ -24,7 +30,7 @@ raw_videos_dir, musics_dir, transcripts_dir, subtitle_styles_dir, shorts_dir = (
 
 def get_video_paths(video_name: str) -> tuple[Path, Path, Path]:
     return raw_videos_dir / (video_name + ".mp4"), transcripts_dir / (
-        video_name + ".yaml"
+        video_name + TRANSCRIPT_SUFFIX
     )
 
 
@@ -48,6 +54,17 @@ def generate_minute_list(start_time, end_time):
     return time_list
 
 
+def timestamp_to_seconds(timestamp: str) -> float:
+    hours, minutes, seconds = timestamp.split(":")
+    return float(hours) * 3600 + float(minutes) * 60 + float(seconds)
+
+
+def time_range_options() -> list[str]:
+    return generate_minute_list(
+        "00:00:00.00", st.session_state.get("video_duration", "00:00:00.00")
+    )
+
+
 def on_crop_position_change():
     if st.session_state.corrected_segments:
         preview_frame_path = Path("temp/preview_frame.jpg")
@@ -75,6 +92,9 @@ def init_video_state(video_name: str):
         st.session_state.language, st.session_state.segments = load_transcript_segments(
             st.session_state.transcript_path
         )
+        st.session_state.segment_index = load_segment_index(
+            st.session_state.transcript_path
+        )
         st.session_state.video_width, st.session_state.video_height = (
             get_video_resolution(st.session_state.video_path)
         )
@@ -90,10 +110,15 @@ def on_video_selection_change():
     st.session_state.language, st.session_state.segments = load_transcript_segments(
         st.session_state.transcript_path
     )
+    st.session_state.segment_index = load_segment_index(
+        st.session_state.transcript_path
+    )
     st.session_state.video_width, st.session_state.video_height = get_video_resolution(
         st.session_state.video_path
     )
     st.session_state.video_duration = get_video_duration(st.session_state.video_path)
+    # Back to the whole video, see segments_selector_component
+    st.session_state.pop("time_range", None)
 
 
 def video_selector_component():
@@ -115,41 +140,88 @@ def video_selector_component():
     )
 
 
+def on_search_result_click(video_name: str, segment_index: int):
+    if video_name != st.session_state.selected_video:
+        st.session_state.selected_video = video_name
+        on_video_selection_change()
+    st.session_state[f"checkbox_{segment_index}"] = True
+
+    # Extend the time range to the minutes around the segment, so that it shows
+    segment = st.session_state.segments[segment_index]
+    options = time_range_options()
+    range_start, range_end = st.session_state.get(
+        "time_range", (options[0], options[-1])
+    )
+    start = min(timestamp_to_seconds(range_start), segment.start)
+    end = max(timestamp_to_seconds(range_end), segment.end)
+
+    option_seconds = [timestamp_to_seconds(option) for option in options]
+    st.session_state.time_range = (
+        options[max(0, bisect.bisect_right(option_seconds, start) - 1)],
+        options[min(len(options) - 1, bisect.bisect_left(option_seconds, end))],
+    )
+
+
+def search_component():
+    st.title("Search")
+
+    query = st.text_input(
+        "Search the transcripts of all the videos "
+        "(put the words in double quotes to search for the exact phrase):"
+    )
+    if not query:
+        return
+
+    video_list = [file.stem for file in raw_videos_dir.iterdir()]
+    matches = [
+        match for match in search_transcripts(query) if match.transcript in video_list
+    ]
+
+    if len(matches) == 0:
+        st.write("No segment matches your search.")
+        return
+
+    with st.container(height=300):
+        for i, match in enumerate(matches):
+            st.button(
+                f"{match.transcript} ({timedelta(seconds=int(match.start))}): "
+                f"{match.text}",
+                key=f"search_result_{i}",
+                on_click=on_search_result_click,
+                args=(match.transcript, match.segment),
+                use_container_width=True,
+            )
+
+
 def segments_selector_component():
     st.title("Segments Selection")
 
-    timestamp_range = generate_minute_list(
-        "00:00:00.00", st.session_state.get("video_duration", "00:00:00.00")
-    )
+    timestamp_range = time_range_options()
 
+    # The whole video by default, set by on_search_result_click too
+    st.session_state.setdefault("time_range", (timestamp_range[0], timestamp_range[-1]))
     video_start, video_end = st.select_slider(
         "Select the part of the video you want to select",
         options=timestamp_range,
-        value=("00:00:00.00", st.session_state.get("video_duration", "00:00:00.00")),
+        key="time_range",
     )
 
-    video_start_sec = (
-        float(video_start.split(":")[0]) * 3600
-        + float(video_start.split(":")[1]) * 60
-        + float(video_start.split(":")[2])
-    )
-    video_end_sec = (
-        float(video_end.split(":")[0]) * 3600
-        + float(video_end.split(":")[1]) * 60
-        + float(video_end.split(":")[2])
-    )
+    video_start_sec = timestamp_to_seconds(video_start)
+    video_end_sec = timestamp_to_seconds(video_end)
 
     if st.button("Reset selection", use_container_width=True):
         for index in range(len(st.session_state.get("segments", []))):
             st.session_state[f"checkbox_{index}"] = False
 
     with st.container(height=400):
-        for index, item in enumerate(st.session_state.get("segments", [])):
-            if item.start >= video_start_sec and item.end <= video_end_sec:
-                st.checkbox(
-                    item.text,
-                    key=f"checkbox_{index}",
-                )
+        first, last = st.session_state.segment_index.within(
+            video_start_sec, video_end_sec
+        )
+        for index in range(first, last):
+            st.checkbox(
+                st.session_state.segments[index].text,
+                key=f"checkbox_{index}",
+            )
 
     st.session_state.selected_indexes = [
         index
@@ -161,9 +233,10 @@ def segments_selector_component():
         st.session_state.segments[index] for index in st.session_state.selected_indexes
     ]
 
-    st.text(
-        f"Short duration: {sum([(segment.end - segment.start) for segment in st.session_state.selected_segments])} seconds."
+    short_duration = st.session_state.segment_index.selection_duration(
+        st.session_state.selected_indexes
     )
+    st.text(f"Short duration: {round(short_duration, 3)} seconds.")
 
 
 def translator_component():
@@ -197,16 +270,34 @@ def translator_component():
         )
 
         if st.button("Translate selected segments", use_container_width=True):
-            with st.spinner("Translating segments..."):
-                st.session_state.translated_texts = translate_segments(
-                    [segment.text for segment in st.session_state.selected_segments],
-                    st.session_state.language,
-                    translate_language,
-                )
+            with st.container(height=300), telemetry_context(
+                stage="translation", video_id=st.session_state.selected_video
+            ):
+                translated_lines = [
+                    st.empty() for _ in st.session_state.selected_segments
+                ]
+                for i, translated_segment in enumerate(
+                    stream_translated_segments(
+                        st.session_state.selected_segments,
+                        st.session_state.language,
+                        translate_language,
+                    )
+                ):
+                    # Fills the correction input of the segment as soon as it
+                    # is translated, the segments already translated are kept
+                    # if the translation is interrupted by an edit
+                    st.session_state[f"text_input_{i}"] = translated_segment.text
+                    translated_lines[i].text(f"{i}: {translated_segment.text}")
+
             st.success("Segments translated successfully!")
 
 
 def correct_segments(segments, corrected_texts):
+    """
+    Copies of the segments with their words replaced by the corrected ones,
+    keeping their timings. The loaded segments are left unchanged.
+    """
+    corrected_segments = []
     for segment, corrected_text in zip(segments, corrected_texts):
 
         assert len(segment.text.split(" ")) == len(
@@ -214,11 +305,24 @@ def correct_segments(segments, corrected_texts):
         ), "Mismatch number of words between original and corrected. You can't add or remove a word from the original text"
 
         corrected_words = corrected_text.strip().split()
-        for i, word in enumerate(segment.words):
-            if i < len(corrected_words):
-                word.word = corrected_words[i]
+        words = [
+            corrected_words[i] if i < len(corrected_words) else word.word
+            for i, word in enumerate(segment.words)
+        ]
+        corrected_segments.append(
+            Segment(
+                segment.text,
+                segment.start,
+                segment.end,
+                WordTable.from_lists(
+                    words,
+                    [word.start for word in segment.words],
+                    [word.end for word in segment.words],
+                ),
+            )
+        )
 
-    return segments
+    return corrected_segments
 
 
 def manual_correction_component():
@@ -234,13 +338,9 @@ def manual_correction_component():
         for i, segment in enumerate(st.session_state.get("selected_segments", [])):
             if st.session_state.get("translate_subtitles", False):
                 st.write(segment.text)
-                st.text_input(
-                    f"{i}",
-                    value=st.session_state.get(
-                        "translated_texts", st.session_state.corrected_texts
-                    )[i],
-                    key=f"text_input_{i}",
-                )
+                # Filled by translator_component
+                st.session_state.setdefault(f"text_input_{i}", "")
+                st.text_input(f"{i}", key=f"text_input_{i}")
             else:
                 st.text_input(f"{i}", value=segment.text, key=f"text_input_{i}")
 
@@ -332,6 +432,10 @@ if __name__ == "__main__":
     if st.session_state.get("selected_video") is not None:
         st.divider()
 
+        search_component()
+
+        st.divider()
+
         segments_selector_component()
 
         st.divider()
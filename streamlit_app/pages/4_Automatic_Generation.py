@@ -9,8 +9,11 @@ sys.path.append(str(Path(__file__).resolve().parents[2]))
 from src.ai.short_content_selection import calculate_segments_list_duration
 from src.core.setup import (load_subtitles_config, load_transcript_segments,
                             setup_dirs)
+from src.core.transcripts import TRANSCRIPT_SUFFIX
 from src.generate_shorts import (generate_shorts_proposal,
                                  generate_subtitled_short)
+from src.llm.router import model_router
+from src.llm.telemetry import telemetry
 from src.processing.videos import get_video_duration, get_video_resolution
 from src.processing.youtube_downloader import sanitize_filename
 
@@ -23,7 +26,7 @@ raw_videos_dir, musics_dir, transcripts_dir, subtitle_styles_dir, shorts_dir = (
 
 def get_video_paths(video_name: str) -> tuple[Path, Path, Path]:
     return raw_videos_dir / (video_name + ".mp4"), transcripts_dir / (
-        video_name + ".yaml"
+        video_name + TRANSCRIPT_SUFFIX
     )
 
 
@@ -121,6 +124,11 @@ def short_proposition_component():
 
     st.title("Shorts Proposal")
 
+    st.toggle(
+        label="Share the full transcript as context with every chunk",
+        key="transcript_context",
+    )
+
     if st.button("Generate Short Proposal", use_container_width=True):
         with st.spinner("Generating short proposals..."):
             st.session_state.shorts_proposal, st.session_state.shorts_metadata = (
@@ -132,6 +140,10 @@ def short_proposition_component():
                         "translate_subtitles", False
                     ),
                     translate_language=st.session_state.get("translate_language", ""),
+                    transcript_context=st.session_state.get(
+                        "transcript_context", False
+                    ),
+                    video_id=st.session_state.selected_video,
                 )
             )
         st.success("Short proposals generated successfully!")
@@ -175,6 +187,44 @@ def short_proposition_component():
             st.success("Short generated successfully!")
 
 
+def llm_telemetry_component():
+    st.title("LLM Telemetry")
+
+    aggregates = telemetry.aggregate()
+    if not aggregates:
+        st.write("No LLM call recorded yet.")
+        return
+
+    st.dataframe(aggregates, use_container_width=True)
+
+    json_column, prometheus_column = st.columns(2)
+    with json_column:
+        st.download_button(
+            "Download JSON",
+            telemetry.to_json(),
+            file_name="llm_telemetry.json",
+            use_container_width=True,
+        )
+    with prometheus_column:
+        st.download_button(
+            "Download Prometheus metrics",
+            telemetry.to_prometheus(),
+            file_name="llm_telemetry.prom",
+            use_container_width=True,
+        )
+
+    routing_summary = model_router.summary()
+    if routing_summary:
+        st.subheader("Model Routing")
+        st.dataframe(routing_summary, use_container_width=True)
+        st.download_button(
+            "Download routing decisions",
+            model_router.to_json(),
+            file_name="llm_routing.json",
+            use_container_width=True,
+        )
+
+
 def short_preview_component():
     st.title("Generated Short Preview")
     if st.session_state.get("short_generated"):
@@ -199,3 +249,7 @@ if __name__ == "__main__":
         st.divider()
 
         short_preview_component()
+
+        st.divider()
+
+        llm_telemetry_component()
@@ -0,0 +1,50 @@
+import os
+import sys
+import threading
+from argparse import Namespace
+from pathlib import Path
+
+import openai
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+# The LLM client is created when src.llm is imported
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.stubs.openai_stub import OpenAIStub, OpenAIStubHandler
+from src.stubs.server import serve
+
+
+@pytest.fixture
+def openai_stub():
+    """
+    OpenAI stub served on a free local port, with the client of the app
+    pointed at it.
+    """
+    stub = OpenAIStub(batch_delay=0.05)
+    handler_class = type("Handler", (OpenAIStubHandler,), {"stub": stub})
+    server = serve(
+        handler_class,
+        Namespace(
+            host="127.0.0.1",
+            port=0,
+            latency=0.0,
+            jitter=0.0,
+            rate_limit=None,
+            error_rate=0.0,
+            retry_after=1.0,
+            seed=0,
+        ),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stub.client = openai.OpenAI(
+        api_key="test",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        max_retries=0,
+    )
+    yield stub
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,184 @@
+import pytest
+
+from src.core.models import VideoMetadata
+from src.llm import batch as batch_module
+from src.llm.batch import (ChatBatch, build_chat_request_body,
+                           generate_chat_responses_batch, strict_json_schema)
+from src.llm.telemetry import telemetry
+
+
+def make_prompts(nb_prompts: int) -> list[dict]:
+    return [
+        {
+            "model": "gpt-4o-mini",
+            "base_prompt": "You are a translator.",
+            "task_prompt": f"Translate:\ntext number {i}",
+            "temperature": 0.0,
+            "prompt_name": "translate",
+        }
+        for i in range(nb_prompts)
+    ]
+
+
+def expected_contents(nb_prompts: int) -> list[str]:
+    # The stub answers plain text prompts with their payload
+    return [f"text number {i}" for i in range(nb_prompts)]
+
+
+@pytest.fixture
+def client(openai_stub, monkeypatch):
+    monkeypatch.setattr(batch_module, "client", openai_stub.client)
+    return openai_stub.client
+
+
+def make_batch(name: str, nb_prompts: int, state_dir) -> ChatBatch:
+    return ChatBatch(
+        name,
+        [build_chat_request_body(prompt) for prompt in make_prompts(nb_prompts)],
+        state_dir=state_dir,
+        poll_interval=0.02,
+    )
+
+
+def test_batch_returns_results_in_order(openai_stub, client, tmp_path):
+    with telemetry.capture() as records:
+        results = make_batch("translate", 5, tmp_path).run()
+
+    assert results == expected_contents(5)
+    assert len(openai_stub.batches) == 1
+    assert len(records) == 5
+    assert all(record.latency is None for record in records)
+
+
+def test_batch_resumes_after_restart(openai_stub, client, tmp_path, monkeypatch):
+    make_batch("translate", 3, tmp_path).submit()
+
+    # Polled, not submitted again
+    assert make_batch("translate", 3, tmp_path).run() == expected_contents(3)
+    assert len(openai_stub.batches) == 1
+
+    # Read back from the downloaded output, without any API call
+    monkeypatch.setattr(batch_module, "client", None)
+    assert make_batch("translate", 3, tmp_path).run() == expected_contents(3)
+
+
+def test_batch_with_other_requests_is_refused(client, tmp_path):
+    make_batch("translate", 3, tmp_path).submit()
+
+    with pytest.raises(ValueError):
+        make_batch("translate", 4, tmp_path)
+
+
+def test_failed_requests_give_none(openai_stub, client, tmp_path):
+    openai_stub.batch_error_rate = 0.5
+
+    results = make_batch("translate", 20, tmp_path).run()
+
+    (batch,) = openai_stub.batches.values()
+    assert 0 < batch["request_counts"]["failed"] < 20
+    assert results.count(None) == batch["request_counts"]["failed"]
+    assert all(
+        result in (None, expected)
+        for result, expected in zip(results, expected_contents(20))
+    )
+
+
+def test_expired_batch_is_submitted_again(openai_stub, client, tmp_path):
+    openai_stub.batch_delay = 5
+    chat_batch = make_batch("translate", 3, tmp_path)
+    chat_batch.submit()
+    openai_stub.batches[chat_batch.state["batch_id"]]["status"] = "expired"
+
+    assert chat_batch.run() == [None] * 3
+    assert "batch_id" not in chat_batch.state
+    assert not chat_batch.output_path.exists()
+
+    openai_stub.batch_delay = 0.05
+    assert make_batch("translate", 3, tmp_path).run() == expected_contents(3)
+    assert len(openai_stub.batches) == 2
+
+
+def test_empty_batch_is_not_submitted(openai_stub, client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert generate_chat_responses_batch("empty", make_prompts(0)) == []
+    assert make_batch("empty", 0, tmp_path).run() == []
+    assert openai_stub.batches == {}
+    assert openai_stub.files == {}
+
+
+def test_structured_outputs_are_parsed(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    results = generate_chat_responses_batch(
+        "metadata", make_prompts(2), VideoMetadata, poll_interval=0.02
+    )
+
+    assert all(isinstance(result, VideoMetadata) for result in results)
+
+
+def test_translations_missing_from_batch_are_translated_again(monkeypatch):
+    from src.ai import translation
+
+    monkeypatch.setattr(
+        translation,
+        "generate_chat_responses_batch",
+        lambda name, prompts, context=None: [None, "un\ndeux"],
+    )
+    monkeypatch.setattr(
+        translation,
+        "translate_text_chunk",
+        lambda chunk, source_lang, target_lang, context=None: [
+            f"sync {text}" for text in chunk
+        ],
+    )
+
+    assert translation.translate_segments_batch(
+        [["one", "two", "three"], ["four", "five"]], "English", "French", "test"
+    ) == [["sync one", "sync two", "sync three"], ["un", "deux"]]
+
+
+def test_metadata_missing_from_batch_are_generated_again(monkeypatch):
+    from src.ai import metadata_generation
+
+    def metadata(title: str) -> VideoMetadata:
+        return VideoMetadata(title=title, description="", tags=[], viral_score=1)
+
+    monkeypatch.setattr(
+        metadata_generation,
+        "generate_chat_responses_batch",
+        lambda name, prompts, structured_output=None: [None, metadata("batch")],
+    )
+    monkeypatch.setattr(
+        metadata_generation,
+        "generate_short_metadata",
+        lambda short_transcript: metadata(f"sync {short_transcript}"),
+    )
+
+    assert [
+        short_metadata.title
+        for short_metadata in metadata_generation.generate_short_metadata_batch(
+            ["first short", "second short"], "test"
+        )
+    ] == ["sync first short", "batch"]
+
+
+def test_strict_json_schema_closes_every_object():
+    from typing import Optional
+
+    from pydantic import BaseModel
+
+    class Tag(BaseModel):
+        name: str
+        weight: Optional[float] = None
+
+    class Tagged(BaseModel):
+        tags: list[Tag]
+
+    schema = strict_json_schema(Tagged.model_json_schema())
+
+    tag_schema = schema["$defs"]["Tag"]
+    assert schema["additionalProperties"] is False
+    assert tag_schema["additionalProperties"] is False
+    assert tag_schema["required"] == ["name", "weight"]
+    assert "default" not in tag_schema["properties"]["weight"]
@@ -0,0 +1,52 @@
+import pytest
+
+from src.llm import llm_wraper
+from src.llm.llm_wraper import generate_chat_response
+from src.llm.telemetry import telemetry
+
+TASK_PROMPT = "Translate:\n" + "\n".join(f"line number {i}" for i in range(10))
+
+
+@pytest.fixture
+def cassettes(openai_stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_wraper, "client", openai_stub.client)
+    monkeypatch.setenv("CASSETTE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def stream_lines(nb_deltas: int) -> str:
+    text_deltas = generate_chat_response(
+        "You are a translator.",
+        TASK_PROMPT,
+        "gpt-4o-mini",
+        temperature=0.0,
+        prompt_name="translate",
+        stream=True,
+    )
+    content = "".join(delta for delta, _ in zip(text_deltas, range(nb_deltas)))
+    text_deltas.close()
+    return content
+
+
+def test_stream_closed_early_is_recorded_and_replayed(cassettes, monkeypatch):
+    monkeypatch.setenv("CASSETTE_MODE", "record")
+    with telemetry.capture() as records:
+        content = stream_lines(2)
+
+    assert len(records) == 1
+    assert len(list(cassettes.glob("chat/*.json"))) == 1
+
+    monkeypatch.setenv("CASSETTE_MODE", "replay")
+    assert stream_lines(2).startswith(content)
+
+
+def test_stream_read_to_the_end_is_recorded_with_its_usage(cassettes, monkeypatch):
+    monkeypatch.setenv("CASSETTE_MODE", "record")
+    with telemetry.capture() as records:
+        content = stream_lines(1000)
+
+    assert content == TASK_PROMPT.split("\n", 1)[1]
+    assert records[0].input_tokens > 0
+
+    monkeypatch.setenv("CASSETTE_MODE", "replay")
+    assert stream_lines(1000) == content